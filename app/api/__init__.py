@@ -2,7 +2,23 @@
 Пакет API роутеров.
 """
 
+from typing import List
+
+from fastapi import APIRouter
+
 from . import books
 from . import categories
+from . import stats
+from . import changes
+
+__all__ = ['books', 'categories', 'stats', 'changes', 'get_routers']
+
+
+def get_routers() -> List[APIRouter]:
+    """
+    Роутеры приложения.
 
-__all__ = ['books', 'categories']
+    Режим работы с БД (DB_MODE) выбирает сессия эндпоинтов (get_crud_db),
+    роутеры в обоих режимах одни и те же.
+    """
+    return [categories.router, books.router, stats.router, changes.router]
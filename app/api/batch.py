@@ -0,0 +1,38 @@
+"""
+Общие параметры пакетного получения записей по списку ID.
+"""
+
+import os
+from typing import List
+
+from fastapi import HTTPException, status
+
+
+# Максимальное количество ID в одном пакетном запросе
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "500"))
+
+
+def parse_ids(ids: str) -> List[int]:
+    """Разбор списка ID вида "1,2,3" из строки запроса"""
+    try:
+        return [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ids должен быть списком целых чисел через запятую"
+        )
+
+
+def check_batch_size(ids: List[int]) -> List[int]:
+    """Проверка размера пакета"""
+    if not ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Список ID пуст"
+        )
+    if len(ids) > BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Слишком много ID: максимум {BATCH_MAX_SIZE} за запрос"
+        )
+    return ids
@@ -1,60 +1,303 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+"""
+Роутер книг.
+
+Эндпоинты работают с базой через async_crud и одинаковы в обоих режимах
+DB_MODE (см. get_crud_db). Импорт и выгрузка читают и пишут в своём
+потоке с синхронной сессией.
+"""
+
+import anyio.from_thread
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from datetime import datetime
+from typing import Iterator, List, Optional
 
-from app.db import crud
-from app.db.db import get_db
-from app import schemas
+from app.db import async_crud
+from app.db.db import get_crud_db, get_db
+from app.db.crud import DuplicateKeyError, InvalidReferenceError
+from app.db.pagination import InvalidCursorError
+from app import exporter, importer, schemas
+from app.api import batch, etags, filters, serialization
+from app.api.fields import LIST_DEFERRED_FIELDS, book_fields
 
 router = APIRouter(prefix="/books", tags=["books"])
 
 
 @router.get("/", response_model=List[schemas.Book])
-def read_books(
+async def read_books(
     skip: int = Query(0, ge=0, description="Количество пропускаемых записей"),
     limit: int = Query(100, ge=1, le=1000, description="Лимит записей"),
     category_id: Optional[int] = Query(None, ge=1, description="Фильтр по ID категории"),
-    db: Session = Depends(get_db)
+    min_price: Optional[float] = Query(None, ge=0, description="Минимальная цена (включительно)"),
+    max_price: Optional[float] = Query(None, ge=0, description="Максимальная цена (включительно)"),
+    created_after: Optional[datetime] = Query(None, description="Добавлены не раньше (ISO 8601)"),
+    created_before: Optional[datetime] = Query(None, description="Добавлены раньше (ISO 8601)"),
+    sort_by: str = Query("id", pattern=filters.SORT_PATTERN, description="Поле сортировки: id, title, price, created_at"),
+    sort_order: str = Query("asc", pattern="^(asc|desc)$", description="Направление сортировки: asc или desc"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (из X-Next-Cursor)"),
+    fields: Optional[str] = Query(None, description="Поля ответа через запятую, например id,title,price"),
+    include: Optional[str] = Query(None, description="Дополнительные поля, например description"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_crud_db)
 ):
     """
     Получить список всех книг с возможностью фильтрации.
     
-    - **skip**: количество пропускаемых записей (для пагинации)
+    - **skip**: количество пропускаемых записей (для пагинации, устаревший способ)
+    - **limit**: максимальное количество возвращаемых записей
+    - **category_id**: фильтр по ID категории (опционально)
+    - **min_price**, **max_price**: диапазон цены, границы включаются (опционально)
+    - **created_after**, **created_before**: диапазон даты добавления
+      [created_after, created_before) (опционально)
+    - **sort_by**: поле сортировки (id, title, price, created_at)
+    - **sort_order**: направление сортировки (asc или desc)
+    - **cursor**: курсор следующей страницы (опционально, для той же сортировки)
+    - **fields**: поля ответа (опционально, id отдаётся всегда)
+    - **include**: поля, которые по умолчанию не отдаются (description)
+    
+    Описание книги в списке по умолчанию не отдаётся и не читается из базы:
+    его включают `include=description` или `fields=...,description`.
+    
+    Если есть следующая страница, её курсор возвращается в заголовке
+    `X-Next-Cursor`. Курсорная пагинация не замедляется на глубоких страницах.
+    Поддерживается условный запрос по ETag (If-None-Match → 304).
+    """
+    selected = book_fields(fields, include, deferred=LIST_DEFERRED_FIELDS)
+    ranges = filters.book_ranges(min_price, max_price, created_after, created_before)
+    try:
+        rows, next_cursor = await async_crud.get_book_rows_page(
+            db=db, 
+            skip=skip, 
+            limit=limit,
+            category_id=category_id,
+            sort_by=sort_by,
+            sort_order=sort_order,
+            cursor=cursor,
+            fields=selected,
+            **ranges
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else {}
+    etag = etags.with_fields(
+        etags.collection_etag(map(etags.book_row_etag, rows), next_cursor), selected
+    )
+    if etags.is_not_modified(if_none_match, etag):
+        return etags.not_modified(etag, headers)
+    
+    # Строки Core и orjson вместо объектов ORM: ответ тот же, но в разы быстрее
+    return serialization.books_response(rows, selected, headers={**headers, "ETag": etag})
+
+
+@router.get("/search", response_model=List[schemas.BookSearchResult])
+async def search_books(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=255, description="Поисковый запрос"),
+    limit: int = Query(20, ge=1, le=100, description="Лимит записей"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (из X-Next-Cursor)"),
+    fields: Optional[str] = Query(None, description="Поля ответа через запятую, например id,title,price"),
+    db: AsyncSession = Depends(get_crud_db)
+):
+    """
+    Полнотекстовый поиск книг по названию и описанию.
+    
+    - **q**: поисковый запрос
+    - **limit**: максимальное количество возвращаемых записей
+    - **cursor**: курсор следующей страницы (опционально)
+    - **fields**: поля книги в ответе (опционально, id отдаётся всегда)
+    
+    Результаты отсортированы по релевантности, совпадения выделены тегом
+    `<mark>`. Курсор следующей страницы возвращается в заголовке `X-Next-Cursor`.
+    """
+    selected = book_fields(fields)
+    try:
+        results, next_cursor = await async_crud.search_books_page(
+            db=db, search_term=q, limit=limit, cursor=cursor, fields=selected
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    if selected is not None:
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else {}
+        return serialization.search_response(results, selected, headers)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return _search_results(results)
+
+
+@router.get("/search/faceted", response_model=schemas.FacetedSearchResult)
+async def search_books_faceted(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=255, description="Поисковый запрос"),
+    limit: int = Query(20, ge=1, le=100, description="Лимит записей"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (из X-Next-Cursor)"),
+    price_buckets: Optional[str] = Query(None, description="Границы ценовых интервалов через запятую, например 100,500,1000"),
+    db: AsyncSession = Depends(get_crud_db)
+):
+    """
+    Полнотекстовый поиск книг с фасетами для фильтров витрины.
+    
+    - **q**: поисковый запрос
     - **limit**: максимальное количество возвращаемых записей
+    - **cursor**: курсор следующей страницы (опционально)
+    - **price_buckets**: границы ценовых интервалов (опционально)
+    
+    Кроме страницы результатов (как у /books/search) возвращает число
+    найденных книг по категориям и по ценовым интервалам. Фасеты считаются
+    одним проходом по найденным книгам и только для первой страницы (без
+    cursor); при очень большом числе совпадений это оценка по выборке
+    (`exact: false`).
+    """
+    edges = filters.price_edges(price_buckets)
+    try:
+        results, next_cursor = await async_crud.search_books_page(
+            db=db, search_term=q, limit=limit, cursor=cursor
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    facets = await async_crud.search_facets(db, search_term=q, price_edges=edges) if cursor is None else None
+    return {"items": _search_results(results), "facets": facets}
+
+
+def _search_results(results) -> List[schemas.BookSearchResult]:
+    return [
+        schemas.BookSearchResult(
+            **schemas.Book.model_validate(book).model_dump(),
+            score=-hit.rank,
+            title_highlight=hit.title,
+            description_snippet=hit.snippet
+        )
+        for book, hit in results
+    ]
+
+
+@router.get("/export", response_class=StreamingResponse)
+def export_books(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Формат данных: ndjson или csv"),
+    category_id: Optional[int] = Query(None, ge=1, description="Фильтр по ID категории"),
+):
+    """
+    Выгрузка всего каталога книг потоком.
+    
+    - **format**: формат данных (ndjson или csv)
     - **category_id**: фильтр по ID категории (опционально)
+    
+    Книги отдаются в порядке ID по мере чтения из базы, расход памяти
+    сервера не зависит от размера каталога.
+    """
+    return StreamingResponse(
+        exporter.export_books(format=format, category_id=category_id),
+        media_type=exporter.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="books.{format}"'}
+    )
+
+
+@router.get("/batch", response_model=List[schemas.BookBatchItem])
+async def read_books_batch(
+    ids: str = Query(..., description="ID книг через запятую, например 1,2,3"),
+    include_category: bool = Query(True, description="Загрузить категории книг"),
+    db: AsyncSession = Depends(get_crud_db)
+):
+    """
+    Получить несколько книг по списку ID одним запросом.
+    
+    - **ids**: ID книг через запятую
+    - **include_category**: загрузить категории книг
+    
+    Книги возвращаются в порядке ID из запроса; для несуществующих
+    `found` равен false. Длинные списки передавайте через POST /books/batch.
+    """
+    return await _books_batch(batch.parse_ids(ids), include_category, db)
+
+
+@router.post("/batch", response_model=List[schemas.BookBatchItem])
+async def read_books_batch_post(
+    request: schemas.BatchRequest,
+    include_category: bool = Query(True, description="Загрузить категории книг"),
+    db: AsyncSession = Depends(get_crud_db)
+):
+    """
+    Получить несколько книг по списку ID из тела запроса.
+    
+    - **ids**: список ID книг
+    - **include_category**: загрузить категории книг
     """
-    books = crud.get_books(
-        db=db, 
-        skip=skip, 
-        limit=limit,
-        category_id=category_id
+    return await _books_batch(request.ids, include_category, db)
+
+
+async def _books_batch(book_ids: List[int], include_category: bool, db) -> List[dict]:
+    books = await async_crud.get_books_by_ids(
+        db, batch.check_batch_size(book_ids), with_category=include_category
     )
-    return books
+    return [
+        {"id": book_id, "found": book_id in books, "book": books.get(book_id)}
+        for book_id in book_ids
+    ]
 
 
 @router.get("/{book_id}", response_model=schemas.Book)
-def read_book(
+async def read_book(
     book_id: int,
-    db: Session = Depends(get_db)
+    response: Response,
+    fields: Optional[str] = Query(None, description="Поля ответа через запятую, например id,title,price"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_crud_db)
 ):
     """
     Получить книгу по ID.
     
     - **book_id**: ID книги
+    - **fields**: поля ответа (опционально, id отдаётся всегда)
+    
+    Поддерживается условный запрос по ETag (If-None-Match → 304).
     """
-    book = crud.get_book(db, book_id=book_id)
+    selected = book_fields(fields)
+    if selected is not None:
+        # Из базы читаются только колонки выбранных полей
+        row = await async_crud.get_book_row(db, book_id=book_id, fields=selected)
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Книга с ID {book_id} не найдена"
+            )
+        etag = etags.with_fields(etags.book_row_etag(row), selected)
+        if etags.is_not_modified(if_none_match, etag):
+            return etags.not_modified(etag)
+        return serialization.book_response(row, selected, headers={"ETag": etag})
+    
+    book = await async_crud.get_book(db, book_id=book_id)
     if book is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Книга с ID {book_id} не найдена"
         )
+    
+    etag = etags.book_etag(book)
+    if etags.is_not_modified(if_none_match, etag):
+        return etags.not_modified(etag)
+    response.headers["ETag"] = etag
     return book
 
 
+def _duplicate_url(url: Optional[str]) -> HTTPException:
+    """Ошибка для ссылки, которая уже есть у другой книги (ссылка — уникальный ключ)"""
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"Книга со ссылкой {url} уже существует"
+    )
+
+
 @router.post("/", response_model=schemas.Book, status_code=status.HTTP_201_CREATED)
-def create_book(
+async def create_book(
     book: schemas.BookCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_crud_db)
 ):
     """
     Создать новую книгу.
@@ -66,28 +309,138 @@ def create_book(
     - **category_id**: ID категории (обязательно)
     """
     # Проверяем существование категории
-    category = crud.get_category(db, category_id=book.category_id)
+    category = await async_crud.get_category(db, category_id=book.category_id)
     if category is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Категория с ID {book.category_id} не существует"
         )
     
-    return crud.create_book(
-        db=db,
-        title=book.title,
-        description=book.description,
-        price=book.price,
-        url=book.url,
-        category_id=book.category_id
+    try:
+        return await async_crud.create_book(
+            db=db,
+            title=book.title,
+            description=book.description,
+            price=book.price,
+            url=book.url,
+            category_id=book.category_id
+        )
+    except DuplicateKeyError:
+        raise _duplicate_url(book.url)
+
+
+async def _import_books(request: Request, db: Session, format: str, batch_size: int, upsert: bool):
+    """Импорт книг из тела запроса (см. importer.import_books)"""
+    stream = request.stream()
+    
+    def body_chunks() -> Iterator[bytes]:
+        # Тело читается по мере импорта, целиком в памяти не держится
+        while True:
+            try:
+                yield anyio.from_thread.run(stream.__anext__)
+            except StopAsyncIteration:
+                return
+    
+    return await run_in_threadpool(
+        importer.import_books,
+        db,
+        importer.iter_lines(body_chunks()),
+        format=format,
+        batch_size=batch_size,
+        upsert=upsert
+    )
+
+
+@router.post("/bulk", response_model=schemas.BulkImportResult)
+async def bulk_create_books(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Формат данных: ndjson или csv"),
+    batch_size: int = Query(
+        importer.DEFAULT_BATCH_SIZE, ge=1, le=importer.MAX_BATCH_SIZE,
+        description="Количество книг в одной транзакции"
+    ),
+    db: Session = Depends(get_db)
+):
+    """
+    Пакетный импорт книг.
+    
+    Тело запроса — поток NDJSON (один объект книги на строку) или CSV
+    с заголовком `title,description,price,url,category_id`.
+    
+    - **format**: формат данных (ndjson или csv)
+    - **batch_size**: количество книг в одной транзакции
+    
+    Ошибочные строки не прерывают импорт и перечисляются в отчёте.
+    """
+    return await _import_books(request, db, format, batch_size, upsert=False)
+
+
+@router.put("/by-key", response_model=schemas.Book)
+async def upsert_book(
+    book: schemas.BookUpsert,
+    db: AsyncSession = Depends(get_crud_db)
+):
+    """
+    Добавить книгу или обновить существующую по ссылке (url).
+    
+    Тело — книга целиком, как при создании, но ссылка обязательна. Книга
+    с такой ссылкой заменяется; если ничего не изменилось, запись не
+    перезаписывается. Новая книга — ответ 201, существующая — 200.
+    Заголовок `X-Upsert-Result`: inserted, updated или unchanged.
+    """
+    try:
+        row, result = await async_crud.upsert_book_row(db, **book.model_dump())
+    except InvalidReferenceError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Категория с ID {book.category_id} не существует"
+        )
+    
+    response = serialization.book_response(
+        row, headers={"ETag": etags.book_row_etag(row), "X-Upsert-Result": result}
+    )
+    if result == "inserted":
+        response.status_code = status.HTTP_201_CREATED
+    return response
+
+
+@router.put("/by-key/bulk", response_model=schemas.BulkImportResult)
+async def upsert_books(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Формат данных: ndjson или csv"),
+    batch_size: int = Query(
+        importer.DEFAULT_BATCH_SIZE, ge=1, le=importer.MAX_BATCH_SIZE,
+        description="Количество книг в одной транзакции"
+    ),
+    db: Session = Depends(get_db)
+):
+    """
+    Пакетное добавление и обновление книг по ссылке (url).
+    
+    Тело — как у POST /books/bulk, ссылка у каждой книги обязательна.
+    Каждая пачка — одна транзакция из запросов INSERT ... ON CONFLICT
+    DO UPDATE; неизменившиеся книги не перезаписываются. В отчёте —
+    количество добавленных, изменённых и неизменившихся книг.
+    """
+    return await _import_books(request, db, format, batch_size, upsert=True)
+
+
+async def _book_write_failed(book_id: int, if_match: Optional[str], db: AsyncSession) -> HTTPException:
+    """Ошибка для UPDATE/DELETE книги, не изменившего ни одной строки: книги нет или не совпал If-Match"""
+    if if_match is not None and await async_crud.get_book_row(db, book_id, fields=("id",)) is not None:
+        return etags.conflict(if_match)
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail=f"Книга с ID {book_id} не найдена"
     )
 
 
 @router.put("/{book_id}", response_model=schemas.Book)
-def update_book(
+async def update_book(
     book_id: int,
     book_update: schemas.BookUpdate,
-    db: Session = Depends(get_db)
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_crud_db)
 ):
     """
     Обновить книгу.
@@ -98,23 +451,9 @@ def update_book(
     - **price**: новая цена книги (опционально)
     - **url**: новая ссылка на книгу (опционально)
     - **category_id**: новый ID категории (опционально)
-    """
-    db_book = crud.get_book(db, book_id=book_id)
-    if db_book is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Книга с ID {book_id} не найдена"
-        )
-    
-    # Проверяем существование новой категории, если она указана
-    if book_update.category_id is not None:
-        category = crud.get_category(db, category_id=book_update.category_id)
-        if category is None:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Категория с ID {book_update.category_id} не существует"
-            )
     
+    С заголовком If-Match книга обновляется, только если её ETag не изменился.
+    """
     # Подготавливаем данные для обновления
     update_data = {}
     if book_update.title is not None:
@@ -128,40 +467,41 @@ def update_book(
     if book_update.category_id is not None:
         update_data['category_id'] = book_update.category_id
     
-    updated_book = crud.update_book(db=db, book_id=book_id, **update_data)
-    
-    if updated_book is None:
+    # Существование книги, If-Match и новой категории проверяет сам UPDATE
+    try:
+        row = await async_crud.update_book_row(
+            db=db, book_id=book_id, versions=etags.book_if_match_versions(if_match, book_id), **update_data
+        )
+    except InvalidReferenceError:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Не удалось обновить книгу"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Категория с ID {book_update.category_id} не существует"
         )
+    except DuplicateKeyError:
+        raise _duplicate_url(book_update.url)
+    if row is None:
+        raise await _book_write_failed(book_id, if_match, db)
     
-    return updated_book
+    return serialization.book_response(row, headers={"ETag": etags.book_row_etag(row)})
 
 
 @router.delete("/{book_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_book(
+async def delete_book(
     book_id: int,
-    db: Session = Depends(get_db)
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_crud_db)
 ):
     """
     Удалить книгу.
     
     - **book_id**: ID удаляемой книги
-    """
-    db_book = crud.get_book(db, book_id=book_id)
-    if db_book is None:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail=f"Книга с ID {book_id} не найдена"
-        )
     
-    success = crud.delete_book(db=db, book_id=book_id)
+    С заголовком If-Match книга удаляется, только если её ETag не изменился.
+    """
+    success = await async_crud.delete_book_row(
+        db=db, book_id=book_id, versions=etags.book_if_match_versions(if_match, book_id)
+    )
     if not success:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Не удалось удалить книгу"
-        )
+        raise await _book_write_failed(book_id, if_match, db)
     
     return None
-    
\ No newline at end of file
@@ -1,53 +1,128 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+"""
+Роутер категорий.
+
+Эндпоинты работают с базой через async_crud и одинаковы в обоих режимах
+DB_MODE (см. get_crud_db).
+"""
+
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from app.db import crud
-from app.db.db import get_db
-from app import schemas
+from app.db import async_crud
+from app.db.db import get_crud_db
+from app.db.crud import VersionConflictError
+from app.db.pagination import InvalidCursorError
+from app import deletions, schemas
+from app.api import batch, etags
 
 router = APIRouter(prefix="/categories", tags=["categories"])
 
 
 @router.get("/", response_model=List[schemas.Category])
-def read_categories(
+async def read_categories(
+    response: Response,
     skip: int = Query(0, ge=0, description="Количество пропускаемых записей"),
     limit: int = Query(100, ge=1, le=1000, description="Лимит записей"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы (из X-Next-Cursor)"),
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_crud_db)
 ):
     """
     Получить список всех категорий.
     
-    - **skip**: количество пропускаемых записей (для пагинации)
+    - **skip**: количество пропускаемых записей (для пагинации, устаревший способ)
     - **limit**: максимальное количество возвращаемых записей
+    - **cursor**: курсор следующей страницы (опционально)
+    
+    Если есть следующая страница, её курсор возвращается в заголовке
+    `X-Next-Cursor`. Поддерживается условный запрос по ETag (If-None-Match → 304).
     """
-    categories = crud.get_categories(db=db, skip=skip, limit=limit)
+    try:
+        categories, next_cursor = await async_crud.get_categories_page(
+            db=db, skip=skip, limit=limit, cursor=cursor
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else {}
+    etag = etags.collection_etag(map(etags.category_etag, categories), next_cursor)
+    if etags.is_not_modified(if_none_match, etag):
+        return etags.not_modified(etag, headers)
+    
+    response.headers.update({**headers, "ETag": etag})
     return categories
 
 
+@router.get("/batch", response_model=List[schemas.CategoryBatchItem])
+async def read_categories_batch(
+    ids: str = Query(..., description="ID категорий через запятую, например 1,2,3"),
+    db: AsyncSession = Depends(get_crud_db)
+):
+    """
+    Получить несколько категорий по списку ID одним запросом.
+    
+    - **ids**: ID категорий через запятую
+    
+    Категории возвращаются в порядке ID из запроса; для несуществующих
+    `found` равен false. Длинные списки передавайте через POST /categories/batch.
+    """
+    return await _categories_batch(batch.parse_ids(ids), db)
+
+
+@router.post("/batch", response_model=List[schemas.CategoryBatchItem])
+async def read_categories_batch_post(
+    request: schemas.BatchRequest,
+    db: AsyncSession = Depends(get_crud_db)
+):
+    """
+    Получить несколько категорий по списку ID из тела запроса.
+    
+    - **ids**: список ID категорий
+    """
+    return await _categories_batch(request.ids, db)
+
+
+async def _categories_batch(category_ids: List[int], db) -> List[dict]:
+    categories = await async_crud.get_categories_by_ids(db, batch.check_batch_size(category_ids))
+    return [
+        {"id": category_id, "found": category_id in categories, "category": categories.get(category_id)}
+        for category_id in category_ids
+    ]
+
+
 @router.get("/{category_id}", response_model=schemas.Category)
-def read_category(
+async def read_category(
     category_id: int,
-    db: Session = Depends(get_db)
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_crud_db)
 ):
     """
     Получить категорию по ID.
     
     - **category_id**: ID категории
+    
+    Поддерживается условный запрос по ETag (If-None-Match → 304).
     """
-    category = crud.get_category(db, category_id=category_id)
+    category = await async_crud.get_category(db, category_id=category_id)
     if category is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Категория с ID {category_id} не найдена"
         )
+    
+    etag = etags.category_etag(category)
+    if etags.is_not_modified(if_none_match, etag):
+        return etags.not_modified(etag)
+    response.headers["ETag"] = etag
     return category
 
 
 @router.post("/", response_model=schemas.Category, status_code=status.HTTP_201_CREATED)
-def create_category(
+async def create_category(
     category: schemas.CategoryCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_crud_db)
 ):
     """
     Создать новую категорию.
@@ -55,49 +130,57 @@ def create_category(
     - **title**: название категории (обязательно)
     """
     # Проверяем, не существует ли уже категория с таким названием
-    db_category = crud.get_category_by_title(db, title=category.title)
+    db_category = await async_crud.get_category_by_title(db, title=category.title)
     if db_category:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Категория с таким названием уже существует"
         )
     
-    return crud.create_category(db=db, title=category.title)
+    return await async_crud.create_category(db=db, title=category.title)
 
 
 @router.put("/{category_id}", response_model=schemas.Category)
-def update_category(
+async def update_category(
     category_id: int,
     category_update: schemas.CategoryUpdate,
-    db: Session = Depends(get_db)
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_crud_db)
 ):
     """
     Обновить категорию.
     
     - **category_id**: ID обновляемой категории
     - **title**: новое название категории
+    
+    С заголовком If-Match категория обновляется, только если её ETag не изменился.
     """
-    db_category = crud.get_category(db, category_id=category_id)
+    db_category = await async_crud.get_category(db, category_id=category_id)
     if db_category is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Категория с ID {category_id} не найдена"
         )
+    etags.check_if_match(if_match, etags.category_etag(db_category))
     
     # Если передано новое название, проверяем уникальность
     if category_update.title is not None:
-        existing_category = crud.get_category_by_title(db, title=category_update.title)
+        existing_category = await async_crud.get_category_by_title(db, title=category_update.title)
         if existing_category and existing_category.id != category_id:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Категория с таким названием уже существует"
             )
     
-    updated_category = crud.update_category(
-        db=db, 
-        category_id=category_id, 
-        title=category_update.title or db_category.title
-    )
+    try:
+        updated_category = await async_crud.update_category(
+            db=db, 
+            category_id=category_id, 
+            title=category_update.title or db_category.title
+        )
+    except VersionConflictError:
+        raise etags.conflict(if_match)
     
     if updated_category is None:
         raise HTTPException(
@@ -105,33 +188,75 @@ def update_category(
             detail="Не удалось обновить категорию"
         )
     
+    response.headers["ETag"] = etags.category_etag(updated_category)
     return updated_category
 
 
-@router.delete("/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_category(
+@router.delete(
+    "/{category_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={status.HTTP_202_ACCEPTED: {
+        "model": schemas.CategoryDeletion, "description": "Фоновое удаление запущено"
+    }}
+)
+async def delete_category(
     category_id: int,
-    db: Session = Depends(get_db)
+    response: Response,
+    background: bool = Query(False, description="Удалять книги порциями в фоне (для больших категорий)"),
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_crud_db)
 ):
     """
     Удалить категорию.
     
     - **category_id**: ID удаляемой категории
+    - **background**: удалить в фоне порциями (ответ 202, ход удаления —
+      по ссылке из заголовка `Location`)
     
     Примечание: все книги в этой категории также будут удалены!
+    С заголовком If-Match категория удаляется, только если её ETag не изменился.
     """
-    db_category = crud.get_category(db, category_id=category_id)
+    db_category = await async_crud.get_category(db, category_id=category_id)
     if db_category is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Категория с ID {category_id} не найдена"
         )
     
-    success = crud.delete_category(db=db, category_id=category_id)
+    etags.check_if_match(if_match, etags.category_etag(db_category))
+    
+    if background:
+        job = deletions.start(category_id, db_category.book_count)
+        response.status_code = status.HTTP_202_ACCEPTED
+        response.headers["Location"] = f"/categories/deletions/{job.id}"
+        return schemas.CategoryDeletion.model_validate(job)
+    
+    try:
+        success = await async_crud.delete_category(db=db, category_id=category_id)
+    except VersionConflictError:
+        raise etags.conflict(if_match)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Не удалось удалить категорию"
         )
     
-    return None
\ No newline at end of file
+    return None
+
+
+@router.get("/deletions/{job_id}", response_model=schemas.CategoryDeletion)
+def read_category_deletion(job_id: str):
+    """
+    Ход фонового удаления категории.
+    
+    - **job_id**: ID задачи из ответа DELETE /categories/{category_id}?background=true
+    
+    Задачи хранятся в памяти процесса до его перезапуска.
+    """
+    job = deletions.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Задача удаления {job_id} не найдена"
+        )
+    return job
@@ -0,0 +1,81 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from app.db import crud
+from app.db.crud import ChangeLogTruncatedError
+from app.db.db import get_db
+from app import changefeed, schemas
+
+router = APIRouter(prefix="/changes", tags=["changes"])
+
+
+def _truncated(error: ChangeLogTruncatedError) -> HTTPException:
+    """Ошибка для клиента, который отстал дальше сжатия журнала"""
+    return HTTPException(
+        status_code=status.HTTP_410_GONE,
+        detail=(
+            f"Изменения до seq {error.truncated_seq} удалены из журнала: "
+            "нужна полная синхронизация"
+        )
+    )
+
+
+@router.get("", response_model=schemas.ChangeFeed)
+def read_changes(
+    since: Optional[int] = Query(None, ge=0, description="Номер последнего обработанного изменения"),
+    limit: int = Query(1000, ge=1, le=10000, description="Лимит записей"),
+    db: Session = Depends(get_db)
+):
+    """
+    Журнал изменений книг и категорий.
+
+    - **since**: номер последнего обработанного изменения (next_since
+      предыдущего ответа)
+    - **limit**: лимит записей
+
+    Запись журнала — ссылка на изменённую сущность (entity, entity_id, op):
+    текущее состояние перечитывается, например, через `/books/batch`.
+    Без since возвращается только next_since — позиция, с которой следить
+    за изменениями после полной выгрузки каталога. Если изменения после
+    since уже удалены сжатием журнала — ответ 410.
+    """
+    try:
+        rows, last_seq = crud.get_changes(db, since=since, limit=limit)
+    except ChangeLogTruncatedError as e:
+        raise _truncated(e)
+
+    next_since = rows[-1].seq if rows else (since if since is not None else last_seq)
+    return {"changes": rows, "next_since": next_since, "has_more": next_since < last_seq}
+
+
+@router.get("/stream")
+async def stream_changes(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0, description="Номер последнего обработанного изменения"),
+    last_event_id: Optional[int] = Header(None, ge=0),
+):
+    """
+    Поток изменений в формате Server-Sent Events.
+
+    - **since**: номер последнего обработанного изменения (по умолчанию —
+      только новые изменения)
+
+    Каждое изменение — событие `change` с id, равным seq; при
+    переподключении заголовок Last-Event-ID важнее since.
+    """
+    try:
+        position = await run_in_threadpool(
+            changefeed.resolve_since, last_event_id if last_event_id is not None else since
+        )
+    except ChangeLogTruncatedError as e:
+        raise _truncated(e)
+
+    return StreamingResponse(
+        changefeed.stream_changes(position, request.is_disconnected),
+        media_type="text/event-stream",
+        # Без буферизации в прокси события доходят до клиента сразу
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,112 @@
+"""
+ETag и условные запросы для книг и категорий.
+
+ETag строится из версий записей (колонка version), поэтому проверка
+If-None-Match не требует сериализации ответа, а If-Match даёт оптимистичную
+блокировку при изменении и удалении.
+"""
+
+import hashlib
+import re
+from typing import FrozenSet, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, Response, status
+
+from app.db import models
+
+
+def book_etag(book: models.Book) -> str:
+    """ETag книги (учитывает версию вложенной категории)"""
+    category_version = book.category.version if book.category is not None else 0
+    return f'"book-{book.id}-{book.version}-{category_version}"'
+
+
+_BOOK_ETAG = re.compile(r'^"book-(\d+)-(\d+)-(\d+)"$')
+
+
+def book_if_match_versions(if_match: Optional[str], book_id: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    If-Match книги как пары (версия книги, версия категории) для условия
+    в самом UPDATE/DELETE (crud.update_book_row, crud.delete_book_row).
+
+    None — условия нет (заголовка нет или *). Пустой список — ни один
+    ETag не может совпасть (слабые, чужие или не ETag книги).
+    """
+    if if_match is None:
+        return None
+    tags = _parse(if_match)
+    if "*" in tags:
+        return None
+    versions = []
+    for tag in tags:
+        match = _BOOK_ETAG.match(tag)
+        if match is not None and int(match.group(1)) == book_id:
+            versions.append((int(match.group(2)), int(match.group(3))))
+    return versions
+
+
+def book_row_etag(row) -> str:
+    """ETag книги из строки crud.get_book_rows (совпадает с book_etag)"""
+    category_version = getattr(row, "category_version", None) or 0
+    return f'"book-{row.id}-{row.version}-{category_version}"'
+
+
+def category_etag(category: models.Category) -> str:
+    """ETag категории (учитывает счётчик книг: он меняется без смены версии)"""
+    return f'"category-{category.id}-{category.version}-{category.book_count}"'
+
+
+def collection_etag(etags: Iterable[str], *extra: Optional[str]) -> str:
+    """ETag списка: хэш ETag элементов и дополнительных значений (например, курсора)"""
+    digest = hashlib.sha1()
+    for value in (*etags, *extra):
+        digest.update((value or "").encode("utf-8"))
+        digest.update(b"|")
+    return f'"{digest.hexdigest()}"'
+
+
+def with_fields(etag: str, fields: Optional[FrozenSet[str]]) -> str:
+    """ETag ответа с выбранными полями (у полного ответа — без изменений)"""
+    if fields is None:
+        return etag
+    return f'{etag[:-1]};{",".join(sorted(fields))}"'
+
+
+def _parse(header: str) -> List[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def is_not_modified(if_none_match: Optional[str], etag: str) -> bool:
+    """Совпадает ли If-None-Match с текущим ETag (слабое сравнение)"""
+    if not if_none_match:
+        return False
+    tags = [tag[2:] if tag.startswith("W/") else tag for tag in _parse(if_none_match)]
+    return "*" in tags or etag in tags
+
+
+def not_modified(etag: str, headers: Optional[dict] = None) -> Response:
+    """Ответ 304 без тела"""
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={**(headers or {}), "ETag": etag}
+    )
+
+
+def check_if_match(if_match: Optional[str], etag: str) -> None:
+    """Проверка If-Match (строгое сравнение); при несовпадении — 412"""
+    if if_match is None:
+        return
+    tags = _parse(if_match)
+    if "*" not in tags and etag not in tags:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="Ресурс был изменён: ETag не совпадает с If-Match"
+        )
+
+
+def conflict(if_match: Optional[str]) -> HTTPException:
+    """Ошибка для записи, изменённой параллельным запросом"""
+    return HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED if if_match else status.HTTP_409_CONFLICT,
+        detail="Ресурс был изменён другим запросом, повторите попытку"
+    )
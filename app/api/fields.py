@@ -0,0 +1,53 @@
+"""
+Выбор полей ответа книги (sparse fieldsets): параметры fields и include.
+
+fields=id,title,price — только перечисленные поля (id отдаётся всегда),
+include=description — добавить поле, которое по умолчанию не отдаётся.
+Набор полей передаётся в crud, и из базы читаются только нужные колонки.
+"""
+
+from typing import FrozenSet, Optional, Set, Tuple
+
+from fastapi import HTTPException, status
+
+from app import schemas
+
+
+# Поля, которые списки книг по умолчанию не отдают (неограниченный Text)
+LIST_DEFERRED_FIELDS = ("description",)
+
+
+def _parse(value: Optional[str], parameter: str) -> Set[str]:
+    if not value:
+        return set()
+    names = {part.strip() for part in value.split(",") if part.strip()}
+    unknown = names - set(schemas.BOOK_FIELDS)
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                f"Неизвестные поля в {parameter}: {', '.join(sorted(unknown))}. "
+                f"Допустимые: {', '.join(schemas.BOOK_FIELDS)}"
+            )
+        )
+    return names
+
+
+def book_fields(
+    fields: Optional[str],
+    include: Optional[str] = None,
+    deferred: Tuple[str, ...] = ()
+) -> Optional[FrozenSet[str]]:
+    """
+    Набор полей книги для ответа; None — все поля (полная схема Book).
+    
+    deferred — поля, которые отдаются, только если указаны в fields или include.
+    """
+    included = _parse(include, "include")
+    if fields is None:
+        selected = set(schemas.BOOK_FIELDS) - (set(deferred) - included)
+    else:
+        selected = {"id", *_parse(fields, "fields"), *included}
+    if selected == set(schemas.BOOK_FIELDS):
+        return None
+    return frozenset(selected)
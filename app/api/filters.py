@@ -0,0 +1,81 @@
+"""
+Фильтры списка книг по диапазонам цены и даты добавления, границы
+ценовых интервалов фасетов поиска.
+"""
+
+import math
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from app.db.crud import BOOK_SORT_COLUMNS
+
+
+# Допустимые значения sort_by (для Query(pattern=...))
+SORT_PATTERN = f"^({'|'.join(BOOK_SORT_COLUMNS)})$"
+
+# Границы ценовых интервалов фасетов по умолчанию и их максимальное число
+FACET_PRICE_EDGES = os.getenv("FACET_PRICE_EDGES", "100,300,500,1000,2000")
+FACET_MAX_PRICE_EDGES = int(os.getenv("FACET_MAX_PRICE_EDGES", "20"))
+
+
+def _utc(value: datetime) -> datetime:
+    """Дата без часового пояса в UTC (так хранится created_at)"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def book_ranges(
+    min_price: Optional[float],
+    max_price: Optional[float],
+    created_after: Optional[datetime],
+    created_before: Optional[datetime]
+) -> Dict[str, Any]:
+    """Проверка границ диапазонов; возвращает параметры фильтров для crud"""
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_price не может быть больше max_price"
+        )
+    if created_after is not None:
+        created_after = _utc(created_after)
+    if created_before is not None:
+        created_before = _utc(created_before)
+    if created_after is not None and created_before is not None and created_after >= created_before:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="created_after должна быть раньше created_before"
+        )
+    return {
+        "min_price": min_price,
+        "max_price": max_price,
+        "created_after": created_after,
+        "created_before": created_before,
+    }
+
+
+def price_edges(value: Optional[str]) -> Tuple[float, ...]:
+    """Разбор границ ценовых интервалов вида "100,500,1000" (по умолчанию FACET_PRICE_EDGES)"""
+    try:
+        edges = tuple(float(part) for part in (value or FACET_PRICE_EDGES).split(",") if part.strip())
+    except ValueError:
+        edges = (math.nan,)
+    if not all(map(math.isfinite, edges)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="price_buckets должен быть списком чисел через запятую"
+        )
+    if len(edges) > FACET_MAX_PRICE_EDGES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Слишком много границ price_buckets: максимум {FACET_MAX_PRICE_EDGES}"
+        )
+    if any(low >= high for low, high in zip(edges, edges[1:])):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Границы price_buckets должны возрастать"
+        )
+    return edges
@@ -0,0 +1,141 @@
+"""
+Быстрая сериализация больших списков книг в JSON.
+
+Обычный путь FastAPI для страницы из 1000 книг — объекты ORM, проверка
+каждого через schemas.Book (from_attributes) и json.dumps — занимает большую
+часть времени запроса. Здесь строки Core (crud.get_book_rows) проверяются
+одним TypeAdapter и кодируются orjson.
+
+Ответ побайтно совпадает с обычным: порядок полей задаёт схема, строки и
+даты orjson записывает так же, как json.dumps(ensure_ascii=False). Расходится
+только запись чисел с плавающей точкой в экспоненциальной форме (1e+16 против
+1e16) — страницы с такими ценами кодируются через json.dumps.
+
+Для ответов с выбранными полями (параметр fields, см. app/api/fields.py)
+схема строится из schemas.Book только с этими полями.
+"""
+
+from functools import lru_cache
+from typing import FrozenSet, Iterable, List, Optional, Type
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+from app import metrics, schemas
+
+
+# Вне этого диапазона float.__repr__ (и json.dumps) переходит к экспоненте
+_FIXED_NOTATION_MIN = 1e-4
+_FIXED_NOTATION_MAX = 1e16
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse, кодирующий содержимое через orjson"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+@lru_cache(maxsize=None)
+def book_adapter(
+    fields: Optional[FrozenSet[str]] = None,
+    base: Type[BaseModel] = schemas.Book,
+    many: bool = True
+) -> TypeAdapter:
+    """TypeAdapter списка (many) или одного ответа base с полями fields"""
+    model = base if fields is None else schemas.book_shape(fields, base)
+    return TypeAdapter(List[model] if many else model)
+
+
+def _same_as_json(items: Iterable[dict]) -> bool:
+    """Совпадает ли запись чисел в orjson и json.dumps"""
+    return all(
+        value == 0 or _FIXED_NOTATION_MIN <= abs(value) < _FIXED_NOTATION_MAX
+        for item in items for value in item.values() if type(value) is float
+    )
+
+
+def book_dict(row, fields: Optional[FrozenSet[str]] = None) -> dict:
+    """Строка crud.get_book_rows с полями fields в словарь для схемы книги"""
+    mapping = row._mapping
+    data = {
+        name: mapping[name]
+        for name in (schemas.BOOK_FIELDS if fields is None else fields)
+        if name != "category"
+    }
+    if fields is None or "category" in fields:
+        data["category"] = None if mapping["category_title"] is None else {
+            "id": mapping["category_id"],
+            "title": mapping["category_title"],
+            "created_at": mapping["category_created_at"],
+        }
+    return data
+
+
+def book_dicts(rows, fields: Optional[FrozenSet[str]] = None) -> List[dict]:
+    """Строки crud.get_book_rows в словари для схемы книги"""
+    if fields is not None:
+        return [book_dict(row, fields) for row in rows]
+    # Все колонки: распаковка кортежа быстрее обращения по именам
+    return [
+        {
+            "id": book_id,
+            "title": title,
+            "description": description,
+            "price": price,
+            "url": url,
+            "category_id": category_id,
+            "created_at": created_at,
+            "category": None if category_title is None else {
+                "id": category_id,
+                "title": category_title,
+                "created_at": category_created_at,
+            },
+        }
+        for (
+            book_id, title, description, price, url, category_id, created_at, _,
+            category_title, category_created_at, _
+        ) in rows
+    ]
+
+
+def json_response(adapter: TypeAdapter, content, headers: Optional[dict] = None) -> JSONResponse:
+    """
+    Проверка содержимого схемой adapter и ответ JSON.
+    
+    Байты ответа те же, что у FastAPI с response_model этой схемы.
+    """
+    with metrics.phase("serialize"):
+        validated = adapter.validate_python(content)
+        dumped = adapter.dump_python(validated)
+        if _same_as_json(dumped if isinstance(dumped, list) else [dumped]):
+            return ORJSONResponse(dumped, headers=headers)
+        return JSONResponse(adapter.dump_python(validated, mode="json"), headers=headers)
+
+
+def books_response(
+    rows,
+    fields: Optional[FrozenSet[str]] = None,
+    headers: Optional[dict] = None
+) -> JSONResponse:
+    """Ответ со списком книг (как у response_model=List[schemas.Book])"""
+    return json_response(book_adapter(fields), book_dicts(rows, fields), headers)
+
+
+def book_response(row, fields: Optional[FrozenSet[str]] = None, headers: Optional[dict] = None) -> JSONResponse:
+    """Ответ с одной книгой с полями fields"""
+    return json_response(book_adapter(fields, many=False), book_dict(row, fields), headers)
+
+
+def search_response(results, fields: Optional[FrozenSet[str]], headers: Optional[dict] = None) -> JSONResponse:
+    """Ответ с результатами поиска (пары строка книги — SearchHit) с полями fields"""
+    return json_response(book_adapter(fields, schemas.BookSearchResult), [
+        {
+            **book_dict(row, fields),
+            "score": -hit.rank,
+            "title_highlight": hit.title,
+            "description_snippet": hit.snippet,
+        }
+        for row, hit in results
+    ], headers)
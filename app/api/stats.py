@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from app.db import crud
+from app.db.db import get_db
+from app import schemas
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+
+@router.get("", response_model=schemas.LibraryStats)
+def read_stats(db: Session = Depends(get_db)):
+    """
+    Получить статистику библиотеки.
+    
+    Для каждой категории и для всей библиотеки: количество книг, суммарная,
+    средняя, минимальная и максимальная цена. Данные берутся из сводной
+    таблицы, поэтому время ответа не зависит от количества книг.
+    """
+    return crud.get_library_stats(db)
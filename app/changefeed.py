@@ -0,0 +1,93 @@
+"""
+Поток журнала изменений в формате Server-Sent Events.
+
+Генератор опрашивает журнал (таблицу changes) каждые CHANGES_POLL_INTERVAL
+секунд и отдаёт новые записи событиями `change` с id = seq: после обрыва
+соединения браузер переподключается с заголовком Last-Event-ID и
+продолжает с того же места. Если новых изменений нет CHANGES_HEARTBEAT
+секунд, отправляется комментарий-пульс, чтобы прокси не закрыли
+простаивающее соединение.
+
+Каждый опрос выполняется в отдельной сессии в пуле потоков: между
+опросами поток не держит ни соединение с базой, ни поток пула.
+"""
+
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.engine import Row
+
+from app import schemas
+from app.db import changes, crud
+from app.db.db import SessionLocal
+
+
+CHANGES_POLL_INTERVAL = float(os.getenv("CHANGES_POLL_INTERVAL", "1.0"))
+CHANGES_HEARTBEAT = float(os.getenv("CHANGES_HEARTBEAT", "15"))
+# Сколько записей читать за один опрос
+CHANGES_STREAM_BATCH = 1000
+
+
+def resolve_since(since: Optional[int]) -> int:
+    """
+    Позиция начала потока: since или, если его нет, последняя запись журнала.
+
+    Если записи после since уже удалены сжатием — ChangeLogTruncatedError.
+    """
+    db = SessionLocal()
+    try:
+        truncated_seq, last_seq = changes.positions(db.connection())
+    finally:
+        db.close()
+    if since is None:
+        return last_seq
+    if since < truncated_seq:
+        raise crud.ChangeLogTruncatedError(truncated_seq)
+    return since
+
+
+def _read(since: int, limit: int) -> List[Row]:
+    db = SessionLocal()
+    try:
+        return crud.get_changes(db, since, limit)[0]
+    finally:
+        db.close()
+
+
+def format_event(change: Row) -> str:
+    """Событие SSE для записи журнала"""
+    data = schemas.Change.model_validate(change).model_dump_json()
+    return f"id: {change.seq}\nevent: change\ndata: {data}\n\n"
+
+
+async def stream_changes(
+    since: int,
+    is_disconnected: Callable[[], Awaitable[bool]],
+    poll_interval: float = CHANGES_POLL_INTERVAL,
+    heartbeat: float = CHANGES_HEARTBEAT
+) -> AsyncIterator[str]:
+    """События SSE изменений после since, пока клиент не отключится"""
+    idle = 0.0
+    while not await is_disconnected():
+        try:
+            rows = await run_in_threadpool(_read, since, CHANGES_STREAM_BATCH)
+        except crud.ChangeLogTruncatedError as e:
+            # Клиент отстал дальше сжатия журнала: продолжать поток бессмысленно
+            yield f"event: truncated\ndata: {json.dumps({'truncated_seq': e.truncated_seq})}\n\n"
+            return
+        for row in rows:
+            yield format_event(row)
+            since = row.seq
+        if len(rows) == CHANGES_STREAM_BATCH:
+            # Журнал ещё не дочитан — следующая порция сразу
+            continue
+        if rows:
+            idle = 0.0
+        elif idle >= heartbeat:
+            yield ": keepalive\n\n"
+            idle = 0.0
+        await asyncio.sleep(poll_interval)
+        idle += poll_interval
@@ -0,0 +1,297 @@
+"""
+Генерация синтетического каталога книг для нагрузочных тестов.
+
+Размер задаётся коэффициентом масштаба: scale=1 — 10 категорий и 100 000
+книг, scale=100 — 100 категорий и 10 млн книг (категорий растёт как корень
+из масштаба). Генерация детерминирована: один и тот же seed даёт одинаковые
+данные.
+
+Распределения приближены к реальному каталогу: число слов в названии
+смещено к 2–4, длина описания — логнормальная (часть книг без описания),
+цены — логнормальные, размеры категорий — по закону Ципфа (несколько
+крупных категорий и длинный хвост мелких).
+
+Загрузка идёт в обход ORM: пачки executemany через подключение sqlite3 с
+PRAGMA профиля bulk. На время загрузки индексы и триггеры книг удаляются и
+затем создаются заново (в том числе при ошибке или прерывании загрузки);
+полнотекстовый индекс и category_stats пересчитываются одним проходом.
+"""
+
+import gc
+import itertools
+import math
+import random
+import time
+from typing import Callable, Dict, List, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from app.db import changes, search, stats
+from app.db.cache import entity_cache
+from app.db.db import engine, get_sqlite_pragmas
+
+
+BOOKS_PER_SCALE = 100_000
+CATEGORIES_PER_SCALE = 10
+DEFAULT_BATCH_SIZE = 100_000
+
+# Распределение числа слов в названии (1–8 слов)
+TITLE_WORDS_WEIGHTS = (10, 25, 25, 18, 10, 6, 4, 2)
+# Логнормальная длина описания в символах: медиана и разброс
+DESCRIPTION_MEDIAN = 350
+DESCRIPTION_SIGMA = 0.7
+DESCRIPTION_MAX = 4000
+NO_DESCRIPTION_SHARE = 0.08
+# Логнормальная цена: медиана и разброс
+PRICE_MEDIAN = 650.0
+PRICE_SIGMA = 0.55
+# Показатель закона Ципфа для размеров категорий
+CATEGORY_SKEW = 1.1
+# Интервал дат добавления книг
+CREATED_SPAN_DAYS = 5 * 365
+CREATED_START = 1_577_836_800  # 2020-01-01 UTC
+
+# Пулы заранее сгенерированных значений (выбор из пула быстрее генерации на строку)
+TITLE_POOL_SIZE = 1 << 16
+DESCRIPTION_POOL_SIZE = 1 << 12
+PRICE_POOL_SIZE = 10_007
+
+GENRES = (
+    "Фантастика", "Фэнтези", "Детектив", "Триллер", "Роман", "Классика",
+    "Поэзия", "История", "Биография", "Психология", "Философия", "Бизнес",
+    "Экономика", "Программирование", "Математика", "Физика", "Медицина",
+    "Кулинария", "Путешествия", "Искусство", "Музыка", "Детская литература",
+    "Приключения", "Ужасы", "Юмор", "Религия", "Спорт", "Здоровье", "Право",
+    "Языкознание",
+)
+
+ADJECTIVES = (
+    "тихий", "последний", "новый", "тёмный", "северный", "великий", "забытый",
+    "золотой", "чистый", "быстрый", "вечный", "красный", "далёкий", "простой",
+    "тайный", "живой", "большой", "первый", "ночной", "светлый",
+)
+
+NOUNS = (
+    "дом", "путь", "код", "город", "сад", "мир", "берег", "ветер", "остров",
+    "человек", "алгоритм", "океан", "лес", "замок", "голос", "след", "сон",
+    "закон", "рассвет", "капитан", "архив", "мост", "свет", "век", "язык",
+)
+
+WORDS = ADJECTIVES + NOUNS + (
+    "история", "книга", "глава", "время", "жизнь", "дорога", "война", "любовь",
+    "система", "данные", "практика", "теория", "руководство", "герой", "тайна",
+    "и", "в", "на", "о", "для", "под", "через", "между", "после", "среди",
+)
+
+_INSERT_CATEGORY = "INSERT INTO categories (id, title, created_at) VALUES (?, ?, datetime(?, 'unixepoch'))"
+# url и created_at вычисляются в SQLite, чтобы не форматировать их в Python
+_INSERT_BOOK = (
+    "INSERT INTO books (id, title, description, price, url, category_id, created_at) "
+    "VALUES (?1, ?2, ?3, ?4, 'https://example.com/books/' || ?1, ?5, datetime(?6, 'unixepoch'))"
+)
+
+
+def scale_size(scale: float) -> Dict[str, int]:
+    """Число категорий и книг для коэффициента масштаба"""
+    return {
+        "categories": max(1, round(CATEGORIES_PER_SCALE * math.sqrt(scale))),
+        "books": max(1, round(BOOKS_PER_SCALE * scale)),
+    }
+
+
+def category_titles(count: int) -> List[str]:
+    """Уникальные названия категорий"""
+    titles = []
+    for index in range(count):
+        genre = GENRES[index % len(GENRES)]
+        series = index // len(GENRES)
+        titles.append(genre if series == 0 else f"{genre} {series + 1}")
+    return titles
+
+
+def _title(rng: random.Random) -> str:
+    words = rng.choices(range(1, len(TITLE_WORDS_WEIGHTS) + 1), TITLE_WORDS_WEIGHTS)[0]
+    parts = [rng.choice(ADJECTIVES).capitalize(), rng.choice(NOUNS)][:words]
+    parts += rng.choices(WORDS, k=words - len(parts))
+    return " ".join(parts)
+
+
+def _description(rng: random.Random) -> Optional[str]:
+    if rng.random() < NO_DESCRIPTION_SHARE:
+        return None
+    length = min(DESCRIPTION_MAX, int(rng.lognormvariate(math.log(DESCRIPTION_MEDIAN), DESCRIPTION_SIGMA)))
+    words, size = [], 0
+    while size < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words).capitalize() + "."
+
+
+def _price(rng: random.Random) -> float:
+    return round(rng.lognormvariate(math.log(PRICE_MEDIAN), PRICE_SIGMA), 2)
+
+
+class Dataset:
+    """Детерминированный генератор строк категорий и книг"""
+
+    def __init__(self, categories: int, books: int, seed: int = 0):
+        self.categories = categories
+        self.books = books
+        self.seed = seed
+        rng = random.Random(seed)
+        self.titles = [_title(rng) for _ in range(TITLE_POOL_SIZE)]
+        self.descriptions = [_description(rng) for _ in range(DESCRIPTION_POOL_SIZE)]
+        self.prices = [_price(rng) for _ in range(PRICE_POOL_SIZE)]
+
+        # Ранги Ципфа достаются категориям в случайном порядке
+        ranks = list(range(1, categories + 1))
+        rng.shuffle(ranks)
+        weights = [1 / rank ** CATEGORY_SKEW for rank in ranks]
+        self.category_ids = list(range(1, categories + 1))
+        self.category_cum_weights = list(itertools.accumulate(weights))
+        self.created_step = max(1, CREATED_SPAN_DAYS * 86400 // max(books, 1))
+
+    def category_rows(self):
+        """Строки категорий (id, название, время создания)"""
+        return [
+            (category_id, title, CREATED_START)
+            for category_id, title in zip(self.category_ids, category_titles(self.categories))
+        ]
+
+    def book_batches(self, batch_size: int = DEFAULT_BATCH_SIZE):
+        """
+        Пачки строк книг (id, название, описание, цена, категория, время создания).
+
+        Каждая пачка генерируется своим генератором случайных чисел от seed
+        и номера первой книги: данные совпадают при тех же seed и batch_size.
+        """
+        for start in range(1, self.books + 1, batch_size):
+            count = min(batch_size, self.books + 1 - start)
+            rng = random.Random(f"{self.seed}:{start}")
+            ids = range(start, start + count)
+            created = range(
+                CREATED_START + start * self.created_step,
+                CREATED_START + (start + count) * self.created_step,
+                self.created_step
+            )
+            yield list(zip(
+                ids,
+                rng.choices(self.titles, k=count),
+                rng.choices(self.descriptions, k=count),
+                rng.choices(self.prices, k=count),
+                rng.choices(self.category_ids, cum_weights=self.category_cum_weights, k=count),
+                created,
+            ))
+
+
+def _drop_book_schema_objects(db: Session) -> List[str]:
+    """
+    Удаление индексов и триггеров таблицы books.
+
+    Возвращает их DDL для восстановления после загрузки. Автоматические
+    индексы (первичный ключ, UNIQUE) не удаляются.
+    """
+    rows = db.execute(sa.text(
+        "SELECT type, name, sql FROM sqlite_master "
+        "WHERE tbl_name = 'books' AND type IN ('index', 'trigger') AND sql IS NOT NULL"
+    )).all()
+    for object_type, name, _ in rows:
+        db.execute(sa.text(f"DROP {object_type.upper()} {name}"))
+    db.commit()
+    return [sql for _, _, sql in rows]
+
+
+def _insert(
+    dataset: Dataset,
+    batch_size: int,
+    progress: Optional[Callable[[int, float], None]]
+) -> float:
+    """Вставка категорий и книг; возвращает длительность вставки книг"""
+    # Загрузка через подключение sqlite3 с PRAGMA профиля bulk (кроме режима
+    # журнала — он сохраняется в файле базы); подключение затем закрывается
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        for name, value in get_sqlite_pragmas("bulk").items():
+            if name != "journal_mode":
+                cursor.execute(f"PRAGMA {name} = {value}")
+        # Книги ссылаются на только что вставленные категории: проверка
+        # внешнего ключа на каждую строку лишь замедляет вставку
+        cursor.execute("PRAGMA foreign_keys = OFF")
+        cursor.executemany(_INSERT_CATEGORY, dataset.category_rows())
+        raw.commit()
+
+        # Пачки — сотни тысяч кортежей без циклических ссылок: сборщик мусора
+        # на время загрузки выключается, иначе он многократно обходит их
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        insert_started = time.perf_counter()
+        loaded = 0
+        try:
+            for batch in dataset.book_batches(batch_size):
+                cursor.executemany(_INSERT_BOOK, batch)
+                raw.commit()
+                loaded += len(batch)
+                if progress is not None:
+                    progress(loaded, time.perf_counter() - insert_started)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        cursor.close()
+        return time.perf_counter() - insert_started
+    finally:
+        raw.invalidate()
+
+
+def _restore(db: Session, restore: List[str], timings: Dict[str, float]) -> None:
+    """Восстановление индексов и триггеров книг, полнотекстового индекса, статистики и журнала"""
+    phase = time.perf_counter()
+    for statement in restore:
+        db.execute(sa.text(statement))
+    db.commit()
+    timings["indexes"] = time.perf_counter() - phase
+
+    phase = time.perf_counter()
+    if search.is_available(db):
+        search.rebuild_index(db)
+    stats.rebuild(db)
+    # Загрузка шла в обход триггеров журнала: клиентам нужна полная синхронизация
+    changes.reset(db)
+    timings["search_and_stats"] = time.perf_counter() - phase
+
+
+def load(
+    db: Session,
+    dataset: Dataset,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    progress: Optional[Callable[[int, float], None]] = None
+) -> Dict[str, float]:
+    """
+    Замена данных базы синтетическим каталогом.
+
+    progress(загружено книг, прошло секунд) вызывается после каждой пачки.
+    Возвращает длительность этапов в секундах и скорость вставки книг.
+    """
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+
+    restore = _drop_book_schema_objects(db)
+    try:
+        db.execute(sa.text("DELETE FROM books"))
+        db.execute(sa.text("DELETE FROM category_stats"))
+        db.execute(sa.text("DELETE FROM categories"))
+        db.commit()
+        entity_cache.clear()
+        timings["insert"] = _insert(dataset, batch_size, progress)
+    finally:
+        # Индексы, триггеры и производные данные восстанавливаются и при
+        # ошибке или прерывании загрузки: по версии схемы миграции считают,
+        # что они есть, и сами их не создадут
+        db.rollback()
+        _restore(db, restore, timings)
+
+    timings["total"] = time.perf_counter() - started
+    timings["insert_rows_per_second"] = dataset.books / timings["insert"] if timings["insert"] else 0.0
+    return timings
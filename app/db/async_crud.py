@@ -0,0 +1,157 @@
+"""
+Асинхронные версии функций crud для эндпоинтов API.
+
+Запросы выполняют те же функции crud через db.run_sync, поэтому SQL
+в синхронном и асинхронном режимах одинаковый. db — AsyncSession
+(DB_MODE=async) или ThreadPoolSession (DB_MODE=sync, функции crud
+выполняются в пуле потоков), см. get_crud_db. Категории книг загружаются
+внутри run_sync: ленивая загрузка связей за его пределами невозможна.
+"""
+
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import coalescer, crud, models, search
+
+
+def _preload_categories(result: Any) -> Any:
+    """Загрузка категорий у книг из результата (книга, список или страница)"""
+    if isinstance(result, models.Book):
+        result.category
+    elif isinstance(result, (list, tuple)):
+        for item in result:
+            _preload_categories(item)
+    return result
+
+
+def _with_categories(fn: Callable) -> Callable:
+    def wrapper(db, *args, **kwargs):
+        return _preload_categories(fn(db, *args, **kwargs))
+    return wrapper
+
+
+# ========== CRUD для категорий (Category) ==========
+async def create_category(db: AsyncSession, title: str) -> models.Category:
+    """Создание новой категории"""
+    return await db.run_sync(crud.create_category, title=title)
+
+
+async def get_category(db: AsyncSession, category_id: int) -> Optional[models.Category]:
+    """Получение категории по ID"""
+    return await db.run_sync(crud.get_category, category_id=category_id)
+
+
+async def get_categories_by_ids(db: AsyncSession, category_ids: List[int]) -> Dict[int, models.Category]:
+    """Получение категорий по списку ID одним запросом"""
+    return await db.run_sync(crud.get_categories_by_ids, category_ids=category_ids)
+
+
+async def get_category_by_title(db: AsyncSession, title: str) -> Optional[models.Category]:
+    """Получение категории по названию"""
+    return await db.run_sync(crud.get_category_by_title, title=title)
+
+
+async def get_categories_page(
+    db: AsyncSession, **kwargs
+) -> Tuple[List[models.Category], Optional[str]]:
+    """Получение страницы категорий и курсора следующей страницы"""
+    return await db.run_sync(crud.get_categories_page, **kwargs)
+
+
+async def update_category(
+    db: AsyncSession,
+    category_id: int,
+    title: str
+) -> Optional[models.Category]:
+    """Обновление категории"""
+    return await db.run_sync(crud.update_category, category_id=category_id, title=title)
+
+
+async def delete_category(db: AsyncSession, category_id: int) -> bool:
+    """Удаление категории (вместе со всеми связанными книгами)"""
+    return await db.run_sync(crud.delete_category, category_id=category_id)
+
+
+# ========== CRUD для книг (Book) ==========
+async def create_book(db: AsyncSession, **kwargs) -> models.Book:
+    """Создание новой книги (через коалесцер записи, если он включён)"""
+    if coalescer.WRITE_COALESCE:
+        return await asyncio.wrap_future(coalescer.submit_create_book(**kwargs))
+    return await db.run_sync(_with_categories(crud.create_book), **kwargs)
+
+
+async def get_book(db: AsyncSession, book_id: int) -> Optional[models.Book]:
+    """Получение книги по ID"""
+    return await db.run_sync(_with_categories(crud.get_book), book_id=book_id)
+
+
+async def get_books_by_ids(
+    db: AsyncSession, book_ids: List[int], with_category: bool = True
+) -> Dict[int, models.Book]:
+    """Получение книг по списку ID одним запросом"""
+    return await db.run_sync(crud.get_books_by_ids, book_ids=book_ids, with_category=with_category)
+
+
+async def get_books_page(
+    db: AsyncSession, **kwargs
+) -> Tuple[List[models.Book], Optional[str]]:
+    """Получение страницы книг и курсора следующей страницы"""
+    return await db.run_sync(_with_categories(crud.get_books_page), **kwargs)
+
+
+async def get_book_rows_page(
+    db: AsyncSession, **kwargs
+) -> Tuple[List[Row], Optional[str]]:
+    """Страница книг строками Core и курсор следующей страницы"""
+    return await db.run_sync(crud.get_book_rows_page, **kwargs)
+
+
+async def get_book_row(db: AsyncSession, book_id: int, fields=None) -> Optional[Row]:
+    """Книга по ID строкой Core только с колонками полей fields"""
+    return await db.run_sync(crud.get_book_row, book_id=book_id, fields=fields)
+
+
+async def update_book(db: AsyncSession, book_id: int, **kwargs) -> Optional[models.Book]:
+    """Обновление книги"""
+    return await db.run_sync(_with_categories(crud.update_book), book_id=book_id, **kwargs)
+
+
+async def delete_book(db: AsyncSession, book_id: int) -> bool:
+    """Удаление книги"""
+    return await db.run_sync(crud.delete_book, book_id=book_id)
+
+
+async def update_book_row(
+    db: AsyncSession, book_id: int, versions: Optional[coalescer.Versions] = None, **kwargs
+) -> Optional[Row]:
+    """Обновление книги одним запросом (через коалесцер записи, если он включён)"""
+    if coalescer.WRITE_COALESCE:
+        return await asyncio.wrap_future(coalescer.submit_update_book(book_id, versions, **kwargs))
+    return await db.run_sync(crud.update_book_row, book_id=book_id, versions=versions, **kwargs)
+
+
+async def delete_book_row(db: AsyncSession, book_id: int, versions: Optional[coalescer.Versions] = None) -> bool:
+    """Удаление книги одним запросом (через коалесцер записи, если он включён)"""
+    if coalescer.WRITE_COALESCE:
+        return await asyncio.wrap_future(coalescer.submit_delete_book(book_id, versions))
+    return await db.run_sync(crud.delete_book_row, book_id=book_id, versions=versions)
+
+
+async def upsert_book_row(db: AsyncSession, **kwargs) -> Tuple[Row, str]:
+    """Добавление или обновление книги по ссылке (inserted, updated или unchanged)"""
+    return await db.run_sync(crud.upsert_book_row, **kwargs)
+
+
+async def search_books_page(
+    db: AsyncSession, **kwargs
+) -> Tuple[List[Tuple[models.Book, search.SearchHit]], Optional[str]]:
+    """Поиск книг с ранжированием, подсветкой и курсорной пагинацией"""
+    return await db.run_sync(_with_categories(crud.search_books_page), **kwargs)
+
+
+async def search_facets(db: AsyncSession, **kwargs) -> Dict[str, Any]:
+    """Фасеты результатов поиска: по категориям и ценовым интервалам"""
+    return await db.run_sync(crud.search_facets, **kwargs)
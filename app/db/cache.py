@@ -0,0 +1,221 @@
+"""
+Кэш сущностей (книг и категорий) с чтением через кэш.
+
+В кэше хранятся снимки колонок записи (словари), а не ORM-объекты, поэтому
+хранилище можно заменить на общее (например, Redis), реализовав интерфейс
+CacheBackend. По умолчанию используется локальный LRU-кэш процесса с TTL.
+
+crud сбрасывает записи при изменении и удалении. Изменения, сделанные
+другим процессом (init_db, CLI, другой воркер), локальный кэш увидит только
+по истечении TTL.
+
+Чтение через кэш: при промахе берётся поколение ключа (generation), затем
+запись читается из базы и сохраняется (store) с этим поколением. Сброс
+(invalidate) увеличивает поколение, поэтому снимок, прочитанный до
+изменения, но сохраняемый после его сброса, в кэш не попадёт.
+"""
+
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+
+# Максимальное число записей (0 — кэш выключен) и время жизни записи в секундах
+ENTITY_CACHE_SIZE = int(os.getenv("ENTITY_CACHE_SIZE", "10000"))
+ENTITY_CACHE_TTL = float(os.getenv("ENTITY_CACHE_TTL", "60"))
+# Число счётчиков поколений: ключи распределяются по ним по хэшу, поэтому
+# память не растёт с числом изменённых записей (общий счётчик у разных
+# ключей лишь изредка отменяет сохранение в кэш)
+GENERATION_SLOTS = 4096
+
+
+class CacheBackend(ABC):
+    """Интерфейс хранилища кэша"""
+
+    @abstractmethod
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Значение по ключу или None"""
+
+    @abstractmethod
+    def set(self, key: Hashable, value: Any) -> None:
+        """Сохранение значения"""
+
+    @abstractmethod
+    def delete(self, key: Hashable) -> None:
+        """Удаление значения"""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Удаление всех значений"""
+
+    def delete_where(self, predicate: Callable[[Hashable, Any], bool]) -> None:
+        """
+        Удаление значений, для которых predicate(ключ, значение) истинно.
+
+        По умолчанию удаляются все значения: хранилищу, которое не умеет
+        перебирать ключи, это безопаснее, чем оставить устаревшие.
+        """
+        self.clear()
+
+    def __len__(self) -> int:
+        return 0
+
+
+class LocalCacheBackend(CacheBackend):
+    """Локальный LRU-кэш в памяти процесса с ограничением размера и TTL"""
+
+    def __init__(self, max_size: int = ENTITY_CACHE_SIZE, ttl: float = ENTITY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Hashable, Any], bool]) -> None:
+        with self._lock:
+            for key in [key for key, (_, value) in self._data.items() if predicate(key, value)]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class EntityCache:
+    """Кэш записей моделей по первичному ключу со счётчиками попаданий"""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+        self._generations = [0] * GENERATION_SLOTS
+        self._lock = threading.Lock()
+
+    def load(self, db: Session, model, entity_id: int):
+        """
+        Объект модели из кэша, присоединённый к сессии db, или None.
+
+        merge(load=False) не выполняет запросов к базе.
+        """
+        table = model.__tablename__
+        data = self.backend.get((table, entity_id))
+        # Запросы обрабатываются в потоках пула: без блокировки инкременты теряются
+        with self._lock:
+            counters = self.misses if data is None else self.hits
+            counters[table] = counters.get(table, 0) + 1
+        if data is None:
+            return None
+
+        instance = model(**data)
+        make_transient_to_detached(instance)
+        return db.merge(instance, load=False)
+
+    def generation(self, model, entity_id: int) -> int:
+        """Поколение записи: берётся перед чтением из базы и передаётся в store"""
+        return self._generations[hash((model.__tablename__, entity_id)) % GENERATION_SLOTS]
+
+    def store(self, instance, generation: int) -> None:
+        """
+        Сохранение снимка колонок объекта.
+
+        Если после получения generation запись сбрасывалась, снимок мог
+        устареть и не сохраняется.
+        """
+        mapper = inspect(instance).mapper
+        data = {attr.key: getattr(instance, attr.key) for attr in mapper.column_attrs}
+        key = (mapper.local_table.name, data["id"])
+        with self._lock:
+            if self._generations[hash(key) % GENERATION_SLOTS] != generation:
+                return
+            self.backend.set(key, data)
+
+    def invalidate(self, model, *entity_ids: int) -> None:
+        """Сброс записей модели по ID"""
+        for entity_id in entity_ids:
+            key = (model.__tablename__, entity_id)
+            with self._lock:
+                self._generations[hash(key) % GENERATION_SLOTS] += 1
+                self.backend.delete(key)
+
+    def invalidate_where(self, model, **values: Any) -> None:
+        """
+        Сброс записей модели, у которых колонки равны values (например,
+        книг категории), без перечисления их ID.
+
+        Просматривается только кэш, а не таблица: время не зависит от числа
+        подходящих записей в базе.
+        """
+        table = model.__tablename__
+
+        def matches(key: Hashable, data: Dict[str, Any]) -> bool:
+            return key[0] == table and all(data.get(name) == value for name, value in values.items())
+
+        with self._lock:
+            # ID сбрасываемых записей неизвестны: увеличиваются поколения всех ключей
+            self._generations = [generation + 1 for generation in self._generations]
+            self.backend.delete_where(matches)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generations = [generation + 1 for generation in self._generations]
+            self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики попаданий и промахов по таблицам"""
+        with self._lock:
+            hits, misses = dict(self.hits), dict(self.misses)
+        return {
+            "size": len(self.backend),
+            "tables": {
+                table: {"hits": hits.get(table, 0), "misses": misses.get(table, 0)}
+                for table in sorted(set(hits) | set(misses))
+            },
+        }
+
+    def reset_stats(self) -> None:
+        """Обнуление счётчиков попаданий и промахов"""
+        with self._lock:
+            self.hits.clear()
+            self.misses.clear()
+
+
+entity_cache = EntityCache(LocalCacheBackend())
+
+
+def configure(backend: CacheBackend) -> None:
+    """Замена хранилища кэша (например, на общее для нескольких процессов)"""
+    entity_cache.backend = backend
+    entity_cache.reset_stats()
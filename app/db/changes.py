@@ -0,0 +1,152 @@
+"""
+Журнал изменений каталога (таблица changes) для инкрементальной синхронизации.
+
+Каждое добавление, изменение и удаление книги или категории записывается
+в журнал триггером — в той же транзакции, что и само изменение, при любом
+способе записи (ORM, запросы Core, upsert, каскадное удаление книг
+категории). Номер записи seq — AUTOINCREMENT: растёт монотонно и не
+переиспользуется после удаления записей. Изменением считается смена
+версии записи, поэтому пересчёт categories.book_count триггерами в журнал
+не попадает.
+
+Запись журнала — только ссылка на изменённую сущность: клиент забирает
+записи с seq больше последнего обработанного и перечитывает текущее
+состояние сущностей (например, через /books/batch).
+
+Сжатие (compact):
+    - удаляются записи, у сущности которых есть более поздняя запись:
+      клиент всё равно перечитает текущее состояние по ней. После этого в
+      журнале не больше одной записи на сущность;
+    - удаляются записи старше срока хранения. Номер последней из них
+      запоминается в change_log_state.truncated_seq: клиенту, который
+      отстал дальше него, нужна полная синхронизация.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Tuple
+
+from sqlalchemy.orm import Session
+
+
+CHANGE_LOG_RETENTION_DAYS = float(os.getenv("CHANGE_LOG_RETENTION_DAYS", "7"))
+
+_ENTITIES = (("book", "books"), ("category", "categories"))
+
+_CREATE_TRIGGERS = [
+    statement
+    for entity, table in _ENTITIES
+    for statement in (
+        f"""
+        CREATE TRIGGER changes_{table}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO changes (entity, entity_id, op, version) VALUES ('{entity}', new.id, 'insert', new.version);
+        END
+        """,
+        f"""
+        CREATE TRIGGER changes_{table}_au AFTER UPDATE ON {table}
+        WHEN old.version IS NOT new.version
+        BEGIN
+            INSERT INTO changes (entity, entity_id, op, version) VALUES ('{entity}', new.id, 'update', new.version);
+        END
+        """,
+        f"""
+        CREATE TRIGGER changes_{table}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO changes (entity, entity_id, op, version) VALUES ('{entity}', old.id, 'delete', old.version);
+        END
+        """,
+    )
+]
+
+# Записи, у сущности которых есть запись новее (индекс ix_changes_entity)
+_DELETE_SUPERSEDED = """
+    DELETE FROM changes
+    WHERE EXISTS (
+        SELECT 1 FROM changes AS later
+        WHERE later.entity = changes.entity
+          AND later.entity_id = changes.entity_id
+          AND later.seq > changes.seq
+    )
+"""
+
+# Записи добавляются по времени, поэтому поиск первой свежей записи
+# просматривает по seq только устаревшее начало журнала
+_FIRST_KEPT_SEQ = "SELECT seq FROM changes WHERE changed_at >= ? ORDER BY seq LIMIT 1"
+
+
+class Compaction(NamedTuple):
+    """Результат сжатия журнала"""
+    superseded: int
+    expired: int
+    truncated_seq: int
+
+
+def create_change_log_triggers(connection) -> None:
+    """Создание триггеров журнала изменений"""
+    if connection.dialect.name != "sqlite":
+        return
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'changes_books_ai'"
+    ).first()
+    if exists:
+        return
+    for statement in _CREATE_TRIGGERS:
+        connection.exec_driver_sql(statement)
+
+
+def truncated_seq(connection) -> int:
+    """Номер, до которого (включительно) журнал усечён по сроку хранения"""
+    return connection.exec_driver_sql(
+        "SELECT coalesce(max(truncated_seq), 0) FROM change_log_state"
+    ).scalar()
+
+
+def positions(connection) -> Tuple[int, int]:
+    """
+    Номер усечения журнала и номер последней записи.
+
+    Последний номер берётся из sqlite_sequence: он не уменьшается, даже
+    если журнал пуст после сжатия.
+    """
+    return tuple(connection.exec_driver_sql(
+        "SELECT (SELECT coalesce(max(truncated_seq), 0) FROM change_log_state), "
+        "coalesce((SELECT seq FROM sqlite_sequence WHERE name = 'changes'), 0)"
+    ).one())
+
+
+def _truncate(connection, seq: int) -> None:
+    connection.exec_driver_sql(
+        "INSERT INTO change_log_state (id, truncated_seq) VALUES (1, ?) "
+        "ON CONFLICT (id) DO UPDATE SET truncated_seq = max(truncated_seq, excluded.truncated_seq)",
+        (seq,)
+    )
+
+
+def compact(db: Session, retention: timedelta) -> Compaction:
+    """Сжатие журнала: записи, замещённые более поздними, и записи старше retention"""
+    connection = db.connection()
+    superseded = connection.exec_driver_sql(_DELETE_SUPERSEDED).rowcount
+    cutoff = (datetime.now(timezone.utc) - retention).strftime("%Y-%m-%d %H:%M:%S")
+    first_kept = connection.exec_driver_sql(_FIRST_KEPT_SEQ, (cutoff,)).scalar()
+    last_expired = connection.exec_driver_sql(
+        "SELECT max(seq) FROM changes WHERE seq < ?", (first_kept or 2 ** 63 - 1,)
+    ).scalar()
+    expired = 0
+    if last_expired is not None:
+        expired = connection.exec_driver_sql("DELETE FROM changes WHERE seq <= ?", (last_expired,)).rowcount
+        _truncate(connection, last_expired)
+    result = Compaction(superseded, expired, truncated_seq(connection))
+    db.commit()
+    return result
+
+
+def reset(db: Session) -> None:
+    """
+    Очистка журнала после замены данных в обход триггеров (app.dataset).
+
+    Все клиенты получают требование полной синхронизации.
+    """
+    connection = db.connection()
+    _, last_seq = positions(connection)
+    connection.exec_driver_sql("DELETE FROM changes")
+    _truncate(connection, last_seq)
+    db.commit()
@@ -0,0 +1,210 @@
+"""
+Групповая фиксация записи книг (WRITE_COALESCE=1).
+
+SQLite выполняет записи по одной: каждая фиксация — отдельная запись в
+журнал (с fsync при synchronous=FULL), а параллельные писатели ждут
+блокировку в busy_timeout. Коалесцер собирает одновременные создания,
+изменения и удаления книг за окно WRITE_COALESCE_WINDOW_MS (но не больше
+WRITE_COALESCE_MAX_BATCH операций) и выполняет их в своём потоке одной
+транзакцией.
+
+Каждая операция выполняется в своей точке сохранения (SAVEPOINT): ошибка
+одной операции откатывает только её, и вызывающий получает свой результат
+или исключение. Ошибка фиксации всей пачки передаётся всем её операциям.
+Ошибка после фиксации (сброс кэша, загрузка категорий созданных книг)
+только записывается в журнал: операции уже зафиксированы, и вызывающие
+получают свои результаты, иначе они повторили бы уже выполненную запись.
+
+Операции ставятся в очередь функциями submit_*; при выключенном коалесцере
+async_crud вызывает crud с сессией запроса.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, sessionmaker
+
+from . import crud, models
+from .cache import entity_cache
+from .db import engine
+
+
+WRITE_COALESCE = os.getenv("WRITE_COALESCE", "0") == "1"
+WRITE_COALESCE_WINDOW_MS = float(os.getenv("WRITE_COALESCE_WINDOW_MS", "2"))
+WRITE_COALESCE_MAX_BATCH = int(os.getenv("WRITE_COALESCE_MAX_BATCH", "100"))
+
+logger = logging.getLogger("app.db.coalescer")
+
+# Пары (версия книги, версия категории) из If-Match, см. crud.update_book_row
+Versions = Sequence[Tuple[int, int]]
+
+
+class _Batch:
+    """Последствия операций пачки, которые применяются после фиксации"""
+
+    def __init__(self):
+        # Созданные книги: после фиксации загружаются значения по умолчанию
+        # на стороне базы (created_at) и подставляются категории
+        self.created: List[models.Book] = []
+        self.book_ids: Set[int] = set()
+        self.category_ids: Set[int] = set()
+
+
+def _create(db: Session, batch: _Batch, fields: dict) -> models.Book:
+    db_book = models.Book(**fields)
+    db.add(db_book)
+    try:
+        db.flush()
+    except IntegrityError as e:
+        raise crud.integrity_error(e) from e
+    batch.created.append(db_book)
+    batch.category_ids.add(db_book.category_id)
+    return db_book
+
+
+def _update(
+    db: Session, batch: _Batch, book_id: int, versions: Optional[Versions], fields: dict
+) -> Optional[Row]:
+    row = crud.update_book_row_uncommitted(db, book_id, versions, fields)
+    if row is not None:
+        batch.book_ids.add(book_id)
+        if row.old_category_id != row.category_id:
+            batch.category_ids.update((row.old_category_id, row.category_id))
+    return row
+
+
+def _delete(db: Session, batch: _Batch, book_id: int, versions: Optional[Versions]) -> bool:
+    row = crud.delete_book_row_uncommitted(db, book_id, versions)
+    if row is None:
+        return False
+    batch.book_ids.add(book_id)
+    batch.category_ids.add(row.category_id)
+    return True
+
+
+class WriteCoalescer:
+    """Поток, выполняющий операции записи пачками в одной транзакции"""
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        window: float = WRITE_COALESCE_WINDOW_MS / 1000,
+        max_batch: int = WRITE_COALESCE_MAX_BATCH
+    ):
+        self.session_factory = session_factory
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.operations = 0
+        self._queue: "queue.Queue[Tuple[Callable, Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="write-coalescer", daemon=True)
+        self._thread.start()
+
+    def submit(self, operation: Callable[[Session, _Batch], Any]) -> Future:
+        """Постановка операции в очередь; результат — через Future"""
+        future: Future = Future()
+        self._queue.put((operation, future))
+        return future
+
+    def _collect(self) -> List[Tuple[Callable, Future]]:
+        """Первая операция очереди и всё, что придёт за окно"""
+        items = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(items) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            try:
+                items.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _run(self) -> None:
+        while True:
+            items = self._collect()
+            db = self.session_factory()
+            try:
+                self._execute(db, items)
+            except Exception as e:
+                logger.exception("Пачка записей не зафиксирована")
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                db.close()
+
+    def _execute(self, db: Session, items: List[Tuple[Callable, Future]]) -> None:
+        batch = _Batch()
+        # Явный BEGIN: иначе первая точка сохранения сама откроет транзакцию
+        # и её RELEASE зафиксирует операцию отдельно (драйвер sqlite3).
+        # IMMEDIATE сразу берёт блокировку записи
+        if engine.dialect.name == "sqlite":
+            db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+        results = []
+        for operation, future in items:
+            try:
+                with db.begin_nested():
+                    results.append((future, operation(db, batch), None))
+            except Exception as e:
+                results.append((future, None, e))
+        db.commit()
+        self.batches += 1
+        self.operations += len(items)
+
+        try:
+            self._after_commit(db, batch)
+        except Exception:
+            logger.exception("Пачка записей зафиксирована, но кэш и категории книг не обновлены")
+        # Результаты отдаются другим потокам: отвязываются от сессии с уже
+        # загруженными значениями
+        db.expunge_all()
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    @staticmethod
+    def _after_commit(db: Session, batch: _Batch) -> None:
+        """Сброс кэша и загрузка значений созданных книг после фиксации пачки"""
+        entity_cache.invalidate(models.Book, *batch.book_ids)
+        crud.book_counts_changed(db, *batch.category_ids)
+        if batch.created:
+            # Значения по умолчанию созданных книг — одним запросом
+            db.query(models.Book).filter(
+                models.Book.id.in_([book.id for book in batch.created])
+            ).populate_existing().all()
+        crud.attach_categories(db, batch.created)
+
+
+_SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, expire_on_commit=False)
+_coalescer: Optional[WriteCoalescer] = None
+_coalescer_lock = threading.Lock()
+
+
+def get_coalescer() -> WriteCoalescer:
+    """Общий коалесцер процесса (создаётся при первой записи)"""
+    global _coalescer
+    with _coalescer_lock:
+        if _coalescer is None:
+            _coalescer = WriteCoalescer(_SessionLocal)
+        return _coalescer
+
+
+def submit_create_book(**fields) -> Future:
+    return get_coalescer().submit(lambda db, batch: _create(db, batch, fields))
+
+
+def submit_update_book(book_id: int, versions: Optional[Versions] = None, **fields) -> Future:
+    return get_coalescer().submit(lambda db, batch: _update(db, batch, book_id, versions, fields))
+
+
+def submit_delete_book(book_id: int, versions: Optional[Versions] = None) -> Future:
+    return get_coalescer().submit(lambda db, batch: _delete(db, batch, book_id, versions))
+
@@ -1,7 +1,104 @@
+import math
+import operator
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
 import sqlalchemy as sa
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.expression import UnaryExpression
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Dict, Any, Sequence, Tuple, Set
 from . import models
+from .cache import entity_cache
+from . import pagination
+from . import search
+from . import stats
+from . import changes
+
+
+class VersionConflictError(Exception):
+    """Запись изменена или удалена параллельным запросом (не совпала версия)"""
+
+
+class InvalidReferenceError(Exception):
+    """Ссылка на несуществующую запись (нарушен внешний ключ)"""
+
+
+class DuplicateKeyError(Exception):
+    """Запись с таким уникальным ключом уже есть (например, книга с той же ссылкой)"""
+
+
+def integrity_error(error: IntegrityError) -> Exception:
+    """
+    Нарушение ограничения базы как исключение crud (или исходная ошибка).
+
+    Используется и вне crud, где запись фиксируется отдельно (coalescer).
+    """
+    message = str(error.orig)
+    if "FOREIGN KEY" in message:
+        return InvalidReferenceError(message)
+    if "UNIQUE" in message:
+        return DuplicateKeyError(message)
+    return error
+
+
+def _commit_versioned(db: Session, model, entity_id: int) -> None:
+    """Фиксация изменения записи с версией; конфликт версий — VersionConflictError"""
+    try:
+        db.commit()
+    except StaleDataError as e:
+        db.rollback()
+        entity_cache.invalidate(model, entity_id)
+        raise VersionConflictError(str(e)) from e
+
+
+def book_counts_changed(db: Session, *category_ids: int) -> None:
+    """
+    Сброс устаревшего book_count категорий после записи книг.
+
+    Счётчик меняет триггер в базе, поэтому кроме кэша сущностей
+    сбрасывается и значение у объектов, уже загруженных в сессию
+    (асинхронная сессия не сбрасывает их при фиксации).
+    """
+    entity_cache.invalidate(models.Category, *category_ids)
+    for category_id in category_ids:
+        instance = db.identity_map.get(identity_key(models.Category, category_id))
+        if instance is not None:
+            db.expire(instance, ["book_count"])
+
+
+# Колонки, по которым разрешена сортировка (под каждую есть индекс)
+BOOK_SORT_COLUMNS = ("id", "title", "price", "created_at")
+CATEGORY_SORT_COLUMNS = ("id", "title", "created_at")
+
+_SORT_COLUMNS = {
+    models.Book: BOOK_SORT_COLUMNS,
+    models.Category: CATEGORY_SORT_COLUMNS,
+}
+
+# Сколько строк должен отобрать фильтр по диапазону, чтобы считаться широким
+# (см. _filter_books). Без значения порог зависит от размера выборки и
+# страницы (см. _range_threshold)
+RANGE_SELECTIVITY_THRESHOLD: Optional[int] = (
+    int(os.environ["RANGE_SELECTIVITY_THRESHOLD"]) if os.getenv("RANGE_SELECTIVITY_THRESHOLD") else None
+)
+
+# Сколько найденных книг фасеты поиска пересчитывают точно; при большем
+# числе — выборку такого размера (см. search_facets)
+FACET_SAMPLE_SIZE = int(os.getenv("FACET_SAMPLE_SIZE", "20000"))
+
+
+def _resolve_sort(model, sort_by: str, sort_order: str) -> Tuple[str, Any, str]:
+    """Нормализация параметров сортировки: (имя колонки, колонка, направление)"""
+    if sort_by not in _SORT_COLUMNS[model]:
+        sort_by = "id"
+    sort_order = "desc" if sort_order.lower() == "desc" else "asc"
+    return sort_by, getattr(model, sort_by), sort_order
 
 
 # ========== CRUD для категорий (Category) ==========
@@ -15,8 +112,22 @@ def create_category(db: Session, title: str) -> models.Category:
 
 
 def get_category(db: Session, category_id: int) -> Optional[models.Category]:
-    """Получение категории по ID"""
-    return db.query(models.Category).filter(models.Category.id == category_id).first()
+    """Получение категории по ID (через кэш)"""
+    db_category = entity_cache.load(db, models.Category, category_id)
+    if db_category is None:
+        generation = entity_cache.generation(models.Category, category_id)
+        db_category = db.query(models.Category).filter(models.Category.id == category_id).first()
+        if db_category is not None:
+            entity_cache.store(db_category, generation)
+    return db_category
+
+
+def get_categories_by_ids(db: Session, category_ids: List[int]) -> Dict[int, models.Category]:
+    """Получение категорий по списку ID одним запросом"""
+    if not category_ids:
+        return {}
+    categories = db.query(models.Category).filter(models.Category.id.in_(set(category_ids))).all()
+    return {category.id: category for category in categories}
 
 
 def get_category_by_title(db: Session, title: str) -> Optional[models.Category]:
@@ -24,26 +135,49 @@ def get_category_by_title(db: Session, title: str) -> Optional[models.Category]:
     return db.query(models.Category).filter(models.Category.title == title).first()
 
 
+def get_category_ids(db: Session) -> Set[int]:
+    """Получение множества ID всех категорий"""
+    return {category_id for category_id, in db.query(models.Category.id)}
+
+
 def get_categories(
     db: Session, 
     skip: int = 0, 
     limit: int = 100,
     sort_by: str = "id",
-    sort_order: str = "asc"
+    sort_order: str = "asc",
+    cursor: Optional[str] = None
 ) -> List[models.Category]:
     """Получение списка категорий с сортировкой"""
     query = db.query(models.Category)
     
-    # Сортировка
-    sort_column = getattr(models.Category, sort_by, models.Category.id)
-    if sort_order.lower() == "desc":
-        query = query.order_by(sa.desc(sort_column))
-    else:
-        query = query.order_by(sa.asc(sort_column))
+    # Сортировка и курсор
+    sort_by, sort_column, sort_order = _resolve_sort(models.Category, sort_by, sort_order)
+    query = pagination.apply_keyset(
+        query, sort_column, models.Category.id, sort_order, cursor, sort_by
+    )
+    query = pagination.order_by_keyset(query, sort_column, models.Category.id, sort_order)
     
     return query.offset(skip).limit(limit).all()
 
 
+def get_categories_page(
+    db: Session,
+    limit: int = 100,
+    sort_by: str = "id",
+    sort_order: str = "asc",
+    cursor: Optional[str] = None,
+    skip: int = 0
+) -> Tuple[List[models.Category], Optional[str]]:
+    """Получение страницы категорий и курсора следующей страницы"""
+    sort_by, _, sort_order = _resolve_sort(models.Category, sort_by, sort_order)
+    categories = get_categories(
+        db, skip=skip, limit=limit + 1,
+        sort_by=sort_by, sort_order=sort_order, cursor=cursor
+    )
+    return categories, pagination.next_cursor(categories, limit, sort_by, sort_order)
+
+
 def update_category(
     db: Session, 
     category_id: int, 
@@ -53,21 +187,46 @@ def update_category(
     db_category = get_category(db, category_id)
     if db_category:
         db_category.title = title
-        db.commit()
+        _commit_versioned(db, models.Category, category_id)
+        entity_cache.invalidate(models.Category, category_id)
         db.refresh(db_category)
     return db_category
 
 
 def delete_category(db: Session, category_id: int) -> bool:
-    """Удаление категории (вместе со всеми связанными книгами)"""
+    """
+    Удаление категории вместе со всеми книгами.
+
+    Книги удаляет база одним запросом (ON DELETE CASCADE), в сессию они
+    не загружаются. Для очень больших категорий см. delete_category_books_chunk.
+    """
     db_category = get_category(db, category_id)
     if db_category:
         db.delete(db_category)
-        db.commit()
+        _commit_versioned(db, models.Category, category_id)
+        entity_cache.invalidate(models.Category, category_id)
+        entity_cache.invalidate_where(models.Book, category_id=category_id)
         return True
     return False
 
 
+def delete_category_books_chunk(db: Session, category_id: int, chunk_size: int) -> int:
+    """
+    Удаление очередной порции книг категории в отдельной транзакции.
+
+    Возвращает число удалённых книг (0 — книг в категории не осталось).
+    """
+    book_ids = [book_id for book_id, in db.query(models.Book.id).filter(
+        models.Book.category_id == category_id
+    ).order_by(models.Book.id).limit(chunk_size)]
+    if book_ids:
+        db.execute(sa.delete(models.Book).where(models.Book.id.in_(book_ids)))
+        db.commit()
+        entity_cache.invalidate(models.Book, *book_ids)
+        book_counts_changed(db, category_id)
+    return len(book_ids)
+
+
 # ========== CRUD для книг (Book) ==========
 def create_book(
     db: Session, 
@@ -86,14 +245,88 @@ def create_book(
         category_id=category_id
     )
     db.add(db_book)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError as e:
+        db.rollback()
+        raise integrity_error(e) from e
+    book_counts_changed(db, category_id)
     db.refresh(db_book)
+    return _attach_category(db, db_book)
+
+
+def bulk_create_books(db: Session, books: List[Dict[str, Any]]) -> None:
+    """Пакетная вставка книг одним executemany в одной транзакции"""
+    if not books:
+        return
+    db.execute(models.Book.__table__.insert(), books)
+    db.commit()
+    book_counts_changed(db, *{book["category_id"] for book in books})
+
+
+def _attach_category(db: Session, db_book: models.Book) -> models.Book:
+    """Подстановка категории книги через кэш вместо ленивой загрузки"""
+    if "category" in sa.inspect(db_book).unloaded:
+        set_committed_value(db_book, "category", get_category(db, db_book.category_id))
     return db_book
 
 
+def attach_categories(db: Session, books: List[models.Book]) -> List[models.Book]:
+    """
+    Подстановка категорий списка книг без N+1.
+    
+    Категории берутся из кэша, недостающие — одним запросом.
+    """
+    pending = [book for book in books if "category" in sa.inspect(book).unloaded]
+    if not pending:
+        return books
+    categories: Dict[int, models.Category] = {}
+    # Недостающие категории: ID → поколение записи в кэше
+    missing: Dict[int, int] = {}
+    for category_id in {book.category_id for book in pending}:
+        db_category = entity_cache.load(db, models.Category, category_id)
+        if db_category is None:
+            missing[category_id] = entity_cache.generation(models.Category, category_id)
+        else:
+            categories[category_id] = db_category
+    for db_category in get_categories_by_ids(db, list(missing)).values():
+        entity_cache.store(db_category, missing[db_category.id])
+        categories[db_category.id] = db_category
+    for book in pending:
+        set_committed_value(book, "category", categories.get(book.category_id))
+    return books
+
+
 def get_book(db: Session, book_id: int) -> Optional[models.Book]:
-    """Получение книги по ID"""
-    return db.query(models.Book).filter(models.Book.id == book_id).first()
+    """Получение книги по ID (через кэш)"""
+    db_book = entity_cache.load(db, models.Book, book_id)
+    if db_book is None:
+        generation = entity_cache.generation(models.Book, book_id)
+        db_book = db.query(models.Book).filter(models.Book.id == book_id).first()
+        if db_book is None:
+            return None
+        entity_cache.store(db_book, generation)
+    return _attach_category(db, db_book)
+
+
+def get_books_by_ids(
+    db: Session,
+    book_ids: List[int],
+    with_category: bool = True
+) -> Dict[int, models.Book]:
+    """
+    Получение книг по списку ID одним запросом.
+    
+    with_category: загрузить категории тем же запросом (JOIN); иначе
+    категория у книг не загружается и остаётся пустой.
+    """
+    if not book_ids:
+        return {}
+    loader = sa.orm.joinedload if with_category else sa.orm.noload
+    books = db.query(models.Book).options(
+        loader(models.Book.category)
+    ).filter(models.Book.id.in_(set(book_ids))).all()
+    return {book.id: book for book in books}
 
 
 def get_books(
@@ -102,23 +335,313 @@ def get_books(
     limit: int = 100,
     category_id: Optional[int] = None,
     sort_by: str = "id",
-    sort_order: str = "asc"
+    sort_order: str = "asc",
+    cursor: Optional[str] = None,
+    include_description: bool = False,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None
 ) -> List[models.Book]:
-    """Получение списка книг с фильтрацией и сортировкой"""
+    """
+    Получение списка книг с фильтрацией и сортировкой.
+    
+    Цена — от min_price до max_price включительно, дата добавления — от
+    created_after включительно до created_before не включая.
+    
+    Описание (неограниченный Text) не загружается, пока не передан
+    include_description=True: обращение к нему — отдельный запрос на книгу.
+    """
+    query = _filter_books(
+        db, _books_query(db, include_description), category_id, sort_by, sort_order, cursor,
+        _range_bounds(min_price, max_price, created_after, created_before), skip + limit
+    )
+    return attach_categories(db, query.offset(skip).limit(limit).all())
+
+
+def _books_query(db: Session, include_description: bool):
+    """Запрос книг; без include_description описание отложено (defer)"""
     query = db.query(models.Book)
+    if not include_description:
+        query = query.options(sa.orm.defer(models.Book.description))
+    return query
+
+
+def _datetime_bound(value: datetime):
+    """Граница по created_at в формате хранения (UTC, 'YYYY-MM-DD HH:MM:SS')"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    # Сравниваем с хранимым текстом, минуя преобразование DateTime
+    return sa.literal(value.isoformat(sep=" "), sa.String)
+
+
+def _range_bounds(
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None
+) -> Dict[str, List[Tuple[Callable, Any]]]:
+    """Границы фильтров по диапазонам: колонка → [(сравнение, значение)]"""
+    ranges: Dict[str, List[Tuple[Callable, Any]]] = {"price": [], "created_at": []}
+    if min_price is not None:
+        ranges["price"].append((operator.ge, min_price))
+    if max_price is not None:
+        ranges["price"].append((operator.le, max_price))
+    if created_after is not None:
+        ranges["created_at"].append((operator.ge, _datetime_bound(created_after)))
+    if created_before is not None:
+        ranges["created_at"].append((operator.lt, _datetime_bound(created_before)))
+    return {column: bounds for column, bounds in ranges.items() if bounds}
+
+
+def _range_terms(column: str, bounds: List[Tuple[Callable, Any]], use_index: bool = True) -> list:
+    """Условия диапазона; use_index=False запрещает SQLite искать по индексу колонки"""
+    expression = getattr(models.Book, column)
+    if not use_index:
+        # Унарный + в SQLite ничего не меняет в значении, но условие с ним
+        # не может использовать индекс
+        expression = UnaryExpression(
+            expression.expression, operator=operators.custom_op("+"), type_=expression.type
+        )
+    return [compare(expression, bound) for compare, bound in bounds]
+
+
+def _range_threshold(db: Session, category_id: Optional[int], limit: int) -> int:
+    """
+    Порог узкого диапазона: sqrt(limit × книг в категории или каталоге).
+    
+    По индексу колонки диапазона читаются и сортируются все m подходящих
+    книг, по индексу сортировки — в среднем limit × n / m строк до
+    заполнения страницы. Первое дешевле при m < sqrt(limit × n). Число книг
+    берётся из сводной таблицы category_stats.
+    """
+    if RANGE_SELECTIVITY_THRESHOLD is not None:
+        return RANGE_SELECTIVITY_THRESHOLD
+    query = db.query(sa.func.coalesce(sa.func.sum(models.CategoryStats.book_count), 0))
+    if category_id is not None:
+        query = query.filter(models.CategoryStats.category_id == category_id)
+    return max(1, math.isqrt(limit * query.scalar()))
+
+
+def _is_selective(db: Session, conditions: list, threshold: int) -> bool:
+    """Отбирают ли условия меньше threshold книг (подсчёт с LIMIT)"""
+    matched = sa.select(models.Book.id).where(*conditions).limit(threshold).subquery()
+    return db.execute(sa.select(sa.func.count()).select_from(matched)).scalar() < threshold
+
+
+def _filter_books(
+    db: Session,
+    query,
+    category_id: Optional[int],
+    sort_by: str,
+    sort_order: str,
+    cursor: Optional[str],
+    ranges: Optional[Dict[str, List[Tuple[Callable, Any]]]] = None,
+    limit: int = 100
+):
+    """
+    Фильтр, сортировка и курсор списка книг (для Query и Core select).
+    
+    Фильтр по диапазону другой колонки, чем колонка сортировки, SQLite
+    выполняет по индексу этой колонки с сортировкой найденных строк. Для
+    узкого диапазона это дёшево. Для широкого (от _range_threshold строк,
+    проверяется подсчётом с LIMIT по тому же индексу) индекс колонки
+    фильтра запрещается: строки читаются по индексу сортировки, а
+    неподходящие отбрасываются, без сортировки миллионов строк ради одной
+    страницы. limit — сколько строк нужно запросу (с учётом skip).
+    """
+    sort_by, sort_column, sort_order = _resolve_sort(models.Book, sort_by, sort_order)
     
     # Фильтрация по категории
+    conditions = []
     if category_id is not None:
-        query = query.filter(models.Book.category_id == category_id)
+        conditions.append(models.Book.category_id == category_id)
     
-    # Сортировка
-    sort_column = getattr(models.Book, sort_by, models.Book.id)
-    if sort_order.lower() == "desc":
-        query = query.order_by(sa.desc(sort_column))
-    else:
-        query = query.order_by(sa.asc(sort_column))
+    # Фильтрация по диапазонам. Селективность каждого диапазона оценивается
+    # отдельно: категория и диапазон одной колонки покрываются индексом
+    # (category_id, колонка), и подсчёт не читает саму таблицу
+    range_conditions = []
+    threshold = None
+    for column, bounds in (ranges or {}).items():
+        terms = _range_terms(column, bounds)
+        if column != sort_by:
+            if threshold is None:
+                threshold = _range_threshold(db, category_id, limit)
+            if not _is_selective(db, conditions + terms, threshold):
+                terms = _range_terms(column, bounds, use_index=False)
+        range_conditions.extend(terms)
+    conditions.extend(range_conditions)
+    if conditions:
+        query = query.filter(*conditions)
     
-    return query.offset(skip).limit(limit).all()
+    # Сортировка и курсор
+    query = pagination.apply_keyset(
+        query, sort_column, models.Book.id, sort_order, cursor, sort_by
+    )
+    return pagination.order_by_keyset(query, sort_column, models.Book.id, sort_order)
+
+
+def get_books_page(
+    db: Session,
+    limit: int = 100,
+    category_id: Optional[int] = None,
+    sort_by: str = "id",
+    sort_order: str = "asc",
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    include_description: bool = False,
+    **ranges: Any
+) -> Tuple[List[models.Book], Optional[str]]:
+    """
+    Получение страницы книг и курсора следующей страницы.
+    
+    ranges — фильтры по диапазонам get_books (min_price, created_after...).
+    """
+    sort_by, _, sort_order = _resolve_sort(models.Book, sort_by, sort_order)
+    books = get_books(
+        db, skip=skip, limit=limit + 1, category_id=category_id,
+        sort_by=sort_by, sort_order=sort_order, cursor=cursor,
+        include_description=include_description, **ranges
+    )
+    return books, pagination.next_cursor(books, limit, sort_by, sort_order)
+
+
+# Колонки строки списка книг: поля книги и её категории (префикс category_)
+_BOOK_ROW_COLUMNS = (
+    models.Book.id,
+    models.Book.title,
+    models.Book.description,
+    models.Book.price,
+    models.Book.url,
+    models.Book.category_id,
+    models.Book.created_at,
+    models.Book.version,
+    models.Category.title.label("category_title"),
+    models.Category.created_at.label("category_created_at"),
+    models.Category.version.label("category_version"),
+)
+
+
+def _book_rows_select(fields: Optional[Iterable[str]] = None, *extra: str):
+    """
+    SELECT строк книг только с колонками нужных полей ответа.
+    
+    fields — поля schemas.Book (None — все). id и version (для ETag)
+    выбираются всегда, extra — дополнительные колонки (например, колонка
+    сортировки для курсора). Поле category добавляет LEFT JOIN категории.
+    """
+    book_category = sa.orm.outerjoin(
+        models.Book, models.Category, models.Book.category_id == models.Category.id
+    )
+    if fields is None:
+        return sa.select(*_BOOK_ROW_COLUMNS).select_from(book_category)
+    
+    fields = set(fields)
+    wanted = {"id", "version", *extra, *(fields - {"category"})}
+    if "category" in fields:
+        wanted.add("category_id")
+    columns = [column for column in _BOOK_ROW_COLUMNS[:8] if column.key in wanted]
+    if "category" not in fields:
+        return sa.select(*columns)
+    return sa.select(*columns, *_BOOK_ROW_COLUMNS[8:]).select_from(book_category)
+
+
+def get_book_rows(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    category_id: Optional[int] = None,
+    sort_by: str = "id",
+    sort_order: str = "asc",
+    cursor: Optional[str] = None,
+    fields: Optional[Iterable[str]] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None
+) -> List[sa.engine.Row]:
+    """
+    Список книг строками Core вместе с категорией (LEFT JOIN), без объектов ORM.
+    
+    Фильтры и сортировка — как у get_books; fields — выбираемые поля
+    (см. _book_rows_select). Строки не попадают в сессию и кэш, поэтому
+    годятся только для чтения (быстрая сериализация списков).
+    """
+    sort_by, _, sort_order = _resolve_sort(models.Book, sort_by, sort_order)
+    query = _filter_books(
+        db, _book_rows_select(fields, sort_by), category_id, sort_by, sort_order, cursor,
+        _range_bounds(min_price, max_price, created_after, created_before), skip + limit
+    )
+    return db.execute(query.offset(skip).limit(limit)).all()
+
+
+def get_book_row(db: Session, book_id: int, fields: Optional[Iterable[str]] = None) -> Optional[sa.engine.Row]:
+    """Книга по ID строкой Core только с колонками полей fields"""
+    return db.execute(_book_rows_select(fields).where(models.Book.id == book_id)).first()
+
+
+def get_book_rows_in_order(
+    db: Session,
+    book_ids: List[int],
+    fields: Optional[Iterable[str]] = None
+) -> List[sa.engine.Row]:
+    """Строки книг по списку ID с сохранением порядка списка"""
+    if not book_ids:
+        return []
+    rows = db.execute(_book_rows_select(fields).where(models.Book.id.in_(book_ids))).all()
+    by_id = {row.id: row for row in rows}
+    return [by_id[book_id] for book_id in book_ids if book_id in by_id]
+
+
+def get_book_rows_page(
+    db: Session,
+    limit: int = 100,
+    category_id: Optional[int] = None,
+    sort_by: str = "id",
+    sort_order: str = "asc",
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    fields: Optional[Iterable[str]] = None,
+    **ranges: Any
+) -> Tuple[List[sa.engine.Row], Optional[str]]:
+    """
+    Страница книг строками Core и курсор следующей страницы.
+    
+    ranges — фильтры по диапазонам get_book_rows (min_price, created_after...).
+    """
+    sort_by, _, sort_order = _resolve_sort(models.Book, sort_by, sort_order)
+    rows = get_book_rows(
+        db, skip=skip, limit=limit + 1, category_id=category_id,
+        sort_by=sort_by, sort_order=sort_order, cursor=cursor, fields=fields, **ranges
+    )
+    return rows, pagination.next_cursor(rows, limit, sort_by, sort_order)
+
+
+def get_books_by_category(
+    db: Session, category_ids: List[int], limit: Optional[int] = None
+) -> Dict[int, List[models.Book]]:
+    """
+    Книги нескольких категорий одним запросом, сгруппированные по категории.
+
+    limit — не больше стольких первых по ID книг в каждой категории: номер
+    книги в категории (row_number) считается по индексу category_id, и
+    читаются только строки отобранных книг.
+    """
+    books: Dict[int, List[models.Book]] = {category_id: [] for category_id in category_ids}
+    if not category_ids:
+        return books
+    query = db.query(models.Book).filter(models.Book.category_id.in_(set(category_ids)))
+    if limit is not None:
+        ranked = db.query(
+            models.Book.id,
+            sa.func.row_number().over(
+                partition_by=models.Book.category_id, order_by=models.Book.id
+            ).label("position")
+        ).filter(models.Book.category_id.in_(set(category_ids))).subquery()
+        query = query.join(ranked, ranked.c.id == models.Book.id).filter(ranked.c.position <= limit)
+    for book in query.order_by(models.Book.category_id, models.Book.id):
+        books[book.category_id].append(book)
+    return books
 
 
 def get_book_with_category(db: Session, book_id: int) -> Optional[models.Book]:
@@ -132,10 +655,11 @@ def get_books_with_category(
     db: Session, 
     skip: int = 0, 
     limit: int = 100,
-    category_id: Optional[int] = None
+    category_id: Optional[int] = None,
+    include_description: bool = False
 ) -> List[models.Book]:
-    """Получение списка книг с информацией о категории"""
-    query = db.query(models.Book).options(
+    """Получение списка книг с информацией о категории (описание — см. get_books)"""
+    query = _books_query(db, include_description).options(
         sa.orm.joinedload(models.Book.category)
     )
     
@@ -146,6 +670,13 @@ def get_books_with_category(
     return query.offset(skip).limit(limit).all()
 
 
+def _set_book_fields(db_book: models.Book, fields: Dict[str, Any]) -> None:
+    """Присвоение переданных полей книги (None — поле не меняется)"""
+    for key, value in fields.items():
+        if value is not None and hasattr(db_book, key):
+            setattr(db_book, key, value)
+
+
 def update_book(
     db: Session, 
     book_id: int, 
@@ -154,35 +685,432 @@ def update_book(
     """Обновление книги"""
     db_book = get_book(db, book_id)
     if db_book:
-        for key, value in kwargs.items():
-            if value is not None and hasattr(db_book, key):
-                setattr(db_book, key, value)
-        db.commit()
+        old_category_id = db_book.category_id
+        _set_book_fields(db_book, kwargs)
+        new_category_id = db_book.category_id
+        _commit_versioned(db, models.Book, book_id)
+        entity_cache.invalidate(models.Book, book_id)
+        if new_category_id != old_category_id:
+            book_counts_changed(db, old_category_id, new_category_id)
         db.refresh(db_book)
+        _attach_category(db, db_book)
     return db_book
 
 
+# Поля книги, которые можно изменить через update_book_row
+_BOOK_UPDATE_FIELDS = ("title", "description", "price", "url", "category_id")
+
+_CATEGORY_COLUMN = "(SELECT {column} FROM categories WHERE categories.id = books.category_id)"
+
+# Строка книги с категорией: те же колонки и типы, что у get_book_row.
+# RETURNING отдаёт целое значение REAL-колонки как int (4 вместо 4.0), отсюда CAST
+_BOOK_RETURNING = ", ".join((
+    "id, title, description, CAST(price AS REAL) AS price, url, category_id, created_at, version",
+    f"{_CATEGORY_COLUMN.format(column='title')} AS category_title",
+    f"{_CATEGORY_COLUMN.format(column='created_at')} AS category_created_at",
+    f"{_CATEGORY_COLUMN.format(column='version')} AS category_version",
+))
+_BOOK_RETURNING_COLUMNS = (*_BOOK_ROW_COLUMNS, sa.column("old_category_id", sa.Integer))
+
+
+def _book_precondition(versions: Optional[Sequence[Tuple[int, int]]]) -> Tuple[str, Dict[str, int]]:
+    """
+    Условие WHERE на версии книги и её категории из If-Match.
+
+    versions — пары (версия книги, версия категории), см.
+    etags.book_if_match_versions; None — без условия.
+    """
+    if versions is None:
+        return "", {}
+    if not versions:
+        return " AND 0", {}
+    category_version = f"coalesce({_CATEGORY_COLUMN.format(column='version')}, 0)"
+    terms, params = [], {}
+    for number, (version, category_version_value) in enumerate(versions):
+        terms.append(f"(version = :version_{number} AND {category_version} = :category_version_{number})")
+        params[f"version_{number}"] = version
+        params[f"category_version_{number}"] = category_version_value
+    return f" AND ({' OR '.join(terms)})", params
+
+
+def _execute_checked(db: Session, statement, params: Dict[str, Any]):
+    """Выполнение запроса; нарушение ограничений — InvalidReferenceError или DuplicateKeyError"""
+    try:
+        return db.execute(statement, params)
+    except IntegrityError as e:
+        raise integrity_error(e) from e
+
+
+def update_book_row_uncommitted(
+    db: Session, book_id: int, versions: Optional[Sequence[Tuple[int, int]]], fields: Dict[str, Any]
+) -> Optional[sa.engine.Row]:
+    """
+    UPDATE ... RETURNING без фиксации (см. update_book_row).
+
+    Для групповой фиксации нескольких записей одной транзакцией (coalescer):
+    вызывающий сам фиксирует транзакцию, затем сбрасывает кэш книги и
+    book_count прежней и новой категорий (book_counts_changed).
+    """
+    fields = {key: value for key, value in fields.items() if value is not None}
+    unknown = set(fields) - set(_BOOK_UPDATE_FIELDS)
+    if unknown:
+        raise ValueError(f"Поля книги нельзя изменить: {', '.join(sorted(unknown))}")
+    condition, params = _book_precondition(versions)
+    assignments = "".join(f"{name} = :{name}, " for name in fields)
+    changed = " OR ".join(f"{name} IS NOT :{name}" for name in fields) or "0"
+    # CTE old материализуется до изменения строки, поэтому RETURNING видит
+    # прежнюю категорию (для сброса её счётчика). Версия растёт, только
+    # если значение какого-то поля действительно изменилось
+    statement = sa.text(f"""
+        WITH old AS MATERIALIZED (
+            SELECT id, category_id FROM books WHERE id = :book_id{condition}
+        )
+        UPDATE books SET {assignments}version = version + (CASE WHEN {changed} THEN 1 ELSE 0 END)
+        WHERE id IN (SELECT id FROM old)
+        RETURNING {_BOOK_RETURNING}, (SELECT category_id FROM old) AS old_category_id
+    """).columns(*_BOOK_RETURNING_COLUMNS)
+    return _execute_checked(db, statement, {"book_id": book_id, **params, **fields}).first()
+
+
+def delete_book_row_uncommitted(
+    db: Session, book_id: int, versions: Optional[Sequence[Tuple[int, int]]]
+) -> Optional[sa.engine.Row]:
+    """
+    DELETE ... RETURNING без фиксации (см. delete_book_row).
+
+    Как и update_book_row_uncommitted, фиксацию и сброс кэша выполняет
+    вызывающий.
+    """
+    condition, params = _book_precondition(versions)
+    statement = sa.text(
+        f"DELETE FROM books WHERE id = :book_id{condition} RETURNING id, category_id"
+    ).columns(models.Book.id, models.Book.category_id)
+    return db.execute(statement, {"book_id": book_id, **params}).first()
+
+
+def update_book_row(
+    db: Session,
+    book_id: int,
+    versions: Optional[Sequence[Tuple[int, int]]] = None,
+    **fields
+) -> Optional[sa.engine.Row]:
+    """
+    Обновление книги одним запросом UPDATE ... RETURNING (SQLite 3.35+).
+
+    Возвращает строку книги с категорией (как get_book_row) или None, если
+    книги нет или её версии не подходят под versions (см. _book_precondition).
+    Существование новой категории проверяет внешний ключ: при его нарушении —
+    InvalidReferenceError; ссылка, занятая другой книгой, — DuplicateKeyError.
+    """
+    try:
+        row = update_book_row_uncommitted(db, book_id, versions, fields)
+    except (InvalidReferenceError, DuplicateKeyError):
+        db.rollback()
+        raise
+    db.commit()
+    if row is not None:
+        entity_cache.invalidate(models.Book, book_id)
+        if row.old_category_id != row.category_id:
+            book_counts_changed(db, row.old_category_id, row.category_id)
+    return row
+
+
+def delete_book_row(
+    db: Session, book_id: int, versions: Optional[Sequence[Tuple[int, int]]] = None
+) -> bool:
+    """
+    Удаление книги одним запросом DELETE ... RETURNING (SQLite 3.35+).
+
+    False — книги нет или её версии не подходят под versions.
+    """
+    row = delete_book_row_uncommitted(db, book_id, versions)
+    db.commit()
+    if row is None:
+        return False
+    entity_cache.invalidate(models.Book, book_id)
+    book_counts_changed(db, row.category_id)
+    return True
+
+
+# Сколько книг в одном INSERT ... ON CONFLICT: 5 параметров на книгу,
+# лимит параметров запроса SQLite — 32766
+UPSERT_ROWS_PER_STATEMENT = int(os.getenv("UPSERT_ROWS_PER_STATEMENT", "1000"))
+
+
+class UpsertResult(NamedTuple):
+    inserted: int
+    updated: int
+    unchanged: int
+
+
+def _upsert_statement(count: int):
+    """INSERT ... ON CONFLICT (url) DO UPDATE для count книг"""
+    columns = ", ".join(_BOOK_UPDATE_FIELDS)
+    values = ", ".join(
+        "(" + ", ".join(f":{name}_{number}" for name in _BOOK_UPDATE_FIELDS) + ")"
+        for number in range(count)
+    )
+    updated = [name for name in _BOOK_UPDATE_FIELDS if name != "url"]
+    assignments = ", ".join(f"{name} = excluded.{name}" for name in updated)
+    changed = " OR ".join(f"books.{name} IS NOT excluded.{name}" for name in updated)
+    # Неизменившиеся книги не перезаписываются: DO UPDATE с WHERE пропускает
+    # строку, и RETURNING её не возвращает. CTE old — прежние категории
+    # найденных книг (для сброса счётчиков); условие на old в WHERE
+    # материализует её до первой вставки (WHERE нужен и синтаксису upsert
+    # после INSERT ... SELECT)
+    return sa.text(f"""
+        WITH new ({columns}) AS (VALUES {values}),
+        old AS MATERIALIZED (
+            SELECT url, category_id FROM books WHERE url IN (SELECT url FROM new)
+        )
+        INSERT INTO books ({columns})
+        SELECT {columns} FROM new WHERE (SELECT count(*) FROM old) >= 0
+        ON CONFLICT (url) DO UPDATE SET {assignments}, version = version + 1
+        WHERE {changed}
+        RETURNING {_BOOK_RETURNING}, (SELECT category_id FROM old WHERE old.url = books.url) AS old_category_id
+    """).columns(*_BOOK_RETURNING_COLUMNS)
+
+
+def _upsert_chunks(books: List[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+    """Пачки для _upsert_statement: в одной пачке каждая ссылка встречается один раз"""
+    chunk: List[Dict[str, Any]] = []
+    urls: Set[str] = set()
+    for book in books:
+        if len(chunk) >= UPSERT_ROWS_PER_STATEMENT or book["url"] in urls:
+            yield chunk
+            chunk, urls = [], set()
+        chunk.append(book)
+        urls.add(book["url"])
+    if chunk:
+        yield chunk
+
+
+def _upsert_books(db: Session, books: List[Dict[str, Any]]) -> List[sa.engine.Row]:
+    """Upsert книг в одной транзакции; возвращает добавленные и изменённые строки"""
+    for book in books:
+        unknown = set(book) - set(_BOOK_UPDATE_FIELDS)
+        if unknown:
+            raise ValueError(f"Неизвестные поля книги: {', '.join(sorted(unknown))}")
+    rows = []
+    try:
+        for chunk in _upsert_chunks(books):
+            params = {
+                f"{name}_{number}": book.get(name)
+                for number, book in enumerate(chunk)
+                for name in _BOOK_UPDATE_FIELDS
+            }
+            rows.extend(_execute_checked(db, _upsert_statement(len(chunk)), params).all())
+    except (InvalidReferenceError, DuplicateKeyError):
+        db.rollback()
+        raise
+    db.commit()
+
+    entity_cache.invalidate(models.Book, *(row.id for row in rows if row.old_category_id is not None))
+    book_counts_changed(db, *{
+        category_id
+        for row in rows if row.old_category_id != row.category_id
+        for category_id in (row.old_category_id, row.category_id) if category_id is not None
+    })
+    return rows
+
+
+def upsert_books(db: Session, books: List[Dict[str, Any]]) -> UpsertResult:
+    """
+    Добавление или обновление книг по ссылке (url) в одной транзакции.
+
+    Книги пишутся пачками по UPSERT_ROWS_PER_STATEMENT, каждая — один запрос
+    INSERT ... ON CONFLICT DO UPDATE (SQLite 3.35+). Книга с уже известной
+    ссылкой заменяется целиком, а если ни одно поле не изменилось, остаётся
+    нетронутой (версия не растёт). Повторы одной ссылки применяются по
+    порядку. Несуществующая категория — InvalidReferenceError, транзакция
+    откатывается целиком.
+    """
+    rows = _upsert_books(db, books)
+    inserted = sum(1 for row in rows if row.old_category_id is None)
+    return UpsertResult(inserted, len(rows) - inserted, len(books) - len(rows))
+
+
+def get_book_row_by_url(db: Session, url: str) -> Optional[sa.engine.Row]:
+    """Книга по ссылке строкой Core (как get_book_row)"""
+    return db.execute(_book_rows_select().where(models.Book.url == url)).first()
+
+
+def upsert_book_row(db: Session, **fields) -> Tuple[sa.engine.Row, str]:
+    """
+    Добавление или обновление одной книги по ссылке (см. upsert_books).
+
+    Возвращает строку книги с категорией и что произошло: inserted, updated
+    или unchanged.
+    """
+    rows = _upsert_books(db, [fields])
+    if not rows:
+        return get_book_row_by_url(db, fields["url"]), "unchanged"
+    row = rows[0]
+    return row, "inserted" if row.old_category_id is None else "updated"
+
+
 def delete_book(db: Session, book_id: int) -> bool:
     """Удаление книги"""
     db_book = get_book(db, book_id)
     if db_book:
+        category_id = db_book.category_id
         db.delete(db_book)
-        db.commit()
+        _commit_versioned(db, models.Book, book_id)
+        entity_cache.invalidate(models.Book, book_id)
+        book_counts_changed(db, category_id)
         return True
     return False
 
 
+def _search_books_like(db: Session, search_term: str):
+    """Поиск через LIKE — запасной вариант, когда нет индекса FTS5"""
+    return db.query(models.Book).filter(_like_condition(search_term))
+
+
+def _like_condition(search_term: str):
+    return (
+        models.Book.title.ilike(f"%{search_term}%") | 
+        models.Book.description.ilike(f"%{search_term}%")
+    )
+
+
+def _get_books_in_order(db: Session, book_ids: List[int]) -> List[models.Book]:
+    """Загрузка книг по списку ID с сохранением порядка списка"""
+    if not book_ids:
+        return []
+    books = attach_categories(db, db.query(models.Book).filter(models.Book.id.in_(book_ids)).all())
+    by_id = {book.id: book for book in books}
+    return [by_id[book_id] for book_id in book_ids if book_id in by_id]
+
+
 def search_books(
     db: Session, 
     search_term: str,
     skip: int = 0,
     limit: int = 100
 ) -> List[models.Book]:
-    """Поиск книг по названию или описанию"""
-    return db.query(models.Book).filter(
-        models.Book.title.ilike(f"%{search_term}%") | 
-        models.Book.description.ilike(f"%{search_term}%")
-    ).offset(skip).limit(limit).all()
+    """Поиск книг по названию или описанию (по релевантности, если есть FTS5)"""
+    if search.is_available(db):
+        hits = search.search(db, search_term, limit=limit, skip=skip)
+        return _get_books_in_order(db, [hit.id for hit in hits])
+    
+    return attach_categories(db, _search_books_like(db, search_term).order_by(
+        models.Book.id
+    ).offset(skip).limit(limit).all())
+
+
+def search_books_page(
+    db: Session,
+    search_term: str,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[Iterable[str]] = None
+) -> Tuple[List[Tuple[Any, search.SearchHit]], Optional[str]]:
+    """
+    Поиск книг с ранжированием, подсветкой и курсорной пагинацией.
+    
+    Возвращает пары (книга, результат поиска) и курсор следующей страницы.
+    С fields книги — строки Core только с колонками этих полей (см.
+    get_book_rows), иначе — объекты ORM.
+    """
+    if search.is_available(db):
+        after = pagination.decode_cursor(cursor, "rank", "asc") if cursor else None
+        hits = search.search(db, search_term, limit=limit + 1, after=after)
+        next_cursor = None
+        if len(hits) > limit:
+            hits = hits[:limit]
+            next_cursor = pagination.encode_cursor("rank", "asc", hits[-1].rank, hits[-1].id)
+        book_ids = [hit.id for hit in hits]
+        if fields is None:
+            books = _get_books_in_order(db, book_ids)
+        else:
+            books = get_book_rows_in_order(db, book_ids, fields)
+        hits_by_id = {hit.id: hit for hit in hits}
+        return [(book, hits_by_id[book.id]) for book in books], next_cursor
+    
+    if fields is None:
+        query = _search_books_like(db, search_term)
+    else:
+        # title и description нужны для подсветки совпадений
+        query = _book_rows_select(fields, "title", "description").filter(_like_condition(search_term))
+    query = pagination.apply_keyset(
+        query, models.Book.id, models.Book.id, "asc", cursor, "id"
+    ).order_by(models.Book.id).limit(limit + 1)
+    if fields is None:
+        books = attach_categories(db, query.all())
+    else:
+        books = db.execute(query).all()
+    next_cursor = pagination.next_cursor(books, limit, "id", "asc")
+    return [
+        (book, search.SearchHit(
+            id=book.id,
+            rank=0.0,
+            title=search.highlight(book.title, search_term),
+            snippet=search.highlight(book.description, search_term)
+        ))
+        for book in books
+    ], next_cursor
+
+
+def _search_matches(db: Session, search_term: str):
+    """Подзапрос ID книг, найденных search_books_page (None — запрос без слов)"""
+    if search.is_available(db):
+        return search.match_ids(search_term)
+    return sa.select(models.Book.id).where(_like_condition(search_term))
+
+
+def search_facets(db: Session, search_term: str, price_edges: Sequence[float]) -> Dict[str, Any]:
+    """
+    Фасеты результатов поиска: число найденных книг по категориям и по ценовым интервалам.
+
+    price_edges — возрастающие границы интервалов: (-∞, e0), [e0, e1), …, [en, +∞).
+    Обе группировки собираются из одного прохода GROUP BY (категория,
+    интервал) по найденным книгам. Если найдено больше FACET_SAMPLE_SIZE
+    книг, проход идёт по каждой k-й из них (по ID), а числа
+    масштабируются до общего — время не растёт с числом совпадений, но
+    результат приблизительный (exact=false).
+    """
+    facets = {"total": 0, "exact": True, "categories": [], "price": []}
+    bounds = [None, *price_edges, None]
+    counts = [0] * (len(price_edges) + 1)
+
+    matches = _search_matches(db, search_term)
+    if matches is not None:
+        matches = matches.subquery()
+        facets["total"] = db.execute(sa.select(sa.func.count()).select_from(matches)).scalar()
+
+    if facets["total"]:
+        stride = -(-facets["total"] // FACET_SAMPLE_SIZE)
+        bucket = sa.case(
+            *((models.Book.price < edge, index) for index, edge in enumerate(price_edges)),
+            else_=len(price_edges)
+        ) if price_edges else sa.literal(0)
+        query = sa.select(models.Book.category_id, bucket, sa.func.count()).select_from(
+            matches.join(models.Book, models.Book.id == matches.c.id)
+        ).group_by(models.Book.category_id, bucket)
+        if stride > 1:
+            query = query.where(matches.c.id % stride == 0)
+        rows = db.execute(query).all()
+
+        sampled = sum(count for _, _, count in rows)
+        scale = facets["total"] / sampled if sampled else 0
+        facets["exact"] = stride == 1
+        by_category: Dict[int, int] = defaultdict(int)
+        for category_id, index, count in rows:
+            by_category[category_id] += count
+            counts[index] += count
+        facets["categories"] = sorted(
+            ({"category_id": category_id, "count": round(count * scale)}
+             for category_id, count in by_category.items()),
+            key=lambda facet: (-facet["count"], facet["category_id"])
+        )
+        counts = [round(count * scale) for count in counts]
+
+    facets["price"] = [
+        {"price_from": price_from, "price_to": price_to, "count": count}
+        for price_from, price_to, count in zip(bounds, bounds[1:], counts)
+    ]
+    return facets
 
 
 def get_books_count_by_category(db: Session) -> Dict[int, int]:
@@ -199,4 +1127,104 @@ def get_category_with_books(db: Session, category_id: int) -> Optional[models.Ca
     """Получение категории со всеми книгами"""
     return db.query(models.Category).options(
         sa.orm.joinedload(models.Category.books)
-    ).filter(models.Category.id == category_id).first()
\ No newline at end of file
+    ).filter(models.Category.id == category_id).first()
+
+
+# ========== Статистика ==========
+def _price_stats(count: int, price_sum: float, price_min, price_max) -> Dict[str, Any]:
+    return {
+        "count": count,
+        "price_sum": price_sum,
+        "price_avg": price_sum / count if count else None,
+        "price_min": price_min,
+        "price_max": price_max,
+    }
+
+
+def get_library_stats(db: Session) -> Dict[str, Any]:
+    """
+    Статистика цен по категориям и по всей библиотеке.
+    
+    Читается из сводной таблицы category_stats — O(категорий).
+    """
+    rows = db.query(
+        models.Category.id,
+        models.Category.title,
+        sa.func.coalesce(models.CategoryStats.book_count, 0),
+        sa.func.coalesce(models.CategoryStats.price_sum, 0.0),
+        models.CategoryStats.price_min,
+        models.CategoryStats.price_max
+    ).outerjoin(
+        models.CategoryStats, models.CategoryStats.category_id == models.Category.id
+    ).order_by(models.Category.id).all()
+    
+    categories = [
+        {"category_id": category_id, "title": title, **_price_stats(count, price_sum, price_min, price_max)}
+        for category_id, title, count, price_sum, price_min, price_max in rows
+    ]
+    mins = [row["price_min"] for row in categories if row["price_min"] is not None]
+    maxs = [row["price_max"] for row in categories if row["price_max"] is not None]
+    total = _price_stats(
+        sum(row["count"] for row in categories),
+        sum(row["price_sum"] for row in categories),
+        min(mins) if mins else None,
+        max(maxs) if maxs else None
+    )
+    return {"total": total, "categories": categories}
+
+
+def rebuild_category_stats(db: Session) -> None:
+    """Полный пересчёт сводной статистики и счётчиков книг по категориям"""
+    stats.rebuild(db)
+    entity_cache.clear()
+
+
+def check_category_stats(db: Session) -> List[stats.Mismatch]:
+    """Категории, у которых счётчики и статистика расходятся с таблицей книг"""
+    return stats.check(db)
+
+
+# ========== Журнал изменений ==========
+class ChangeLogTruncatedError(Exception):
+    """Запрошенные изменения удалены из журнала по сроку хранения"""
+
+    def __init__(self, truncated_seq: int):
+        super().__init__(f"Журнал изменений усечён до seq {truncated_seq}")
+        self.truncated_seq = truncated_seq
+
+
+_CHANGE_COLUMNS = (
+    models.Change.seq,
+    models.Change.entity,
+    models.Change.entity_id,
+    models.Change.op,
+    models.Change.version,
+    models.Change.changed_at,
+)
+
+
+def get_changes(
+    db: Session, since: Optional[int] = None, limit: int = 1000
+) -> Tuple[List[sa.engine.Row], int]:
+    """
+    Записи журнала изменений с seq больше since (не больше limit) и номер
+    последней записи журнала.
+
+    since=None — только номер последней записи: с него клиент начинает
+    следить за изменениями после полной синхронизации. Если записи после
+    since уже удалены сжатием журнала — ChangeLogTruncatedError.
+    """
+    truncated_seq, last_seq = changes.positions(db.connection())
+    if since is None:
+        return [], last_seq
+    if since < truncated_seq:
+        raise ChangeLogTruncatedError(truncated_seq)
+    rows = db.execute(
+        sa.select(*_CHANGE_COLUMNS).where(models.Change.seq > since).order_by(models.Change.seq).limit(limit)
+    ).all()
+    return rows, last_seq
+
+
+def compact_changes(db: Session, retention_days: float = changes.CHANGE_LOG_RETENTION_DAYS) -> changes.Compaction:
+    """Сжатие журнала изменений (см. changes.compact)"""
+    return changes.compact(db, timedelta(days=retention_days))
@@ -1,20 +1,189 @@
-from sqlalchemy import create_engine
+import anyio.to_thread
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from typing import Generator
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator, Callable, Dict, Generator, Optional
+import functools
 import os
+import sqlite3
+import time
+import traceback
 
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./books.db")
+# Режим работы с БД: sync (SessionLocal) или async (AsyncSessionLocal, aiosqlite для SQLite)
+DB_MODE = os.getenv("DB_MODE", "sync")
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1)
+)
+# Профиль производительности SQLite (см. SQLITE_PROFILES) и PRAGMA поверх него,
+# например: SQLITE_PRAGMAS="cache_size=-200000,busy_timeout=10000"
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "wal")
+SQLITE_PRAGMAS = os.getenv("SQLITE_PRAGMAS", "")
+# Размер пула подключений к файлу SQLite (кроме профиля default)
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "20"))
 
+SQLITE_PROFILES: Dict[str, Dict[str, Any]] = {
+    # Настройки SQLite без изменений: rollback journal, synchronous=FULL
+    "default": {},
+    # WAL: писатель не блокирует читателей; synchronous=NORMAL безопасен в режиме WAL
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -65536,  # 64 МБ (отрицательное значение — в КиБ)
+        "mmap_size": 268435456,  # 256 МБ
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,
+    },
+    # Массовая загрузка: максимум скорости ценой устойчивости к сбою питания
+    "bulk": {
+        "journal_mode": "WAL",
+        "synchronous": "OFF",
+        "cache_size": -262144,
+        "mmap_size": 1073741824,
+        "temp_store": "MEMORY",
+        "busy_timeout": 30000,
+    },
+}
+
+_REPORTED_PRAGMAS = ("foreign_keys", "journal_mode", "synchronous", "cache_size", "mmap_size", "temp_store", "busy_timeout")
+
+
+def get_sqlite_pragmas(profile: str = SQLITE_PROFILE, overrides: str = SQLITE_PRAGMAS) -> Dict[str, Any]:
+    """PRAGMA выбранного профиля с учётом переопределений"""
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f"Неизвестный профиль SQLite: {profile}")
+    pragmas = dict(SQLITE_PROFILES[profile])
+    for item in filter(None, (part.strip() for part in overrides.split(","))):
+        name, _, value = item.partition("=")
+        name = name.strip()
+        if name == "foreign_keys":
+            # Каскадное удаление книг категории выполняет только база
+            # (passive_deletes), без внешних ключей остались бы книги-сироты
+            raise ValueError("PRAGMA foreign_keys нельзя переопределить: внешние ключи всегда включены")
+        pragmas[name] = value.strip()
+    return pragmas
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Применение PRAGMA профиля к каждому новому подключению"""
+    cursor = dbapi_connection.cursor()
+    for name, value in get_sqlite_pragmas().items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    # Внешние ключи (ON DELETE CASCADE, проверка категории книги) включены
+    # во всех профилях — последними, поверх любых PRAGMA
+    cursor.execute("PRAGMA foreign_keys = ON")
+    cursor.close()
+
+
+class QueryStats:
+    """Счётчики SQL-запросов одного HTTP-запроса (см. app/metrics.py)"""
+    __slots__ = ("count", "duration", "rows", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.rows = 0
+        # Список (SQL, стек вызова) — только в режиме аудита (см. app/query_audit.py)
+        self.statements: Optional[list] = None
+
+
+# Счётчики текущего запроса; None — запросы не учитываются
+query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if query_stats.get() is not None:
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = query_stats.get()
+    if stats is None or not conn.info.get("query_start_time"):
+        return
+    stats.count += 1
+    stats.duration += time.perf_counter() - conn.info["query_start_time"].pop()
+    if stats.statements is not None:
+        stats.statements.append((statement, traceback.extract_stack()))
+    # Для INSERT/UPDATE/DELETE — число изменённых строк; строки SELECT
+    # считает курсор при выборке (_CountingCursor)
+    if cursor.description is None and cursor.rowcount > 0:
+        stats.rows += cursor.rowcount
+
+
+class _CountingCursor(sqlite3.Cursor):
+    """Курсор sqlite3, добавляющий число выбранных строк в query_stats"""
+
+    def fetchone(self):
+        row = super().fetchone()
+        stats = query_stats.get()
+        if stats is not None and row is not None:
+            stats.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = super().fetchmany(*args, **kwargs)
+        stats = query_stats.get()
+        if stats is not None:
+            stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        stats = query_stats.get()
+        if stats is not None:
+            stats.rows += len(rows)
+        return rows
 
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-)
+
+class _CountingConnection(sqlite3.Connection):
+    def cursor(self, factory=_CountingCursor):
+        return super().cursor(factory)
+
+
+def _instrument(sync_engine) -> None:
+    """Учёт числа, времени и строк SQL-запросов в query_stats"""
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _engine_options(url: str) -> Dict[str, Any]:
+    if not url.startswith("sqlite"):
+        return {}
+    options: Dict[str, Any] = {
+        "connect_args": {"check_same_thread": False, "factory": _CountingConnection}
+    }
+    if SQLITE_PROFILE != "default" and ":memory:" not in url:
+        # Постоянные подключения: cache_size и mmap действуют в пределах подключения
+        options.update(poolclass=QueuePool, pool_size=SQLITE_POOL_SIZE, max_overflow=SQLITE_POOL_SIZE)
+    return options
+
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+_instrument(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = None
+AsyncSessionLocal = None
+if DB_MODE == "async":
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+    async_engine = create_async_engine(ASYNC_DATABASE_URL)
+    if async_engine.dialect.name == "sqlite":
+        event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    # Строки SELECT здесь не считаются: aiosqlite выбирает их в своём потоке,
+    # где query_stats текущего запроса не виден
+    _instrument(async_engine.sync_engine)
+    AsyncSessionLocal = sessionmaker(
+        async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+
 Base = declarative_base()
 
 def get_db() -> Generator:
@@ -24,5 +193,45 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+async def get_async_db() -> AsyncGenerator:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+class ThreadPoolSession:
+    """
+    Синхронная сессия с методом run_sync, как у AsyncSession (режим DB_MODE=sync).
+
+    Функция выполняется с сессией в пуле потоков, поэтому функции async_crud
+    и эндпоинты на них одинаково работают в обоих режимах.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    async def run_sync(self, fn: Callable, *args, **kwargs) -> Any:
+        return await anyio.to_thread.run_sync(functools.partial(fn, self.session, *args, **kwargs))
+
+async def get_crud_db() -> AsyncGenerator:
+    """Сессия для функций async_crud: AsyncSession или ThreadPoolSession (см. DB_MODE)"""
+    if DB_MODE == "async":
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+    db = SessionLocal()
+    try:
+        yield ThreadPoolSession(db)
+    finally:
+        await anyio.to_thread.run_sync(db.close)
+
+def get_sqlite_settings(db) -> Dict[str, Any]:
+    """Действующие значения PRAGMA подключения сессии db"""
+    connection = db.connection()
+    settings: Dict[str, Any] = {"profile": SQLITE_PROFILE}
+    for name in _REPORTED_PRAGMAS:
+        settings[name] = connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+    return settings
+
 def create_tables():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    """Создание и обновление схемы (см. migrations.py)"""
+    from . import migrations
+    migrations.migrate(engine)
\ No newline at end of file
@@ -0,0 +1,218 @@
+"""
+Версионные миграции схемы базы данных.
+
+Номер последней применённой миграции хранится в таблице schema_migrations.
+create_tables применяет недостающие миграции по порядку, каждую в своей
+транзакции. Миграции идемпотентны: на базе, созданной до появления этого
+механизма, уже существующие объекты пропускаются.
+
+Новая миграция добавляется в конец списка MIGRATIONS; изменять или
+переставлять применённые миграции нельзя.
+"""
+
+from typing import Callable, List, Tuple
+
+from sqlalchemy import MetaData, inspect
+from sqlalchemy.schema import CreateColumn, CreateTable
+
+from .db import Base
+from . import changes, models, search, stats
+
+
+def _create_tables(connection) -> None:
+    """Таблицы, которых ещё нет (существующие не меняются)"""
+    Base.metadata.create_all(bind=connection)
+
+
+def _default_sql(connection, default) -> str:
+    """SQL-выражение значения по умолчанию колонки"""
+    if isinstance(default, str):
+        return "'" + default.replace("'", "''") + "'"
+    return str(default.compile(dialect=connection.dialect))
+
+
+def _rebuild_table(connection, table, existing: set) -> None:
+    """
+    Пересоздание таблицы SQLite по текущей модели с копированием данных.
+
+    Нужно для колонок, которые нельзя добавить через ALTER TABLE (например,
+    с DEFAULT CURRENT_TIMESTAMP). Недостающие колонки заполняются значением
+    по умолчанию. Индексы создаёт миграция индексов.
+    """
+    # Остальные таблицы копируются в ту же MetaData, чтобы разрешились внешние ключи
+    metadata = MetaData()
+    for other in Base.metadata.sorted_tables:
+        if other is not table:
+            other.to_metadata(metadata)
+    new_table = table.to_metadata(metadata, name=f"{table.name}_new")
+    new_table.indexes.clear()
+    connection.execute(CreateTable(new_table))
+
+    columns, values = [], []
+    for column in table.columns:
+        columns.append(column.name)
+        if column.name in existing:
+            values.append(column.name)
+        elif column.server_default is not None:
+            values.append(_default_sql(connection, column.server_default.arg))
+        else:
+            values.append("NULL")
+    connection.exec_driver_sql(
+        f"INSERT INTO {new_table.name} ({', '.join(columns)}) "
+        f"SELECT {', '.join(values)} FROM {table.name}"
+    )
+    connection.exec_driver_sql(f"DROP TABLE {table.name}")
+    connection.exec_driver_sql(f"ALTER TABLE {new_table.name} RENAME TO {table.name}")
+
+
+def _add_missing_columns(connection) -> None:
+    """
+    Колонки моделей, которых нет в таблицах старых баз.
+
+    Колонки с постоянным значением по умолчанию (version) добавляются через
+    ALTER TABLE, остальные (created_at) — пересозданием таблицы.
+    """
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        # Таблицы, которых ещё нет, создают их миграции
+        if table.name not in tables:
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        missing = [column for column in table.columns if column.name not in existing]
+        if not missing:
+            continue
+        if all(isinstance(getattr(column.server_default, "arg", None), str) for column in missing):
+            for column in missing:
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+        else:
+            _rebuild_table(connection, table, existing)
+
+
+def _create_search_index(connection) -> None:
+    """Полнотекстовый индекс книг (FTS5)"""
+    search.create_search_index(connection)
+
+
+def _create_stats(connection) -> None:
+    """Триггеры и заполнение category_stats"""
+    stats.create_stats_triggers(connection)
+
+
+def _create_book_counts(connection) -> None:
+    """Колонка categories.book_count, её триггеры и заполнение"""
+    _add_missing_columns(connection)
+    stats.create_book_count_triggers(connection)
+
+
+def _create_indexes(connection) -> None:
+    """Индексы моделей, в том числе составные индексы книг по категории"""
+    for table in (models.Category.__table__, models.Book.__table__):
+        for index in table.indexes:
+            # Уникальные индексы требуют очистки данных, их создают свои миграции
+            if not index.unique:
+                index.create(bind=connection, checkfirst=True)
+
+
+class MigrationError(Exception):
+    """Миграцию нельзя применить без вмешательства оператора"""
+
+
+# Сколько повторяющихся ссылок перечислять в сообщении MigrationError
+_DUPLICATE_URLS_SHOWN = 20
+
+
+def _create_book_url_index(connection) -> None:
+    """
+    Уникальный индекс books.url.
+
+    Данные миграция не меняет: если у нескольких книг одна ссылка, индекс не
+    создать, и миграция прерывается с MigrationError со списком ссылок и ID
+    книг. Ссылки исправляют вручную или командой
+    python -m app.maintenance dedupe-book-urls.
+    """
+    duplicates = connection.exec_driver_sql(
+        """
+        SELECT url, group_concat(id, ', ') FROM books
+        WHERE url IS NOT NULL
+        GROUP BY url HAVING count(*) > 1
+        ORDER BY min(id)
+        """
+    ).all()
+    if duplicates:
+        lines = [f"  {url}: книги {ids}" for url, ids in duplicates[:_DUPLICATE_URLS_SHOWN]]
+        if len(duplicates) > _DUPLICATE_URLS_SHOWN:
+            lines.append(f"  ... и ещё {len(duplicates) - _DUPLICATE_URLS_SHOWN}")
+        raise MigrationError(
+            f"Уникальный индекс books.url не создать: ссылок у нескольких книг — {len(duplicates)}\n"
+            + "\n".join(lines)
+            + "\nИсправьте ссылки или выполните python -m app.maintenance dedupe-book-urls "
+            "(ссылка останется у книги с меньшим ID)"
+        )
+    for index in models.Book.__table__.indexes:
+        if index.unique:
+            index.create(bind=connection, checkfirst=True)
+
+
+def _create_change_log(connection) -> None:
+    """Таблицы журнала изменений и его триггеры"""
+    _create_tables(connection)
+    changes.create_change_log_triggers(connection)
+
+
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "Таблицы категорий, книг и статистики", _create_tables),
+    (2, "Колонки created_at и version в старых базах", _add_missing_columns),
+    (3, "Полнотекстовый индекс books_fts", _create_search_index),
+    (4, "Сводная статистика category_stats", _create_stats),
+    (5, "Составные индексы для фильтров и сортировок книг", _create_indexes),
+    (6, "Счётчик книг categories.book_count", _create_book_counts),
+    (7, "Уникальный индекс books.url для upsert по ссылке", _create_book_url_index),
+    (8, "Журнал изменений changes и его триггеры", _create_change_log),
+]
+
+
+def _ensure_version_table(connection) -> None:
+    connection.exec_driver_sql(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        """
+    )
+
+
+def current_version(connection) -> int:
+    """Номер последней применённой миграции (0 для новой базы)"""
+    _ensure_version_table(connection)
+    return connection.exec_driver_sql("SELECT max(version) FROM schema_migrations").scalar() or 0
+
+
+def migrate(engine) -> List[int]:
+    """Применение недостающих миграций; возвращает номера применённых"""
+    with engine.begin() as connection:
+        version = current_version(connection)
+
+    applied = []
+    for number, description, migration in MIGRATIONS:
+        if number <= version:
+            continue
+        with engine.connect() as connection:
+            # Пересоздание таблиц (DROP TABLE) не должно запускать ON DELETE CASCADE;
+            # PRAGMA foreign_keys действует только вне транзакции
+            foreign_keys = connection.exec_driver_sql("PRAGMA foreign_keys").scalar()
+            connection.exec_driver_sql("PRAGMA foreign_keys = OFF")
+            try:
+                with connection.begin():
+                    migration(connection)
+                    connection.exec_driver_sql(
+                        "INSERT INTO schema_migrations (version, description) VALUES (?, ?)",
+                        (number, description)
+                    )
+            finally:
+                connection.exec_driver_sql(f"PRAGMA foreign_keys = {int(bool(foreign_keys))}")
+        applied.append(number)
+    return applied
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Text, DateTime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Text, DateTime, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from .db import Base
@@ -10,9 +10,20 @@ class Category(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False, unique=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Версия записи: растёт при каждом изменении (ETag, оптимистичная блокировка)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Число книг категории: поддерживается триггерами на books (см. stats.py),
+    # версию категории не меняет
+    book_count = Column(Integer, nullable=False, default=0, server_default="0")
     
-    # Связь с книгами
-    books = relationship("Book", back_populates="category", cascade="all, delete-orphan")
+    __mapper_args__ = {"version_id_col": version}
+    __table_args__ = (
+        Index("ix_categories_created_at", "created_at"),
+    )
+    
+    # Связь с книгами. Книги удалённой категории удаляет сама база
+    # (ON DELETE CASCADE, PRAGMA foreign_keys включается в db.py), не загружая их в сессию
+    books = relationship("Book", back_populates="category", cascade="all, delete-orphan", passive_deletes=True)
     
     def __repr__(self):
         return f"<Category(id={self.id}, title='{self.title}')>"
@@ -29,9 +40,70 @@ class Book(Base):
     url = Column(String(500), nullable=True)
     category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Версия записи: растёт при каждом изменении (ETag, оптимистичная блокировка)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    
+    __mapper_args__ = {"version_id_col": version}
+    # Индексы под фильтр по категории и сортировки crud.get_books
+    # (id в конце — порядок внутри одинаковых значений для курсорной пагинации)
+    __table_args__ = (
+        Index("ix_books_category_id_id", "category_id", "id"),
+        Index("ix_books_category_id_price", "category_id", "price", "id"),
+        Index("ix_books_category_id_created_at", "category_id", "created_at", "id"),
+        Index("ix_books_category_id_title", "category_id", "title", "id"),
+        Index("ix_books_price", "price", "id"),
+        Index("ix_books_created_at", "created_at", "id"),
+        # Естественный ключ книги для upsert (crud.upsert_books); книг без ссылки может быть много
+        Index("ux_books_url", "url", unique=True),
+    )
     
     # Связь с категорией
     category = relationship("Category", back_populates="books")
     
     def __repr__(self):
-        return f"<Book(id={self.id}, title='{self.title}', price={self.price})>"
\ No newline at end of file
+        return f"<Book(id={self.id}, title='{self.title}', price={self.price})>"
+
+
+class CategoryStats(Base):
+    """Сводная статистика цен книг категории (поддерживается триггерами, см. stats.py)"""
+    __tablename__ = "category_stats"
+    
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), primary_key=True)
+    book_count = Column(Integer, nullable=False, default=0, server_default="0")
+    price_sum = Column(Float, nullable=False, default=0, server_default="0")
+    price_min = Column(Float, nullable=True)
+    price_max = Column(Float, nullable=True)
+    
+    def __repr__(self):
+        return f"<CategoryStats(category_id={self.category_id}, book_count={self.book_count})>"
+
+
+class Change(Base):
+    """Запись журнала изменений книг и категорий (пишут триггеры, см. changes.py)"""
+    __tablename__ = "changes"
+    
+    # AUTOINCREMENT: номер не переиспользуется после сжатия журнала
+    seq = Column(Integer, primary_key=True)
+    entity = Column(String(20), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String(10), nullable=False)
+    version = Column(Integer, nullable=True)
+    changed_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    __table_args__ = (
+        # Поиск записей сущности при сжатии журнала
+        Index("ix_changes_entity", "entity", "entity_id", "seq"),
+        {"sqlite_autoincrement": True},
+    )
+    
+    def __repr__(self):
+        return f"<Change(seq={self.seq}, entity='{self.entity}', entity_id={self.entity_id}, op='{self.op}')>"
+
+
+class ChangeLogState(Base):
+    """Состояние журнала изменений (одна строка)"""
+    __tablename__ = "change_log_state"
+    
+    id = Column(Integer, primary_key=True)
+    # Записи с seq не больше этого удалены по сроку хранения
+    truncated_seq = Column(Integer, nullable=False, default=0, server_default="0")
@@ -0,0 +1,106 @@
+"""
+Курсорная (keyset) пагинация.
+
+Курсор — непрозрачная строка, в которой закодированы колонка сортировки,
+направление, значение этой колонки у последней выданной записи и её ID.
+Следующая страница выбирается условием по этим значениям, а не через OFFSET,
+поэтому стоимость запроса не растёт с номером страницы.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+import sqlalchemy as sa
+
+
+class InvalidCursorError(ValueError):
+    """Курсор повреждён или не соответствует текущей сортировке"""
+
+
+def _to_db_value(value: Any) -> Any:
+    """Приведение значения к виду, в котором SQLite хранит его в колонке"""
+    if isinstance(value, datetime):
+        # CURRENT_TIMESTAMP хранится как 'YYYY-MM-DD HH:MM:SS'
+        return value.isoformat(sep=" ")
+    return value
+
+
+def encode_cursor(sort_by: str, sort_order: str, value: Any, last_id: int) -> str:
+    """Кодирование позиции последней записи страницы в курсор"""
+    payload = {"s": sort_by, "o": sort_order, "v": _to_db_value(value), "id": last_id}
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, sort_order: str) -> Tuple[Any, int]:
+    """Декодирование курсора в пару (значение колонки сортировки, ID)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        value, last_id = payload["v"], int(payload["id"])
+        cursor_sort = (payload["s"], payload["o"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError("Некорректный курсор") from e
+
+    if cursor_sort != (sort_by, sort_order):
+        raise InvalidCursorError("Курсор создан для другой сортировки")
+    return value, last_id
+
+
+def order_by_keyset(query, sort_column, id_column, sort_order: str):
+    """Сортировка по колонке и ID (ID — для однозначного порядка)"""
+    direction = sa.desc if sort_order == "desc" else sa.asc
+    if sort_column is id_column:
+        return query.order_by(direction(id_column))
+    return query.order_by(direction(sort_column), direction(id_column))
+
+
+def apply_keyset(
+    query,
+    sort_column,
+    id_column,
+    sort_order: str,
+    cursor: Optional[str],
+    sort_by: str
+):
+    """Ограничение выборки записями, идущими после позиции из курсора"""
+    if not cursor:
+        return query
+
+    value, last_id = decode_cursor(cursor, sort_by, sort_order)
+    if isinstance(sort_column.type, sa.DateTime):
+        # Сравниваем с хранимым текстом, минуя преобразование DateTime
+        value = sa.literal(value, sa.String)
+
+    if sort_column is id_column:
+        if sort_order == "desc":
+            return query.filter(id_column < last_id)
+        return query.filter(id_column > last_id)
+
+    # Отдельное условие col >= value (col <= value) позволяет начать чтение
+    # индекса (col, id) с позиции курсора, а не с начала
+    if sort_order == "desc":
+        return query.filter(
+            sort_column <= value,
+            sa.or_(sort_column < value, id_column < last_id)
+        )
+    return query.filter(
+        sort_column >= value,
+        sa.or_(sort_column > value, id_column > last_id)
+    )
+
+
+def next_cursor(items: list, limit: int, sort_by: str, sort_order: str) -> Optional[str]:
+    """
+    Курсор следующей страницы.
+
+    Ожидает список, выбранный с лимитом limit + 1: лишняя запись означает,
+    что следующая страница существует, и отрезается от списка.
+    """
+    if len(items) <= limit:
+        return None
+    del items[limit:]
+    last = items[-1]
+    return encode_cursor(sort_by, sort_order, getattr(last, sort_by), last.id)
@@ -0,0 +1,279 @@
+"""
+Проверка планов запросов crud (EXPLAIN QUERY PLAN).
+
+Каждый сценарий вызывает функцию crud, перехватывает выполненные SELECT и
+получает их план. Проверка не проходит, если запрос читает таблицу целиком
+(SCAN без индекса) или сортирует через временное B-дерево (USE TEMP B-TREE).
+Полный просмотр допустим только для таблиц, явно указанных в сценарии:
+например, выборка первой страницы по id идёт по rowid и останавливается на LIMIT.
+
+Запуск: python -m app.maintenance check-query-plans
+"""
+
+import re
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import crud, models, pagination, search
+from .cache import entity_cache
+
+
+BOOK_SORTS = crud.BOOK_SORT_COLUMNS
+CATEGORY_SORTS = crud.CATEGORY_SORT_COLUMNS
+SORT_ORDERS = ("asc", "desc")
+
+# Пример значения колонки сортировки для курсора
+_CURSOR_VALUES = {
+    "id": 1,
+    "title": "М",
+    "price": 500.0,
+    "created_at": datetime(2024, 1, 1),
+    "rank": -1.0,
+}
+
+_SCAN = re.compile(r"^SCAN (\w+)(.*)$")
+
+
+class Case(NamedTuple):
+    name: str
+    run: Callable[[Session], object]
+    # Таблицы, полный просмотр которых допустим
+    allow_scan: Tuple[str, ...] = ()
+    # Допустима ли сортировка через временное B-дерево
+    allow_sort: bool = False
+    # Сценарий продолжает выборку с позиции курсора
+    cursor: bool = False
+
+
+class Problem(NamedTuple):
+    case: str
+    statement: str
+    detail: str
+
+
+def _cursor(sort_by: str, sort_order: str) -> str:
+    return pagination.encode_cursor(sort_by, sort_order, _CURSOR_VALUES[sort_by], 1)
+
+
+def _book_list_cases() -> List[Case]:
+    cases = []
+    for category_id in (None, 1):
+        for sort_by in BOOK_SORTS:
+            for sort_order in SORT_ORDERS:
+                for with_cursor in (False, True):
+                    name = (
+                        f"get_book_rows_page category_id={category_id} sort={sort_by} "
+                        f"{sort_order}{' cursor' if with_cursor else ''}"
+                    )
+                    cursor = _cursor(sort_by, sort_order) if with_cursor else None
+                    # Первая страница по id без фильтра — просмотр по rowid до LIMIT
+                    first_page_by_id = category_id is None and sort_by == "id" and not with_cursor
+                    cases.append(Case(
+                        name,
+                        lambda db, c=category_id, s=sort_by, o=sort_order, k=cursor:
+                            crud.get_book_rows_page(db, limit=20, category_id=c, sort_by=s, sort_order=o, cursor=k),
+                        ("books",) if first_page_by_id else (),
+                        cursor=with_cursor
+                    ))
+    return cases
+
+
+# Фильтры по диапазонам: колонка → параметры crud
+_RANGES = {
+    "price": {"min_price": 100.0, "max_price": 500.0},
+    "created_at": {"created_after": datetime(2021, 1, 1), "created_before": datetime(2022, 1, 1)},
+}
+
+
+def _with_threshold(threshold: int, run: Callable[[Session], object]) -> Callable[[Session], object]:
+    """Сценарий с заданным порогом узкого диапазона (не зависит от данных базы)"""
+    def wrapper(db: Session):
+        saved = crud.RANGE_SELECTIVITY_THRESHOLD
+        crud.RANGE_SELECTIVITY_THRESHOLD = threshold
+        try:
+            return run(db)
+        finally:
+            crud.RANGE_SELECTIVITY_THRESHOLD = saved
+    return wrapper
+
+
+def _book_range_cases() -> List[Case]:
+    """
+    Фильтры по диапазонам с каждой сортировкой.
+    
+    Узкий диапазон другой колонки читается по её индексу с сортировкой
+    найденных строк (временное B-дерево допустимо), широкий — по индексу
+    сортировки без сортировки.
+    """
+    cases = []
+    for category_id in (None, 1):
+        for columns in (("price",), ("created_at",), ("price", "created_at")):
+            ranges = {name: value for column in columns for name, value in _RANGES[column].items()}
+            for width, threshold in (("narrow", 1 << 62), ("wide", 0)):
+                for sort_by in BOOK_SORTS:
+                    for sort_order in SORT_ORDERS:
+                        for with_cursor in (False, True):
+                            name = (
+                                f"get_book_rows_page category_id={category_id} {width} "
+                                f"{'+'.join(columns)} sort={sort_by} {sort_order}"
+                                f"{' cursor' if with_cursor else ''}"
+                            )
+                            cursor = _cursor(sort_by, sort_order) if with_cursor else None
+                            first_page_by_id = category_id is None and sort_by == "id" and not with_cursor
+                            cases.append(Case(
+                                name,
+                                _with_threshold(threshold, lambda db, c=category_id, s=sort_by, o=sort_order,
+                                                k=cursor, r=ranges: crud.get_book_rows_page(
+                                    db, limit=20, category_id=c, sort_by=s, sort_order=o, cursor=k, **r
+                                )),
+                                ("books",) if first_page_by_id else (),
+                                allow_sort=width == "narrow" and columns != (sort_by,),
+                                cursor=with_cursor
+                            ))
+    return cases
+
+
+def _category_list_cases() -> List[Case]:
+    cases = []
+    for sort_by in CATEGORY_SORTS:
+        for sort_order in SORT_ORDERS:
+            for with_cursor in (False, True):
+                name = f"get_categories_page sort={sort_by} {sort_order}{' cursor' if with_cursor else ''}"
+                cursor = _cursor(sort_by, sort_order) if with_cursor else None
+                first_page_by_id = sort_by == "id" and not with_cursor
+                cases.append(Case(
+                    name,
+                    lambda db, s=sort_by, o=sort_order, k=cursor:
+                        crud.get_categories_page(db, limit=20, sort_by=s, sort_order=o, cursor=k),
+                    ("categories",) if first_page_by_id else (),
+                    cursor=with_cursor
+                ))
+    return cases
+
+
+def _get_uncached(getter):
+    def run(db: Session):
+        entity_cache.clear()
+        return getter(db, 1)
+    return run
+
+
+def build_cases(db: Session) -> List[Case]:
+    """Сценарии проверки для всех запросов чтения crud"""
+    cases = _book_list_cases() + _book_range_cases() + _category_list_cases() + [
+        Case("get_book", _get_uncached(crud.get_book)),
+        Case("get_book_row fields=id,price", lambda db: crud.get_book_row(db, 1, {"id", "price"})),
+        Case("get_book_row_by_url", lambda db: crud.get_book_row_by_url(db, "https://example.com/books/1")),
+        Case("get_changes", lambda db: crud.get_changes(db, 0, 100), ("change_log_state", "sqlite_sequence")),
+        Case("get_book_rows_page category_id=1 fields=id,title,price",
+             lambda db: crud.get_book_rows_page(db, limit=20, category_id=1, fields={"id", "title", "price"})),
+        Case("get_category", _get_uncached(crud.get_category)),
+        Case("get_book_with_category", lambda db: crud.get_book_with_category(db, 1)),
+        Case("get_category_with_books", lambda db: crud.get_category_with_books(db, 1)),
+        Case("get_books_by_ids", lambda db: crud.get_books_by_ids(db, [1, 2, 3])),
+        Case("get_categories_by_ids", lambda db: crud.get_categories_by_ids(db, [1, 2, 3])),
+        Case("get_category_by_title", lambda db: crud.get_category_by_title(db, "Фантастика")),
+        Case("get_books_with_category category_id=1",
+             lambda db: crud.get_books_with_category(db, category_id=1)),
+        # Сортируются только отобранные книги (не больше limit на категорию)
+        Case("get_books_by_category limit=100",
+             lambda db: crud.get_books_by_category(db, [1, 2, 3], limit=100), allow_sort=True),
+        # Агрегаты по всем книгам и категориям: просмотр покрывающего индекса
+        Case("get_category_ids", lambda db: crud.get_category_ids(db), ("categories",)),
+        Case("get_books_count_by_category", lambda db: crud.get_books_count_by_category(db), ("books",)),
+        # O(категорий) по сводной таблице
+        Case("get_library_stats", lambda db: crud.get_library_stats(db), ("categories",)),
+        # Порог узкого диапазона по сводной таблице; план зависит от данных
+        Case("get_book_rows_page price sort=title", lambda db: crud.get_book_rows_page(
+            db, limit=20, sort_by="title", **_RANGES["price"]), ("category_stats",), allow_sort=True),
+        Case("get_book_rows_page category_id=1 price sort=title", lambda db: crud.get_book_rows_page(
+            db, limit=20, category_id=1, sort_by="title", **_RANGES["price"]), allow_sort=True),
+    ]
+    if search.is_available(db):
+        # Сортировка по релевантности — только среди найденных строк
+        cases += [
+            Case("search_books_page", lambda db: crud.search_books_page(db, "книга", limit=20),
+                 allow_sort=True),
+            Case("search_books_page cursor", lambda db: crud.search_books_page(
+                db, "книга", limit=20, cursor=_cursor("rank", "asc")), allow_sort=True),
+            # Группировка найденных книг по категории и ценовому интервалу
+            Case("search_facets", lambda db: crud.search_facets(db, "книга", (100, 500, 1000)),
+                 allow_sort=True),
+        ]
+    return cases
+
+
+def _capture(db: Session, run: Callable[[Session], object]) -> List[Tuple[str, tuple]]:
+    """Выполнение сценария с перехватом SELECT"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    engine = db.get_bind()
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        run(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+        db.rollback()
+    return statements
+
+
+def explain(db: Session, statement: str, parameters=()) -> List[str]:
+    """Строки плана запроса"""
+    rows = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+    return [row[-1] for row in rows]
+
+
+def _problems(plan: List[str], case: Case) -> List[str]:
+    problems = []
+    for detail in plan:
+        if "USE TEMP B-TREE" in detail:
+            if not case.allow_sort:
+                problems.append(detail)
+            continue
+        match = _SCAN.match(detail)
+        if match is None:
+            continue
+        table, rest = match.groups()
+        # Виртуальная таблица FTS или подзапрос — не просмотр таблицы
+        if "VIRTUAL TABLE" in rest or table not in _TABLES:
+            continue
+        # Просмотр индекса по порядку сортировки допустим только без курсора:
+        # с курсором чтение должно начинаться с его позиции (SEARCH)
+        if "USING" in rest and not case.cursor:
+            continue
+        if table not in case.allow_scan:
+            problems.append(detail)
+    return problems
+
+
+_TABLES = {
+    models.Book.__tablename__,
+    models.Category.__tablename__,
+    models.CategoryStats.__tablename__,
+}
+
+
+def check(db: Session) -> Tuple[int, List[Problem]]:
+    """Проверка всех сценариев; возвращает число запросов и найденные проблемы"""
+    checked, problems = 0, []
+    for case in build_cases(db):
+        for statement, parameters in _capture(db, case.run):
+            checked += 1
+            for detail in _problems(explain(db, statement, parameters), case):
+                problems.append(Problem(case.name, statement, detail))
+    return checked, problems
+
+
+def plans(db: Session) -> Dict[str, List[List[str]]]:
+    """Планы всех запросов по сценариям (для анализа)"""
+    return {
+        case.name: [explain(db, statement, parameters) for statement, parameters in _capture(db, case.run)]
+        for case in build_cases(db)
+    }
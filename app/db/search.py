@@ -0,0 +1,211 @@
+"""
+Полнотекстовый поиск по книгам на основе SQLite FTS5.
+
+Индекс books_fts хранит только токены (external content): текст берётся из
+таблицы books, а синхронизацию при вставке, изменении и удалении книг
+выполняют триггеры. Если FTS5 недоступен (другая СУБД или SQLite собран
+без расширения), crud использует прежний поиск через LIKE.
+"""
+
+import html
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+SNIPPET_ELLIPSIS = "…"
+SNIPPET_TOKENS = 16
+
+# Границы совпадений, которые расставляют highlight()/snippet() FTS5:
+# управляющие символы не встречаются в тексте книг, поэтому после
+# экранирования текста их можно заменить на HIGHLIGHT_START/HIGHLIGHT_END
+_MATCH_START = "\x02"
+_MATCH_END = "\x03"
+
+_REBUILD = "INSERT INTO books_fts(books_fts) VALUES ('rebuild')"
+
+_CREATE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE books_fts USING fts5(
+        title, description,
+        content='books', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, description ON books BEGIN
+        INSERT INTO books_fts(books_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO books_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    # Индексируем книги, добавленные до появления индекса
+    _REBUILD,
+]
+
+_SEARCH_SQL = f"""
+    SELECT rowid AS id,
+           rank,
+           highlight(books_fts, 0, char(2), char(3)) AS title,
+           snippet(books_fts, 1, char(2), char(3),
+                   '{SNIPPET_ELLIPSIS}', {SNIPPET_TOKENS}) AS snippet
+    FROM books_fts
+    WHERE books_fts MATCH :match {{after}}
+    ORDER BY rank, rowid
+    LIMIT :limit OFFSET :skip
+"""
+
+_AFTER_SQL = "AND rank >= :rank AND (rank > :rank OR rowid > :last_id)"
+
+# Кэш доступности индекса по URL подключения
+_available: Dict[str, bool] = {}
+
+
+class SearchHit(NamedTuple):
+    """Результат полнотекстового поиска"""
+    id: int
+    rank: float
+    title: str
+    snippet: Optional[str]
+
+
+def _has_fts5(connection) -> bool:
+    """Проверка, что SQLite собран с поддержкой FTS5"""
+    options = connection.exec_driver_sql("PRAGMA compile_options").scalars().all()
+    return "ENABLE_FTS5" in options
+
+
+def create_search_index(connection) -> bool:
+    """Создание индекса и триггеров синхронизации, если их ещё нет"""
+    key = str(connection.engine.url)
+    if connection.dialect.name != "sqlite" or not _has_fts5(connection):
+        _available[key] = False
+        return False
+
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'"
+    ).first()
+    if not exists:
+        for statement in _CREATE_INDEX:
+            connection.exec_driver_sql(statement)
+
+    _available[key] = True
+    return True
+
+
+def is_available(db: Session) -> bool:
+    """Есть ли в базе полнотекстовый индекс книг"""
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _available:
+        _available[key] = bind.dialect.name == "sqlite" and db.execute(sa.text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'"
+        )).first() is not None
+    return _available[key]
+
+
+def rebuild_index(db: Session) -> None:
+    """Полное перестроение индекса по таблице books (например, после загрузки без триггеров)"""
+    db.execute(sa.text(_REBUILD))
+    db.commit()
+
+
+def match_query(search_term: str) -> Optional[str]:
+    """
+    Преобразование пользовательского запроса в выражение FTS5.
+
+    Каждое слово ищется как префикс, все слова должны встретиться.
+    Синтаксис FTS5 (кавычки, операторы) из запроса не пропускается.
+    """
+    tokens = re.findall(r"\w+", search_term)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def search(
+    db: Session,
+    search_term: str,
+    limit: int = 100,
+    skip: int = 0,
+    after: Optional[tuple] = None
+) -> List[SearchHit]:
+    """
+    Поиск книг по релевантности (bm25).
+
+    after — пара (rank, id) последнего результата предыдущей страницы.
+    """
+    match = match_query(search_term)
+    if match is None:
+        return []
+
+    params = {"match": match, "limit": limit, "skip": skip}
+    after_sql = ""
+    if after is not None:
+        params["rank"], params["last_id"] = after
+        after_sql = _AFTER_SQL
+
+    rows = db.execute(sa.text(_SEARCH_SQL.format(after=after_sql)), params)
+    return [
+        SearchHit(row.id, row.rank, _markup(row.title), _markup(row.snippet))
+        for row in rows
+    ]
+
+
+def _markup(text: Optional[str]) -> Optional[str]:
+    """HTML из текста с границами совпадений FTS5: текст экранируется"""
+    if text is None:
+        return None
+    return (
+        html.escape(text)
+        .replace(_MATCH_START, HIGHLIGHT_START)
+        .replace(_MATCH_END, HIGHLIGHT_END)
+    )
+
+
+def match_ids(search_term: str) -> Optional[sa.sql.Select]:
+    """Подзапрос ID всех совпавших книг (id), например для агрегатов по результатам"""
+    match = match_query(search_term)
+    if match is None:
+        return None
+    return sa.select(sa.literal_column("rowid").label("id")).select_from(
+        sa.table("books_fts")
+    ).where(sa.text("books_fts MATCH :match").bindparams(match=match))
+
+
+def highlight(text: Optional[str], search_term: str) -> Optional[str]:
+    """
+    Подсветка запроса в тексте (для поиска через LIKE).
+
+    Результат — HTML: и совпадения, и текст между ними экранируются.
+    """
+    if not text:
+        return text
+    if not search_term:
+        return html.escape(text)
+    pattern = re.compile(re.escape(search_term), re.IGNORECASE)
+    parts = []
+    position = 0
+    for match in pattern.finditer(text):
+        parts.append(html.escape(text[position:match.start()]))
+        parts.append(f"{HIGHLIGHT_START}{html.escape(match.group(0))}{HIGHLIGHT_END}")
+        position = match.end()
+    parts.append(html.escape(text[position:]))
+    return "".join(parts)
@@ -0,0 +1,168 @@
+"""
+Сводная статистика цен по категориям (таблица category_stats) и счётчик
+книг категории (колонка categories.book_count).
+
+Их поддерживают триггеры на books: вставка, изменение цены или
+категории и удаление книги меняют только строку её категории. Поэтому
+статистика читается за O(категорий) при любом размере каталога.
+Минимум и максимум пересчитываются запросом по категории, только если
+удалённая или изменённая книга была крайней по цене.
+
+Триггеры выполняются в транзакции изменения книги: счётчики не
+расходятся с таблицей books ни при откате, ни при параллельной записи.
+check находит расхождения (например, после записи в базу в обход
+триггеров), rebuild исправляет их.
+"""
+
+from typing import List, NamedTuple
+
+from sqlalchemy.orm import Session
+
+
+_ADD_BOOK = """
+    INSERT INTO category_stats (category_id, book_count, price_sum, price_min, price_max)
+    VALUES (new.category_id, 1, new.price, new.price, new.price)
+    ON CONFLICT (category_id) DO UPDATE SET
+        book_count = book_count + 1,
+        price_sum = price_sum + excluded.price_sum,
+        price_min = min(coalesce(price_min, excluded.price_min), excluded.price_min),
+        price_max = max(coalesce(price_max, excluded.price_max), excluded.price_max);
+"""
+
+# Выполняется после удаления строки, поэтому min/max считаются уже без неё
+_REMOVE_BOOK = """
+    UPDATE category_stats SET
+        book_count = book_count - 1,
+        price_sum = CASE WHEN book_count = 1 THEN 0 ELSE price_sum - old.price END,
+        price_min = CASE WHEN old.price > price_min THEN price_min
+            ELSE (SELECT min(price) FROM books WHERE category_id = old.category_id) END,
+        price_max = CASE WHEN old.price < price_max THEN price_max
+            ELSE (SELECT max(price) FROM books WHERE category_id = old.category_id) END
+    WHERE category_id = old.category_id;
+"""
+
+_CREATE_TRIGGERS = [
+    f"CREATE TRIGGER category_stats_ai AFTER INSERT ON books BEGIN {_ADD_BOOK} END",
+    f"CREATE TRIGGER category_stats_ad AFTER DELETE ON books BEGIN {_REMOVE_BOOK} END",
+    f"""
+    CREATE TRIGGER category_stats_au AFTER UPDATE OF price, category_id ON books
+    WHEN old.price IS NOT new.price OR old.category_id IS NOT new.category_id
+    BEGIN {_REMOVE_BOOK} {_ADD_BOOK} END
+    """,
+    """
+    CREATE TRIGGER category_stats_category_ad AFTER DELETE ON categories BEGIN
+        DELETE FROM category_stats WHERE category_id = old.id;
+    END
+    """,
+]
+
+_CREATE_BOOK_COUNT_TRIGGERS = [
+    """
+    CREATE TRIGGER categories_book_count_ai AFTER INSERT ON books BEGIN
+        UPDATE categories SET book_count = book_count + 1 WHERE id = new.category_id;
+    END
+    """,
+    """
+    CREATE TRIGGER categories_book_count_ad AFTER DELETE ON books BEGIN
+        UPDATE categories SET book_count = book_count - 1 WHERE id = old.category_id;
+    END
+    """,
+    """
+    CREATE TRIGGER categories_book_count_au AFTER UPDATE OF category_id ON books
+    WHEN old.category_id IS NOT new.category_id
+    BEGIN
+        UPDATE categories SET book_count = book_count - 1 WHERE id = old.category_id;
+        UPDATE categories SET book_count = book_count + 1 WHERE id = new.category_id;
+    END
+    """,
+]
+
+_REBUILD_BOOK_COUNTS = """
+    UPDATE categories SET book_count = (
+        SELECT count(*) FROM books WHERE books.category_id = categories.id
+    )
+"""
+
+_REBUILD = [
+    "DELETE FROM category_stats",
+    """
+    INSERT INTO category_stats (category_id, book_count, price_sum, price_min, price_max)
+    SELECT category_id, count(*), total(price), min(price), max(price)
+    FROM books GROUP BY category_id
+    """,
+    _REBUILD_BOOK_COUNTS,
+]
+
+# Категории, у которых сводные значения не совпадают с пересчётом по books.
+# Сумма цен сравнивается с допуском: порядок сложения в триггерах другой
+_CHECK = """
+    SELECT c.id,
+           c.book_count, coalesce(actual.book_count, 0),
+           coalesce(s.book_count, 0), coalesce(s.price_sum, 0.0), s.price_min, s.price_max,
+           coalesce(actual.price_sum, 0.0), actual.price_min, actual.price_max
+    FROM categories AS c
+    LEFT JOIN category_stats AS s ON s.category_id = c.id
+    LEFT JOIN (
+        SELECT category_id, count(*) AS book_count, total(price) AS price_sum,
+               min(price) AS price_min, max(price) AS price_max
+        FROM books GROUP BY category_id
+    ) AS actual ON actual.category_id = c.id
+    WHERE c.book_count IS NOT coalesce(actual.book_count, 0)
+       OR coalesce(s.book_count, 0) IS NOT coalesce(actual.book_count, 0)
+       OR s.price_min IS NOT actual.price_min
+       OR s.price_max IS NOT actual.price_max
+       OR abs(coalesce(s.price_sum, 0.0) - coalesce(actual.price_sum, 0.0))
+          > 1e-6 * max(1.0, abs(coalesce(actual.price_sum, 0.0)))
+    ORDER BY c.id
+"""
+
+
+class Mismatch(NamedTuple):
+    """Расхождение сводных значений категории с таблицей books"""
+    category_id: int
+    book_count: int
+    actual_book_count: int
+    stats: tuple
+    actual_stats: tuple
+
+
+def create_stats_triggers(connection) -> None:
+    """Создание триггеров и первичное заполнение category_stats"""
+    if connection.dialect.name != "sqlite":
+        return
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'category_stats_ai'"
+    ).first()
+    if exists:
+        return
+    for statement in _CREATE_TRIGGERS + _REBUILD:
+        connection.exec_driver_sql(statement)
+
+
+def create_book_count_triggers(connection) -> None:
+    """Создание триггеров и первичное заполнение categories.book_count"""
+    if connection.dialect.name != "sqlite":
+        return
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'categories_book_count_ai'"
+    ).first()
+    if exists:
+        return
+    for statement in _CREATE_BOOK_COUNT_TRIGGERS + [_REBUILD_BOOK_COUNTS]:
+        connection.exec_driver_sql(statement)
+
+
+def check(db: Session) -> List[Mismatch]:
+    """Категории, у которых book_count или category_stats расходятся с таблицей books"""
+    return [
+        Mismatch(row[0], row[1], row[2], tuple(row[3:7]), (row[2], *row[7:10]))
+        for row in db.connection().exec_driver_sql(_CHECK)
+    ]
+
+
+def rebuild(db: Session) -> None:
+    """Полный пересчёт category_stats и categories.book_count по таблице books"""
+    connection = db.connection()
+    for statement in _REBUILD:
+        connection.exec_driver_sql(statement)
+    db.commit()
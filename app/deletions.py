@@ -0,0 +1,110 @@
+"""
+Фоновое удаление больших категорий порциями.
+
+Обычное удаление категории — одна транзакция: база удаляет все книги
+(ON DELETE CASCADE) и всё это время держит блокировку записи SQLite.
+Здесь книги удаляются порциями по DELETE_CHUNK_SIZE, каждая в своей
+транзакции, с паузой DELETE_CHUNK_PAUSE между ними, чтобы остальные
+запросы на запись успевали выполняться. Последней транзакцией удаляется
+сама категория (вместе с книгами, добавленными за время удаления).
+
+Ход удаления хранится в памяти процесса: задача запускается в отдельном
+потоке, её состояние доступно по ID (см. get).
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from app.db import crud
+from app.db.db import SessionLocal
+
+
+DELETE_CHUNK_SIZE = int(os.getenv("DELETE_CHUNK_SIZE", "2000"))
+DELETE_CHUNK_PAUSE = float(os.getenv("DELETE_CHUNK_PAUSE", "0.05"))
+# Сколько завершённых задач помнить для запросов хода удаления
+MAX_FINISHED_JOBS = 100
+
+logger = logging.getLogger("app.deletions")
+
+
+class DeletionJob:
+    """Состояние фонового удаления одной категории"""
+
+    def __init__(self, category_id: int, total: int):
+        self.id = uuid.uuid4().hex
+        self.category_id = category_id
+        self.status = "running"
+        self.total = total
+        self.deleted = 0
+        self.error: Optional[str] = None
+        self.started_at = datetime.now(timezone.utc)
+        self.finished_at: Optional[datetime] = None
+
+
+_jobs: "OrderedDict[str, DeletionJob]" = OrderedDict()
+# Выполняющиеся задачи по категории: повторный запрос не запускает вторую
+_running: Dict[int, DeletionJob] = {}
+_lock = threading.Lock()
+
+
+def _run(job: DeletionJob, chunk_size: int, pause: float) -> None:
+    db = SessionLocal()
+    try:
+        while True:
+            deleted = crud.delete_category_books_chunk(db, job.category_id, chunk_size)
+            if not deleted:
+                break
+            job.deleted += deleted
+            time.sleep(pause)
+        crud.delete_category(db, job.category_id)
+        job.status = "done"
+    except Exception as e:
+        db.rollback()
+        logger.exception("Фоновое удаление категории %s прервано", job.category_id)
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        db.close()
+        job.finished_at = datetime.now(timezone.utc)
+        with _lock:
+            _running.pop(job.category_id, None)
+
+
+def start(
+    category_id: int,
+    total: int,
+    chunk_size: int = DELETE_CHUNK_SIZE,
+    pause: float = DELETE_CHUNK_PAUSE
+) -> DeletionJob:
+    """
+    Запуск фонового удаления категории.
+
+    total — число книг категории (для оценки хода). Если удаление этой
+    категории уже выполняется, возвращается его задача.
+    """
+    with _lock:
+        job = _running.get(category_id)
+        if job is not None:
+            return job
+        job = DeletionJob(category_id, total)
+        _running[category_id] = job
+        _jobs[job.id] = job
+        finished = [job_id for job_id, other in _jobs.items() if other.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del _jobs[job_id]
+    threading.Thread(
+        target=_run, args=(job, chunk_size, pause), name=f"delete-category-{category_id}", daemon=True
+    ).start()
+    return job
+
+
+def get(job_id: str) -> Optional[DeletionJob]:
+    """Задача фонового удаления по ID"""
+    with _lock:
+        return _jobs.get(job_id)
@@ -0,0 +1,82 @@
+"""
+Потоковая выгрузка каталога книг в NDJSON или CSV.
+
+Строки читаются из базы порциями (yield_per) без создания ORM-объектов
+и сразу отдаются клиенту, поэтому расход памяти не зависит от размера
+каталога.
+"""
+
+import csv
+import io
+import json
+from typing import Iterator, Optional
+
+import sqlalchemy as sa
+
+from app.db import models
+from app.db.db import SessionLocal
+
+
+DEFAULT_CHUNK_SIZE = 1000
+
+COLUMNS = ("id", "title", "description", "price", "url", "category_id", "created_at")
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def _select_books(category_id: Optional[int] = None):
+    """Запрос выгружаемых колонок книг в порядке ID"""
+    query = sa.select(*(getattr(models.Book, column) for column in COLUMNS)).order_by(models.Book.id)
+    if category_id is not None:
+        query = query.where(models.Book.category_id == category_id)
+    return query
+
+
+def _format_ndjson(rows) -> str:
+    lines = []
+    for row in rows:
+        data = dict(row._mapping)
+        if data["created_at"] is not None:
+            data["created_at"] = data["created_at"].isoformat()
+        lines.append(json.dumps(data, ensure_ascii=False))
+    lines.append("")
+    return "\n".join(lines)
+
+
+def _format_csv(rows, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(COLUMNS)
+    for row in rows:
+        writer.writerow(
+            value.isoformat() if hasattr(value, "isoformat") else value for value in row
+        )
+    return buffer.getvalue()
+
+
+def export_books(
+    format: str = "ndjson",
+    category_id: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[str]:
+    """
+    Генератор выгрузки книг порциями по chunk_size строк.
+
+    Открывает собственную сессию: генератор живёт дольше обработчика
+    запроса, который возвращает StreamingResponse.
+    """
+    db = SessionLocal()
+    try:
+        result = db.execute(
+            _select_books(category_id).execution_options(stream_results=True, yield_per=chunk_size)
+        )
+        if format == "csv":
+            yield _format_csv([], header=True)
+        for rows in result.partitions(chunk_size):
+            yield _format_csv(rows) if format == "csv" else _format_ndjson(rows)
+    finally:
+        db.close()
@@ -0,0 +1,173 @@
+"""
+Пакетный импорт книг из NDJSON или CSV.
+
+Строки читаются потоком, проверяются схемой BookCreate и вставляются
+пачками: одна пачка — один executemany и одна транзакция. Ошибочные строки
+попадают в отчёт и не прерывают загрузку остальных.
+
+В режиме upsert строки проверяются схемой BookUpsert (ссылка обязательна),
+а пачка добавляет новые книги и обновляет существующие по ссылке
+(crud.upsert_books).
+"""
+
+import codecs
+import csv
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app import schemas
+from app.db import crud
+
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 10000
+# Сколько ошибок перечислять в отчёте (счётчик failed учитывает все)
+MAX_REPORTED_ERRORS = 1000
+
+
+def iter_lines(chunks: Iterable[bytes], encoding: str = "utf-8") -> Iterator[str]:
+    """Разбиение потока байтов на строки (с сохранением перевода строки)"""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    tail = ""
+    for chunk in chunks:
+        *lines, tail = (tail + decoder.decode(chunk)).split("\n")
+        for line in lines:
+            yield line + "\n"
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def iter_ndjson(lines: Iterable[str]) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """Разбор NDJSON: (номер строки, данные, ошибка)"""
+    for row_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f"Некорректный JSON: {e}"
+            continue
+        if not isinstance(data, dict):
+            yield row_number, None, "Ожидался JSON-объект"
+            continue
+        yield row_number, data, None
+
+
+def iter_csv(lines: Iterable[str]) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """Разбор CSV с заголовком: (номер записи, данные, ошибка)"""
+    reader = csv.DictReader(lines)
+    for row_number, row in enumerate(reader, 1):
+        if None in row:
+            yield row_number, None, "Лишние значения в строке"
+            continue
+        # Пустые ячейки считаем отсутствующими значениями
+        yield row_number, {key: value for key, value in row.items() if value not in ("", None)}, None
+
+
+def iter_records(lines: Iterable[str], format: str):
+    """Разбор строк в указанном формате"""
+    if format == "csv":
+        return iter_csv(lines)
+    return iter_ndjson(lines)
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    """Краткое описание ошибок валидации одной строки"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}"
+        for item in error.errors()
+    )
+
+
+class BookImporter:
+    """
+    Накопитель строк для пакетной вставки книг.
+
+    Существующие категории загружаются один раз, поэтому проверка
+    category_id не требует запроса на каждую строку.
+    """
+
+    def __init__(self, db: Session, batch_size: int = DEFAULT_BATCH_SIZE, upsert: bool = False):
+        self.db = db
+        self.batch_size = batch_size
+        self.upsert = upsert
+        self.category_ids = crud.get_category_ids(db)
+        self.result = schemas.BulkImportResult()
+        self._batch: List[Tuple[int, Dict[str, Any]]] = []
+
+    def add_error(self, row_number: int, message: str):
+        """Регистрация ошибочной строки"""
+        self.result.failed += 1
+        if len(self.result.errors) < MAX_REPORTED_ERRORS:
+            self.result.errors.append(schemas.BulkImportError(row=row_number, error=message))
+
+    def add(self, row_number: int, data: Dict[str, Any]):
+        """Проверка строки и постановка её в очередь на вставку"""
+        try:
+            book = (schemas.BookUpsert if self.upsert else schemas.BookCreate).model_validate(data)
+        except ValidationError as e:
+            self.add_error(row_number, _format_validation_error(e))
+            return
+        if book.category_id not in self.category_ids:
+            self.add_error(row_number, f"Категория с ID {book.category_id} не существует")
+            return
+
+        self._batch.append((row_number, book.model_dump()))
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        """Запись строк одной транзакцией с учётом в отчёте"""
+        if not self.upsert:
+            crud.bulk_create_books(self.db, rows)
+            self.result.inserted += len(rows)
+            return
+        counts = crud.upsert_books(self.db, rows)
+        self.result.inserted += counts.inserted
+        self.result.updated += counts.updated
+        self.result.unchanged += counts.unchanged
+
+    def flush(self):
+        """Вставка накопленной пачки одной транзакцией"""
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        try:
+            self._write([row for _, row in batch])
+            return
+        except (SQLAlchemyError, crud.InvalidReferenceError, crud.DuplicateKeyError):
+            self.db.rollback()
+
+        # Пачка не вставилась целиком — ищем виноватые строки по одной
+        for row_number, row in batch:
+            try:
+                self._write([row])
+            except (SQLAlchemyError, crud.InvalidReferenceError, crud.DuplicateKeyError) as e:
+                self.db.rollback()
+                self.add_error(row_number, f"Ошибка базы данных: {getattr(e, 'orig', None) or e}")
+
+    def run(self, records) -> schemas.BulkImportResult:
+        """Импорт всех записей из итератора (номер, данные, ошибка)"""
+        for row_number, data, error in records:
+            if error is not None:
+                self.add_error(row_number, error)
+            else:
+                self.add(row_number, data)
+        self.flush()
+        return self.result
+
+
+def import_books(
+    db: Session,
+    lines: Iterable[str],
+    format: str = "ndjson",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    upsert: bool = False
+) -> schemas.BulkImportResult:
+    """Импорт книг из строк NDJSON или CSV (upsert — добавление или обновление по ссылке)"""
+    return BookImporter(db, batch_size=batch_size, upsert=upsert).run(iter_records(lines, format))
@@ -1,10 +1,61 @@
+"""
+Инициализация базы данных.
 
+Запуск:
+    python app/init_db.py [--force]
+        демонстрационные данные: 2 категории и 7 книг
+    python app/init_db.py --scale 100 [--seed 42] [--force]
+    python app/init_db.py --categories 100 --books 10000000 [--seed 42] [--force]
+        синтетический каталог (см. app/dataset.py)
+
+Если в базе уже есть данные, они заменяются только с флагом --force.
+"""
+
+import argparse
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.db.db import SessionLocal, create_tables, engine
 from app.db import crud, models
-def init_database():
+from app.db.cache import entity_cache
+from app.importer import BookImporter
+from app import dataset
+
+
+def _has_data(db) -> bool:
+    return db.query(models.Category.id).first() is not None
+
+
+def generate_database(categories: int, books: int, seed: int, batch_size: int, force: bool = False):
+    """Заполнение базы синтетическим каталогом"""
+    print("=" * 60)
+    print(f"Генерация каталога: {categories} категорий, {books} книг (seed={seed})")
+    print("=" * 60)
+    create_tables()
+    db = SessionLocal()
+    try:
+        if _has_data(db) and not force:
+            print("В базе уже есть данные. Для замены запустите с флагом --force")
+            sys.exit(1)
+
+        def progress(loaded: int, elapsed: float):
+            print(f"  • Книг загружено: {loaded} ({loaded / elapsed:,.0f} строк/с)")
+
+        timings = dataset.load(
+            db, dataset.Dataset(categories, books, seed), batch_size=batch_size, progress=progress
+        )
+        print()
+        print("-" * 60)
+        print(f"Вставка книг:          {timings['insert']:.1f} с ({timings['insert_rows_per_second']:,.0f} строк/с)")
+        print(f"Индексы и триггеры:    {timings['indexes']:.1f} с")
+        print(f"Поиск и статистика:    {timings['search_and_stats']:.1f} с")
+        print(f"Всего:                 {timings['total']:.1f} с")
+        print("✓ Генерация завершена успешно!")
+    finally:
+        db.close()
+
+
+def init_database(force: bool = False):
     print("=" * 60)
     print("Инициализация базы данных...")
     print("=" * 60)
@@ -12,16 +63,13 @@ def init_database():
     print("✓ Таблицы созданы")
     db = SessionLocal()
     try:
-        existing_categories = crud.get_categories(db)
-        if existing_categories:
-            print("В базе уже есть данные. Хотите пересоздать? (y/n)")
-            response = input().lower()
-            if response != 'y':
-                print("Инициализация отменена")
-                return
+        if _has_data(db) and not force:
+            print("В базе уже есть данные. Для пересоздания запустите с флагом --force")
+            return
         db.query(models.Book).delete()
         db.query(models.Category).delete()
         db.commit()
+        entity_cache.clear()
         print("✓ Существующие данные удалены")
         categories_data = [
             {
@@ -80,19 +128,23 @@ def init_database():
         
         print("\nДобавление категорий и книг...")
         print("-" * 60)
+        categories = []
         for category_info in categories_data:
             category = crud.create_category(db, title=category_info["title"])
+            categories.append((category, category_info["books"]))
             print(f"✓ Категория создана: {category.title}")
-            for book_info in category_info["books"]:
-                book = crud.create_book(
-                    db=db,
-                    title=book_info["title"],
-                    description=book_info["description"],
-                    price=book_info["price"],
-                    url=book_info["url"],
-                    category_id=category.id
-                )
-                print(f"  • Книга добавлена: {book.title} ({book.price} руб.)")
+        
+        book_importer = BookImporter(db)
+        row_number = 0
+        for category, books in categories:
+            for book_info in books:
+                row_number += 1
+                book_importer.add(row_number, {**book_info, "category_id": category.id})
+        book_importer.flush()
+        result = book_importer.result
+        print(f"  • Книг добавлено: {result.inserted}")
+        for error in result.errors:
+            print(f"  ✗ Книга #{error.row} не добавлена: {error.error}")
         print("-" * 60)
         print("✓ Инициализация завершена успешно!")
         print("=" * 60)
@@ -107,5 +159,28 @@ def init_database():
     finally:
         db.close()
 
+def main():
+    parser = argparse.ArgumentParser(description="Инициализация базы данных библиотеки")
+    parser.add_argument("--scale", type=float, help="Масштаб синтетического каталога (1 — 100 000 книг)")
+    parser.add_argument("--categories", type=int, help="Число категорий синтетического каталога")
+    parser.add_argument("--books", type=int, help="Число книг синтетического каталога")
+    parser.add_argument("--seed", type=int, default=0, help="Начальное значение генератора")
+    parser.add_argument("--batch-size", type=int, default=dataset.DEFAULT_BATCH_SIZE)
+    parser.add_argument("--force", action="store_true", help="Заменить существующие данные")
+    args = parser.parse_args()
+
+    if args.scale is None and args.categories is None and args.books is None:
+        init_database(force=args.force)
+        return
+    size = dataset.scale_size(args.scale if args.scale is not None else 1)
+    generate_database(
+        categories=args.categories or size["categories"],
+        books=args.books or size["books"],
+        seed=args.seed,
+        batch_size=args.batch_size,
+        force=args.force
+    )
+
+
 if __name__ == "__main__":
-    init_database()
\ No newline at end of file
+    main()
\ No newline at end of file
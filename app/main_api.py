@@ -5,10 +5,13 @@ FastAPI приложение для управления библиотекой
 
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
 
-from app.db.db import get_db, create_tables
-from app.api import books, categories
+from app.db.db import engine, get_db, get_sqlite_settings, create_tables
+from app.db.cache import entity_cache
+from app.api import get_routers
+from app import metrics, query_audit
 
 # Создаем таблицы при импорте
 create_tables()
@@ -29,11 +32,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Браузер показывает Server-Timing для CORS-запросов только с этим разрешением
+    expose_headers=["Server-Timing"],
 )
 
+# Поиск N+1 и контроль бюджета SQL-запросов маршрутов (QUERY_AUDIT=warn|strict)
+if query_audit.QUERY_AUDIT != "off":
+    app.add_middleware(query_audit.QueryAuditMiddleware)
+
+# Метрики запросов, заголовок Server-Timing и /metrics (METRICS_ENABLED=0 — отключить)
+if metrics.METRICS_ENABLED:
+    metrics.instrument_fastapi()
+    app.add_middleware(metrics.MetricsMiddleware)
+
 # Подключаем роутеры
-app.include_router(categories.router)
-app.include_router(books.router)
+for router in get_routers():
+    app.include_router(router)
 
 
 @app.get("/")
@@ -49,7 +63,10 @@ def read_root():
         "endpoints": {
             "categories": "/categories",
             "books": "/books",
-            "health": "/health"
+            "stats": "/stats",
+            "changes": "/changes",
+            "health": "/health",
+            "metrics": "/metrics"
         }
     }
 
@@ -62,6 +79,8 @@ def health_check(db: Session = Depends(get_db)):
     Возвращает:
     - status: "healthy" если все работает
     - database: статус подключения к БД
+    - cache: размер кэша сущностей и счётчики попаданий/промахов
+    - sqlite: профиль и действующие PRAGMA (для SQLite)
     """
     try:
         # Пытаемся выполнить простой запрос к БД
@@ -70,11 +89,24 @@ def health_check(db: Session = Depends(get_db)):
     except Exception as e:
         db_status = f"disconnected: {str(e)}"
     
-    return {
+    health = {
         "status": "healthy",
         "database": db_status,
+        "cache": entity_cache.stats(),
         "service": "books-library-api"
     }
+    if engine.dialect.name == "sqlite" and db_status == "connected":
+        health["sqlite"] = get_sqlite_settings(db)
+    return health
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    """Метрики запросов в текстовом формате Prometheus"""
+    return PlainTextResponse(
+        metrics.registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 if __name__ == "__main__":
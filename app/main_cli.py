@@ -4,6 +4,11 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app.db.db import SessionLocal
 from app.db import crud
+from app import query_audit
+
+# Сколько первых книг показывать в каждой категории
+CATEGORY_BOOKS_LIMIT = 100
+
 def display_categories(db):
     """Отображение категорий"""
     print("\n" + "=" * 80)
@@ -16,11 +21,14 @@ def display_categories(db):
         print("Нет категорий в базе данных")
         return
     
+    books_by_category = crud.get_books_by_category(
+        db, [category.id for category in categories], limit=CATEGORY_BOOKS_LIMIT
+    )
     for i, category in enumerate(categories, 1):
         print(f"\n{i}. {category.title.upper()}")
         print("-" * 40)
 
-        books = crud.get_books(db, category_id=category.id)
+        books = books_by_category[category.id]
         
         if books:
             for j, book in enumerate(books, 1):
@@ -38,7 +46,7 @@ def display_books_with_categories(db):
     print("ВСЕ КНИГИ С КАТЕГОРИЯМИ")
     print("=" * 80)
     
-    books_with_categories = crud.get_books_with_category(db)
+    books_with_categories = crud.get_books_with_category(db, include_description=True)
     
     if not books_with_categories:
         print("Нет книг в базе данных")
@@ -57,26 +65,21 @@ def display_statistics(db):
     print("СТАТИСТИКА БИБЛИОТЕКИ")
     print("=" * 80)
     
-    categories = crud.get_categories(db)
-    books = crud.get_books(db)
+    stats = crud.get_library_stats(db)
+    total = stats["total"]
     
-    print(f"\nОбщее количество категорий: {len(categories)}")
-    print(f"Общее количество книг: {len(books)}")
+    print(f"\nОбщее количество категорий: {len(stats['categories'])}")
+    print(f"Общее количество книг: {total['count']}")
     
-    if categories and books:
-        total_price = sum(book.price for book in books)
-        avg_price = total_price / len(books) if books else 0
-        
-        print(f"Средняя цена книги: {avg_price:.2f} руб.")
-        print(f"Общая стоимость всех книг: {total_price:.2f} руб.")
+    if stats["categories"] and total["count"]:
+        print(f"Средняя цена книги: {total['price_avg']:.2f} руб.")
+        print(f"Общая стоимость всех книг: {total['price_sum']:.2f} руб.")
         
         print("\nКниг по категориям:")
         print("-" * 40)
         
-        for category in categories:
-            category_books = crud.get_books(db, category_id=category.id)
-            category_total = sum(book.price for book in category_books)
-            print(f"{category.title}: {len(category_books)} книг, общая стоимость: {category_total:.2f} руб.")
+        for category in stats["categories"]:
+            print(f"{category['title']}: {category['count']} книг, общая стоимость: {category['price_sum']:.2f} руб.")
 
 def search_books_interactive(db):
     print("\n" + "=" * 80)
@@ -96,8 +99,7 @@ def search_books_interactive(db):
         print("-" * 60)
         
         for i, book in enumerate(results, 1):
-            category = crud.get_category(db, book.category_id)
-            category_name = category.title if category else "Неизвестно"
+            category_name = book.category.title if book.category else "Неизвестно"
             
             print(f"\n{i:2}. {book.title}")
             print(f"    Категория: {category_name}")
@@ -107,6 +109,13 @@ def search_books_interactive(db):
     else:
         print(f"\nПо запросу '{search_term}' ничего не найдено")
 
+COMMANDS = {
+    "1": ("Категории с книгами", display_categories),
+    "2": ("Книги с категориями", display_books_with_categories),
+    "3": ("Статистика", display_statistics),
+    "4": ("Поиск книг", search_books_interactive),
+}
+
 def main():
     print("\n" + "=" * 80)
     print("БИБЛИОТЕКА КНИГ - ГЛАВНОЕ МЕНЮ")
@@ -125,14 +134,11 @@ def main():
             
             choice = input("\nВаш выбор (1-5): ").strip()
             
-            if choice == "1":
-                display_categories(db)
-            elif choice == "2":
-                display_books_with_categories(db)
-            elif choice == "3":
-                display_statistics(db)
-            elif choice == "4":
-                search_books_interactive(db)
+            if choice in COMMANDS:
+                name, command = COMMANDS[choice]
+                # QUERY_AUDIT=warn|strict — поиск N+1 в командах
+                with query_audit.audit(name):
+                    command(db)
             elif choice == "5":
                 print("\nВыход из программы...")
                 break
@@ -0,0 +1,128 @@
+"""
+Служебные команды обслуживания базы данных.
+
+Запуск: python -m app.maintenance <команда>
+    rebuild-stats — пересчитать сводную статистику и счётчики книг по категориям
+    check-stats — сверить статистику и счётчики книг с таблицей книг
+    check-query-plans — проверить, что запросы crud используют индексы
+    compact-changes — сжать журнал изменений (срок хранения — CHANGE_LOG_RETENTION_DAYS)
+    dedupe-book-urls — сбросить повторяющиеся ссылки книг (нужно для миграции 7)
+"""
+
+import argparse
+import sys
+import os
+from typing import List, Tuple
+
+import sqlalchemy as sa
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.db.db import SessionLocal, create_tables
+from app.db import crud, query_plans
+from app.db.cache import entity_cache
+
+
+def rebuild_stats(db):
+    """Пересчёт сводной статистики по категориям"""
+    crud.rebuild_category_stats(db)
+    total = crud.get_library_stats(db)["total"]
+    print(f"✓ Статистика пересчитана: {total['count']} книг, {total['price_sum']:.2f} руб.")
+
+
+def check_stats(db):
+    """Сверка статистики и счётчиков книг с таблицей книг; при расхождении — код выхода 1"""
+    mismatches = crud.check_category_stats(db)
+    for mismatch in mismatches:
+        print(
+            f"✗ Категория {mismatch.category_id}: book_count {mismatch.book_count} "
+            f"(книг {mismatch.actual_book_count}), статистика {mismatch.stats} "
+            f"(по книгам {mismatch.actual_stats})"
+        )
+    if mismatches:
+        print(f"✗ Расхождений: {len(mismatches)}, исправление: python -m app.maintenance rebuild-stats")
+        sys.exit(1)
+    print("✓ Статистика и счётчики книг совпадают с таблицей книг")
+
+
+def check_query_plans(db):
+    """Проверка планов запросов crud; при полном просмотре таблицы — код выхода 1"""
+    checked, problems = query_plans.check(db)
+    for problem in problems:
+        print(f"✗ {problem.case}: {problem.detail}")
+        print(f"    {' '.join(problem.statement.split())}")
+    if problems:
+        print(f"✗ Проблем в планах запросов: {len(problems)} (проверено запросов: {checked})")
+        sys.exit(1)
+    print(f"✓ Все запросы используют индексы (проверено запросов: {checked})")
+
+
+def compact_changes(db):
+    """Сжатие журнала изменений"""
+    result = crud.compact_changes(db)
+    print(
+        f"✓ Журнал изменений сжат: замещённых записей удалено {result.superseded}, "
+        f"устаревших {result.expired}; журнал начинается после seq {result.truncated_seq}"
+    )
+
+
+def clear_duplicate_book_urls(db) -> List[Tuple[int, str]]:
+    """
+    Сброс повторяющихся ссылок книг перед созданием индекса ux_books_url.
+
+    Ссылка остаётся у книги с меньшим ID, у остальных становится NULL (версия
+    книги растёт). Возвращает (ID книги, сброшенная ссылка) по возрастанию ID.
+    """
+    duplicates = """
+        SELECT id, url FROM (
+            SELECT id, url, row_number() OVER (PARTITION BY url ORDER BY id) AS number
+            FROM books WHERE url IS NOT NULL
+        )
+        WHERE number > 1
+    """
+    rows = [tuple(row) for row in db.execute(sa.text(duplicates + " ORDER BY id"))]
+    if rows:
+        db.execute(sa.text(
+            f"UPDATE books SET url = NULL, version = version + 1 WHERE id IN (SELECT id FROM ({duplicates}))"
+        ))
+        db.commit()
+        entity_cache.clear()
+    return rows
+
+
+def dedupe_book_urls(db):
+    """Сброс повторяющихся ссылок книг; ссылка остаётся у книги с меньшим ID"""
+    cleared = clear_duplicate_book_urls(db)
+    for book_id, url in cleared:
+        print(f"  книга {book_id}: ссылка {url} сброшена")
+    print(f"✓ Повторяющихся ссылок сброшено: {len(cleared)}")
+
+
+COMMANDS = {
+    "rebuild-stats": rebuild_stats,
+    "check-stats": check_stats,
+    "check-query-plans": check_query_plans,
+    "compact-changes": compact_changes,
+    "dedupe-book-urls": dedupe_book_urls,
+}
+
+# Команды, которые выполняются до миграций: они готовят данные к миграции,
+# которая иначе прерывается
+BEFORE_MIGRATIONS = {"dedupe-book-urls"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание базы данных библиотеки")
+    parser.add_argument("command", choices=sorted(COMMANDS), help="Команда")
+    args = parser.parse_args()
+
+    if args.command not in BEFORE_MIGRATIONS:
+        create_tables()
+    db = SessionLocal()
+    try:
+        COMMANDS[args.command](db)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
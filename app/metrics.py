@@ -0,0 +1,257 @@
+"""
+Метрики HTTP-запросов: задержка, SQL-запросы, сериализация.
+
+MetricsMiddleware для каждого запроса создаёт счётчики SQL (query_stats из
+app/db/db.py), замеряет время обработчика и сериализации ответа pydantic,
+добавляет заголовок Server-Timing и копит агрегаты по маршрутам. Агрегаты
+отдаются в текстовом формате Prometheus (GET /metrics).
+
+Метки маршрута — шаблон пути (/books/{book_id}), а не сам путь, поэтому
+число рядов метрик не растёт с числом записей. Накладные расходы — несколько
+вызовов perf_counter на запрос и SQL-запрос и одна блокировка на запрос.
+Отключение: METRICS_ENABLED=0.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import fastapi.routing
+
+from app.db.db import QueryStats, query_stats
+
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+
+# Границы корзин гистограмм: длительность запроса в секундах и число SQL-запросов
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+class RequestTimings(QueryStats):
+    """Счётчики одного запроса: SQL и фазы обработки"""
+    __slots__ = ("handler", "serialize")
+
+    def __init__(self):
+        super().__init__()
+        self.handler = 0.0
+        self.serialize = 0.0
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (накопительные счётчики Prometheus)"""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+    def cumulative(self) -> Iterable[Tuple[str, int]]:
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield _format_value(bound), total
+        yield "+Inf", self.count
+
+
+class RouteMetrics:
+    """Агрегаты маршрута (метод + шаблон пути)"""
+    __slots__ = ("statuses", "latency", "queries", "sql_duration", "sql_rows", "handler", "serialize")
+
+    def __init__(self):
+        self.statuses: Dict[int, int] = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.sql_duration = 0.0
+        self.sql_rows = 0
+        self.handler = 0.0
+        self.serialize = 0.0
+
+
+class Registry:
+    """Хранилище метрик процесса"""
+
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self._lock = threading.Lock()
+
+    def record(self, method: str, route: str, status: int, duration: float, timings: RequestTimings) -> None:
+        with self._lock:
+            metrics = self.routes.get((method, route))
+            if metrics is None:
+                metrics = self.routes[(method, route)] = RouteMetrics()
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            metrics.latency.observe(duration)
+            metrics.queries.observe(timings.count)
+            metrics.sql_duration += timings.duration
+            metrics.sql_rows += timings.rows
+            metrics.handler += timings.handler
+            metrics.serialize += timings.serialize
+
+    def clear(self) -> None:
+        with self._lock:
+            self.routes.clear()
+
+    def render(self) -> str:
+        """Метрики в текстовом формате Prometheus"""
+        with self._lock:
+            routes = sorted(self.routes.items())
+            lines: List[str] = []
+
+            _header(lines, "http_requests_total", "counter", "Число HTTP-запросов")
+            for (method, route), metrics in routes:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(f"http_requests_total{_labels(method, route, status=str(status))} {count}")
+
+            _histogram(lines, "http_request_duration_seconds", "Длительность HTTP-запроса",
+                       [(key, metrics.latency) for key, metrics in routes])
+            _histogram(lines, "http_request_sql_queries", "Число SQL-запросов на HTTP-запрос",
+                       [(key, metrics.queries) for key, metrics in routes])
+
+            for name, help_text, attribute in (
+                ("http_request_sql_duration_seconds_total", "Время выполнения SQL", "sql_duration"),
+                ("http_request_sql_rows_total", "Строки, выбранные или изменённые SQL", "sql_rows"),
+                ("http_request_handler_duration_seconds_total", "Время обработчика маршрута", "handler"),
+                ("http_request_serialize_duration_seconds_total", "Время сериализации ответа", "serialize"),
+            ):
+                _header(lines, name, "counter", help_text)
+                for (method, route), metrics in routes:
+                    lines.append(f"{name}{_labels(method, route)} {_format_value(getattr(metrics, attribute))}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(method: str, route: str, **extra: str) -> str:
+    labels = {"method": method, "route": route, **extra}
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _header(lines: List[str], name: str, metric_type: str, help_text: str) -> None:
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {metric_type}")
+
+
+def _histogram(lines: List[str], name: str, help_text: str, items) -> None:
+    _header(lines, name, "histogram", help_text)
+    for (method, route), histogram in items:
+        for bound, count in histogram.cumulative():
+            lines.append(f"{name}_bucket{_labels(method, route, le=bound)} {count}")
+        lines.append(f"{name}_sum{_labels(method, route)} {_format_value(histogram.sum)}")
+        lines.append(f"{name}_count{_labels(method, route)} {histogram.count}")
+
+
+def server_timing(timings: RequestTimings, total: float) -> str:
+    """Значение заголовка Server-Timing (длительности в миллисекундах)"""
+    return (
+        f'db;dur={timings.duration * 1000:.2f};desc="{timings.count} queries, {timings.rows} rows", '
+        f"handler;dur={timings.handler * 1000:.2f}, "
+        f"serialize;dur={timings.serialize * 1000:.2f}, "
+        f"total;dur={total * 1000:.2f}"
+    )
+
+
+class MetricsMiddleware:
+    """ASGI-middleware учёта метрик и заголовка Server-Timing"""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Optional[Dict[object, str]] = None
+
+    def _route(self, scope) -> str:
+        """Шаблон пути маршрута, обработавшего запрос"""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        if self._routes is None:
+            self._routes = {
+                route.endpoint: route.path
+                for route in scope["app"].routes if hasattr(route, "endpoint")
+            }
+        return self._routes.get(endpoint, UNMATCHED_ROUTE)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = query_stats.set(timings)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                value = server_timing(timings, time.perf_counter() - started)
+                headers.append((b"server-timing", value.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            query_stats.reset(token)
+            registry.record(
+                scope["method"], self._route(scope), status, time.perf_counter() - started, timings
+            )
+
+
+@contextmanager
+def phase(attribute: str):
+    """Учёт времени блока в фазе запроса (handler или serialize)"""
+    timings = query_stats.get()
+    if not isinstance(timings, RequestTimings):
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(timings, attribute, getattr(timings, attribute) + time.perf_counter() - started)
+
+
+def _timed(function, attribute: str):
+    async def wrapper(*args, **kwargs):
+        with phase(attribute):
+            return await function(*args, **kwargs)
+    return wrapper
+
+
+def instrument_fastapi() -> None:
+    """
+    Замер времени обработчика и сериализации ответа.
+
+    FastAPI вызывает run_endpoint_function и serialize_response как функции
+    модуля fastapi.routing, отдельных точек расширения для этих фаз нет.
+    """
+    if getattr(fastapi.routing, "_metrics_instrumented", False):
+        return
+    fastapi.routing.run_endpoint_function = _timed(fastapi.routing.run_endpoint_function, "handler")
+    fastapi.routing.serialize_response = _timed(fastapi.routing.serialize_response, "serialize")
+    fastapi.routing._metrics_instrumented = True
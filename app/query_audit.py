@@ -0,0 +1,227 @@
+"""
+Обнаружение N+1 и контроль числа SQL-запросов (QUERY_AUDIT).
+
+В режиме аудита запоминается каждый SQL-запрос HTTP-запроса или команды
+CLI вместе со стеком вызова. Запросы группируются по нормализованному SQL
+(литералы и списки IN заменены на ?), и форма, повторившаяся
+N_PLUS_ONE_THRESHOLD и более раз, считается N+1. В отчёт попадают места
+вызова в коде приложения.
+
+Режимы QUERY_AUDIT:
+    off    — аудит выключен (по умолчанию, стек не собирается)
+    warn   — N+1 и превышение бюджета пишутся в журнал
+    strict — то же приводит к исключению QueryAuditError: в тестах через
+             TestClient оно пробрасывается в тест, в uvicorn — ответ 500
+
+Бюджет маршрута — максимальное число SQL-запросов (QUERY_BUDGETS, для
+остальных маршрутов — DEFAULT_QUERY_BUDGET).
+"""
+
+import logging
+import os
+import re
+import traceback
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from app.db.db import QueryStats, query_stats
+
+
+QUERY_AUDIT = os.getenv("QUERY_AUDIT", "off")
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "3"))
+DEFAULT_QUERY_BUDGET = int(os.getenv("DEFAULT_QUERY_BUDGET", "10"))
+
+# Бюджеты маршрутов: (метод, шаблон пути) → максимум SQL-запросов
+QUERY_BUDGETS: Dict[Tuple[str, str], int] = {
+    ("GET", "/books/"): 4,
+    ("GET", "/books/{book_id}"): 2,
+    ("GET", "/books/search"): 4,
+    ("GET", "/books/search/faceted"): 6,
+    ("GET", "/books/batch"): 2,
+    ("POST", "/books/batch"): 2,
+    ("POST", "/books/"): 4,
+    ("PUT", "/books/{book_id}"): 2,
+    ("DELETE", "/books/{book_id}"): 2,
+    ("PUT", "/books/by-key"): 2,
+    ("GET", "/categories/"): 1,
+    ("GET", "/categories/{category_id}"): 1,
+    ("GET", "/categories/batch"): 1,
+    ("POST", "/categories/batch"): 1,
+    ("POST", "/categories/"): 3,
+    ("PUT", "/categories/{category_id}"): 4,
+    ("DELETE", "/categories/{category_id}"): 4,
+    ("GET", "/stats"): 1,
+    ("GET", "/changes"): 2,
+}
+
+# Сколько кадров стека приложения показывать для места вызова
+CALL_SITE_FRAMES = 3
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Кадры инфраструктуры, которые не являются местом вызова
+_SKIP_FILES = {
+    os.path.join(_APP_DIR, "db", "db.py"),
+    os.path.abspath(__file__),
+}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+
+logger = logging.getLogger("app.query_audit")
+
+
+class QueryAuditError(RuntimeError):
+    """N+1 или превышение бюджета SQL-запросов в строгом режиме"""
+
+
+class RepeatedQuery(NamedTuple):
+    sql: str
+    count: int
+    call_sites: List[str]
+
+
+class AuditReport(NamedTuple):
+    name: str
+    total: int
+    budget: Optional[int]
+    repeated: List[RepeatedQuery]
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.total > self.budget
+
+    @property
+    def ok(self) -> bool:
+        return not self.repeated and not self.over_budget
+
+    def format(self) -> str:
+        budget = f" (бюджет {self.budget})" if self.budget is not None else ""
+        lines = [f"{self.name}: {self.total} SQL-запросов{budget}"]
+        for query in self.repeated:
+            lines.append(f"  N+1: {query.count}× {query.sql}")
+            lines.extend(f"    {site}" for site in query.call_sites)
+        return "\n".join(lines)
+
+
+def normalize_sql(statement: str) -> str:
+    """Форма SQL-запроса без литералов, с одним ? вместо списков IN"""
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    statement = _IN_LIST.sub("IN (?)", statement)
+    return _SPACES.sub(" ", statement).strip()
+
+
+def _call_sites(stack: traceback.StackSummary) -> str:
+    """Ближайшие к SQL-запросу кадры кода приложения"""
+    frames = [
+        frame for frame in stack
+        if frame.filename.startswith(_APP_DIR) and frame.filename not in _SKIP_FILES
+    ]
+    root = os.path.dirname(_APP_DIR)
+    return " ← ".join(
+        f"{os.path.relpath(frame.filename, root)}:{frame.lineno} {frame.name}"
+        for frame in reversed(frames[-CALL_SITE_FRAMES:])
+    )
+
+
+def analyze(name: str, statements: List[tuple], budget: Optional[int] = None) -> AuditReport:
+    """Группировка запросов по форме и поиск повторов"""
+    groups: Dict[str, List[traceback.StackSummary]] = defaultdict(list)
+    for statement, stack in statements:
+        groups[normalize_sql(statement)].append(stack)
+
+    repeated = []
+    for sql, stacks in groups.items():
+        if len(stacks) < N_PLUS_ONE_THRESHOLD:
+            continue
+        sites = list(dict.fromkeys(_call_sites(stack) for stack in stacks))
+        repeated.append(RepeatedQuery(sql, len(stacks), sites))
+    repeated.sort(key=lambda query: -query.count)
+    return AuditReport(name, len(statements), budget, repeated)
+
+
+def report(audit_report: AuditReport, mode: str = QUERY_AUDIT) -> None:
+    """Журнал или исключение (strict) по результатам аудита"""
+    if audit_report.ok:
+        return
+    if mode == "strict":
+        raise QueryAuditError(audit_report.format())
+    logger.warning("%s", audit_report.format())
+
+
+@contextmanager
+def audit(name: str, budget: Optional[int] = None, mode: str = QUERY_AUDIT):
+    """
+    Аудит SQL-запросов блока кода (команды CLI, сценария теста).
+
+    При mode="off" ничего не делает. Иначе по выходе из блока сообщает о
+    N+1 и превышении бюджета.
+    """
+    if mode == "off":
+        yield None
+        return
+    stats = QueryStats()
+    stats.statements = []
+    token = query_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        query_stats.reset(token)
+    report(analyze(name, stats.statements, budget), mode)
+
+
+class QueryAuditMiddleware:
+    """
+    ASGI-middleware аудита SQL-запросов HTTP-запроса.
+
+    Проверка выполняется перед отправкой заголовков ответа, поэтому в
+    строгом режиме исключение заменяет ответ ошибкой 500.
+    """
+
+    def __init__(self, app, mode: str = QUERY_AUDIT):
+        self.app = app
+        self.mode = mode
+        self._routes: Optional[Dict[object, str]] = None
+
+    def _route(self, scope) -> Optional[str]:
+        endpoint = scope.get("endpoint")
+        if self._routes is None and endpoint is not None:
+            self._routes = {
+                route.endpoint: route.path
+                for route in scope["app"].routes if hasattr(route, "endpoint")
+            }
+        return self._routes.get(endpoint) if self._routes else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.mode == "off":
+            await self.app(scope, receive, send)
+            return
+
+        # Счётчики MetricsMiddleware, если он подключён, иначе свои
+        stats = query_stats.get()
+        token = None
+        if stats is None:
+            stats = QueryStats()
+            token = query_stats.set(stats)
+        stats.statements = []
+
+        async def send_after_audit(message):
+            if message["type"] == "http.response.start":
+                route = self._route(scope)
+                if route is not None:
+                    method = scope["method"]
+                    report(analyze(
+                        f"{method} {route}", stats.statements,
+                        QUERY_BUDGETS.get((method, route), DEFAULT_QUERY_BUDGET)
+                    ), self.mode)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_after_audit)
+        finally:
+            stats.statements = None
+            if token is not None:
+                query_stats.reset(token)
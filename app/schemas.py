@@ -1,5 +1,6 @@
-from pydantic import BaseModel, ConfigDict, Field
-from typing import Optional
+from functools import lru_cache
+from pydantic import BaseModel, ConfigDict, Field, create_model
+from typing import FrozenSet, List, Optional, Type
 from datetime import datetime
 
 
@@ -19,13 +20,31 @@ class CategoryUpdate(BaseModel):
     title: Optional[str] = Field(None, min_length=1, max_length=255, description="Название категории")
 
 
-class Category(CategoryBase):
-    """Схема ответа для категории"""
+class CategoryRef(CategoryBase):
+    """Категория в ответе книги (без счётчика книг)"""
     id: int
     created_at: datetime
     model_config = ConfigDict(from_attributes=True)
 
 
+class Category(CategoryRef):
+    """Схема ответа для категории"""
+    book_count: int = Field(0, description="Количество книг в категории")
+
+
+class CategoryDeletion(BaseModel):
+    """Ход фонового удаления категории (DELETE /categories/{id}?background=true)"""
+    id: str
+    category_id: int
+    status: str = Field(..., description="running, done или failed")
+    total: int = Field(..., description="Книг в категории на момент запуска")
+    deleted: int = Field(..., description="Удалено книг")
+    error: Optional[str] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    model_config = ConfigDict(from_attributes=True)
+
+
 # ========== Book Schemas ==========
 class BookBase(BaseModel):
     """Базовая схема для книги"""
@@ -41,6 +60,11 @@ class BookCreate(BookBase):
     pass
 
 
+class BookUpsert(BookBase):
+    """Схема книги для добавления или обновления по ссылке (PUT /books/by-key)"""
+    url: str = Field(..., min_length=1, max_length=500, description="Ссылка на книгу (естественный ключ)")
+
+
 class BookUpdate(BaseModel):
     """Схема для обновления книги"""
     title: Optional[str] = Field(None, min_length=1, max_length=255, description="Название книги")
@@ -54,10 +78,144 @@ class Book(BookBase):
     """Схема ответа для книги"""
     id: int
     created_at: datetime
-    category: Optional[Category] = None
+    category: Optional[CategoryRef] = None
     model_config = ConfigDict(from_attributes=True)
 
 
 class BookWithCategory(Book):
     """Схема книги с полной информацией о категории"""
-    pass
\ No newline at end of file
+    pass
+
+
+class BatchRequest(BaseModel):
+    """Схема пакетного запроса записей по списку ID"""
+    ids: List[int] = Field(..., min_length=1, description="Список ID в нужном порядке")
+
+
+class CategoryBatchItem(BaseModel):
+    """Элемент ответа пакетного запроса категорий"""
+    id: int
+    found: bool
+    category: Optional[Category] = None
+
+
+class BookBatchItem(BaseModel):
+    """Элемент ответа пакетного запроса книг"""
+    id: int
+    found: bool
+    book: Optional[Book] = None
+
+
+class BookSearchResult(Book):
+    """Схема результата полнотекстового поиска книги"""
+    score: float = Field(..., description="Релевантность (больше — лучше)")
+    title_highlight: str = Field(..., description="Название с подсвеченными совпадениями")
+    description_snippet: Optional[str] = Field(None, description="Фрагмент описания с совпадениями")
+
+
+class CategoryFacet(BaseModel):
+    """Число найденных книг категории"""
+    category_id: int
+    count: int
+
+
+class PriceFacet(BaseModel):
+    """Число найденных книг в ценовом интервале"""
+    price_from: Optional[float] = Field(None, description="Нижняя граница включительно (нет — без ограничения)")
+    price_to: Optional[float] = Field(None, description="Верхняя граница не включая (нет — без ограничения)")
+    count: int
+
+
+class SearchFacets(BaseModel):
+    """Фасеты результатов поиска"""
+    total: int = Field(..., description="Всего найдено книг")
+    exact: bool = Field(..., description="Точные ли числа (false — оценка по выборке найденных)")
+    categories: List[CategoryFacet] = Field(..., description="По категориям, от самых частых")
+    price: List[PriceFacet] = Field(..., description="По ценовым интервалам, по возрастанию цены")
+
+
+class FacetedSearchResult(BaseModel):
+    """Страница результатов поиска с фасетами"""
+    items: List[BookSearchResult]
+    facets: Optional[SearchFacets] = Field(None, description="Фасеты (только для первой страницы)")
+
+
+# Поля книги, которые можно выбрать параметром fields
+BOOK_FIELDS = tuple(Book.model_fields)
+
+
+@lru_cache(maxsize=None)
+def book_shape(fields: FrozenSet[str], base: Type[BaseModel] = Book) -> Type[BaseModel]:
+    """
+    Схема ответа base только с выбранными полями книги (sparse fieldset).
+    
+    Поля base, которых нет в Book (например, score у результата поиска),
+    сохраняются. Порядок полей — как в base.
+    """
+    selected = {
+        name: (field.annotation, field)
+        for name, field in base.model_fields.items()
+        if name in fields or name not in Book.model_fields
+    }
+    return create_model(
+        f"{base.__name__}[{','.join(name for name in selected)}]",
+        __config__=ConfigDict(from_attributes=True),
+        **selected
+    )
+
+
+# ========== Bulk Import Schemas ==========
+class BulkImportError(BaseModel):
+    """Ошибка в строке импорта"""
+    row: int = Field(..., description="Номер строки (записи) во входных данных")
+    error: str = Field(..., description="Описание ошибки")
+
+
+class BulkImportResult(BaseModel):
+    """Отчёт о пакетном импорте"""
+    inserted: int = Field(0, description="Количество добавленных книг")
+    updated: int = Field(0, description="Количество изменённых книг (upsert по ссылке)")
+    unchanged: int = Field(0, description="Количество книг без изменений (upsert по ссылке)")
+    failed: int = Field(0, description="Количество отклонённых строк")
+    errors: List[BulkImportError] = Field(default_factory=list, description="Ошибки по строкам (первые 1000)")
+
+
+# ========== Change Log Schemas ==========
+class Change(BaseModel):
+    """Запись журнала изменений"""
+    seq: int = Field(..., description="Номер изменения (растёт монотонно)")
+    entity: str = Field(..., description="book или category")
+    entity_id: int
+    op: str = Field(..., description="insert, update или delete")
+    version: Optional[int] = Field(None, description="Версия записи после изменения (для delete — последняя)")
+    changed_at: datetime
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ChangeFeed(BaseModel):
+    """Страница журнала изменений (GET /changes)"""
+    changes: List[Change]
+    next_since: int = Field(..., description="Значение since для следующего запроса")
+    has_more: bool = Field(..., description="Есть ли уже записанные изменения после этой страницы")
+
+
+# ========== Statistics Schemas ==========
+class PriceStats(BaseModel):
+    """Статистика цен набора книг"""
+    count: int = Field(..., description="Количество книг")
+    price_sum: float = Field(..., description="Суммарная стоимость")
+    price_avg: Optional[float] = Field(None, description="Средняя цена")
+    price_min: Optional[float] = Field(None, description="Минимальная цена")
+    price_max: Optional[float] = Field(None, description="Максимальная цена")
+
+
+class CategoryPriceStats(PriceStats):
+    """Статистика цен книг категории"""
+    category_id: int
+    title: str
+
+
+class LibraryStats(BaseModel):
+    """Статистика библиотеки"""
+    total: PriceStats
+    categories: List[CategoryPriceStats]
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+Сравнение синхронного и асинхронного режимов БД (DB_MODE) под нагрузкой.
+
+Для каждого режима запускается uvicorn, после чего клиенты с заданной
+конкурентностью запрашивают GET /books/{id} и GET /books/?limit=20.
+Выводятся запросы в секунду, p50 и p99.
+
+Запуск: python -m benchmarks.bench_async [--clients 50 200 1000] [--duration 10]
+Нужен httpx. База создаётся во временном файле.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def seed(db_path: str, books_count: int):
+    """Создание схемы через приложение и наполнение базы напрямую через sqlite3"""
+    subprocess.run(
+        [sys.executable, "-c", "from app.db.db import create_tables; create_tables()"],
+        cwd=ROOT, env={**os.environ, "DATABASE_URL": f"sqlite:///{db_path}"}, check=True
+    )
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO categories (id, title) VALUES (?, ?)",
+        ((i, f"Категория {i}") for i in range(1, 11))
+    )
+    conn.executemany(
+        "INSERT INTO books (title, description, price, category_id) VALUES (?, ?, ?, ?)",
+        ((f"Книга {i}", "Описание", float(i % 1000) + 0.5, i % 10 + 1) for i in range(books_count))
+    )
+    conn.commit()
+    conn.close()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(db_path: str, db_mode: str, port: int) -> subprocess.Popen:
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_path}", "DB_MODE": db_mode}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main_api:app",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/health", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Сервер не запустился")
+
+
+def percentile(values, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+async def run_load(base_url: str, clients: int, duration: float, books_count: int):
+    """Нагрузка с фиксированным числом клиентов; возвращает (rps, p50, p99, ошибки)"""
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        stop_at = time.perf_counter() + duration
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < stop_at:
+                if random.random() < 0.8:
+                    url = f"/books/{random.randint(1, books_count)}"
+                else:
+                    url = "/books/?limit=20"
+                start = time.perf_counter()
+                try:
+                    response = await client.get(url)
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(clients)))
+        elapsed = time.perf_counter() - started
+
+    if not latencies:
+        return 0.0, 0.0, 0.0, errors
+    return len(latencies) / elapsed, percentile(latencies, 0.5) * 1000, percentile(latencies, 0.99) * 1000, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--books", type=int, default=10_000)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_async.db")
+    seed(db_path, args.books)
+
+    print(f"{'режим':<8}{'клиентов':>10}{'запр/с':>10}{'p50, мс':>10}{'p99, мс':>10}{'ошибок':>8}")
+    print("-" * 56)
+    for db_mode in ("sync", "async"):
+        port = free_port()
+        server = start_server(db_path, db_mode, port)
+        try:
+            for clients in args.clients:
+                rps, p50, p99, errors = asyncio.run(
+                    run_load(f"http://127.0.0.1:{port}", clients, args.duration, args.books)
+                )
+                print(f"{db_mode:<8}{clients:>10}{rps:>10.0f}{p50:>10.1f}{p99:>10.1f}{errors:>8}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Бенчмарк удаления большой категории.
+
+Категория с --books книгами удаляется двумя способами:
+    каскад  — crud.delete_category: книги удаляет база (ON DELETE CASCADE)
+              одним запросом в одной транзакции
+    порции  — deletions.start: книги удаляются порциями по --chunk-size
+              в отдельных транзакциях, затем удаляется категория
+Во время удаления поток-писатель добавляет книги в другую категорию;
+выводятся общее время удаления и наибольшая задержка записи писателя
+(столько писатель ждал блокировку записи SQLite).
+
+Запуск: python -m benchmarks.bench_category_delete [--books 200000] [--chunk-size 2000]
+База создаётся во временном файле, рабочая books.db не затрагивается.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_category_delete.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["METRICS_ENABLED"] = "0"
+# Писатель ждёт блокировку дольше, чем длится удаление каскадом
+os.environ.setdefault("SQLITE_PRAGMAS", "busy_timeout=600000")
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import deletions  # noqa: E402
+from app.db import crud  # noqa: E402
+from app.db.db import SessionLocal, create_tables  # noqa: E402
+
+
+def seed(books_count: int) -> int:
+    """Большая категория с books_count книгами; возвращает её ID"""
+    db = SessionLocal()
+    try:
+        category_id = crud.create_category(db, f"Большая {time.time_ns()}").id
+        for start in range(0, books_count, 50_000):
+            crud.bulk_create_books(db, [
+                {
+                    "title": f"Книга {i}", "description": f"Описание книги номер {i}",
+                    "price": float(i % 1000) + 0.5, "category_id": category_id,
+                }
+                for i in range(start, min(start + 50_000, books_count))
+            ])
+        return category_id
+    finally:
+        db.close()
+
+
+def with_writer(delete, writer_category_id: int):
+    """Время delete() и наибольшая задержка записи параллельного писателя, в мс"""
+    latencies = []
+    done = threading.Event()
+
+    def write():
+        db = SessionLocal()
+        try:
+            while not done.is_set():
+                start = time.perf_counter()
+                crud.create_book(db, title="Параллельная запись", price=1.0, category_id=writer_category_id)
+                latencies.append(time.perf_counter() - start)
+                time.sleep(0.01)
+        finally:
+            db.close()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    start = time.perf_counter()
+    delete()
+    elapsed = time.perf_counter() - start
+    done.set()
+    writer.join()
+    return elapsed * 1000, max(latencies, default=0.0) * 1000
+
+
+def cascade(category_id: int) -> None:
+    db = SessionLocal()
+    try:
+        crud.delete_category(db, category_id)
+    finally:
+        db.close()
+
+
+def chunked(category_id: int, chunk_size: int) -> None:
+    job = deletions.start(category_id, 0, chunk_size=chunk_size)
+    while job.finished_at is None:
+        time.sleep(0.05)
+    if job.status != "done":
+        raise RuntimeError(job.error)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=200_000)
+    parser.add_argument("--chunk-size", type=int, default=deletions.DELETE_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        writer_category_id = crud.create_category(db, "Писатель").id
+    finally:
+        db.close()
+
+    print(f"{'способ':<10}{'удаление, мс':>14}{'макс. задержка записи, мс':>28}")
+    print("-" * 52)
+    for name, delete in (
+        ("каскад", cascade),
+        ("порции", lambda category_id: chunked(category_id, args.chunk_size)),
+    ):
+        category_id = seed(args.books)
+        elapsed, latency = with_writer(lambda: delete(category_id), writer_category_id)
+        print(f"{name:<10}{elapsed:>14.0f}{latency:>28.0f}")
+
+    db = SessionLocal()
+    try:
+        mismatches = crud.check_category_stats(db)
+    finally:
+        db.close()
+    print(f"\nРасхождений счётчиков после удаления: {len(mismatches)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Бенчмарк синхронизации клиентской копии каталога.
+
+В базе --books книг; клиент выгрузил каталог и запомнил позицию журнала
+изменений. Затем --changed процентов книг изменяются (часть — несколько
+раз) и клиент обновляет свою копию двумя способами:
+    полная  — повторная выгрузка всего каталога страницами по --page-size
+              (crud.get_books_page, курсор)
+    журнал  — записи журнала после сохранённой позиции (crud.get_changes)
+              и перечитывание изменённых книг (crud.get_books_by_ids)
+Для журнала выводится также результат после сжатия (crud.compact_changes):
+повторные изменения одной книги схлопываются в одну запись.
+
+Запуск: python -m benchmarks.bench_changes [--books 100000] [--changed 1]
+База создаётся во временном файле, рабочая books.db не затрагивается.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_changes.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["METRICS_ENABLED"] = "0"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.db import crud  # noqa: E402
+from app.db.db import QueryStats, SessionLocal, create_tables, query_stats  # noqa: E402
+
+
+def seed(books_count: int) -> None:
+    db = SessionLocal()
+    try:
+        category_id = crud.create_category(db, "Бенчмарк журнала").id
+        crud.bulk_create_books(db, [
+            {"title": f"Книга {i}", "price": float(i % 1000) + 0.5, "category_id": category_id}
+            for i in range(books_count)
+        ])
+    finally:
+        db.close()
+
+
+def position() -> int:
+    """Позиция журнала после выгрузки каталога (как GET /changes без since)"""
+    db = SessionLocal()
+    try:
+        return crud.get_changes(db)[1]
+    finally:
+        db.close()
+
+
+def change(books_count: int, changed: float) -> int:
+    """Изменение цен случайных книг; каждая пятая меняется дважды"""
+    book_ids = random.sample(range(1, books_count + 1), int(books_count * changed))
+    updates = book_ids + book_ids[::5]
+    db = SessionLocal()
+    try:
+        for book_id in updates:
+            crud.update_book_row(db, book_id, price=random.randint(1, 1000) + 0.99)
+    finally:
+        db.close()
+    return len(updates)
+
+
+def full(page_size: int) -> int:
+    db = SessionLocal()
+    books = 0
+    cursor = None
+    try:
+        while True:
+            page, cursor = crud.get_books_page(db, limit=page_size, cursor=cursor)
+            books += len(page)
+            db.expunge_all()
+            if cursor is None:
+                return books
+    finally:
+        db.close()
+
+
+def incremental(since: int, page_size: int) -> int:
+    db = SessionLocal()
+    books = 0
+    try:
+        while True:
+            rows, last_seq = crud.get_changes(db, since, limit=page_size)
+            book_ids = [row.entity_id for row in rows if row.entity == "book" and row.op != "delete"]
+            books += len(crud.get_books_by_ids(db, list(dict.fromkeys(book_ids))))
+            db.expunge_all()
+            if not rows or rows[-1].seq >= last_seq:
+                return books
+            since = rows[-1].seq
+    finally:
+        db.close()
+
+
+def compact() -> None:
+    db = SessionLocal()
+    try:
+        crud.compact_changes(db)
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--changed", type=float, default=1.0, help="Процент изменённых книг")
+    parser.add_argument("--page-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    create_tables()
+    seed(args.books)
+    since = position()
+    updates = change(args.books, args.changed / 100)
+    print(f"Книг: {args.books}, изменений: {updates}")
+
+    print(f"{'способ':<18}{'время, мс':>11}{'запросов':>10}{'книг':>9}")
+    print("-" * 48)
+    for name, sync in (
+        ("полная", lambda: full(args.page_size)),
+        ("журнал", lambda: incremental(since, args.page_size)),
+        ("журнал после сжатия", lambda: incremental(since, args.page_size)),
+    ):
+        if name == "журнал после сжатия":
+            compact()
+        stats = QueryStats()
+        token = query_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            books = sync()
+        finally:
+            query_stats.reset(token)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{name:<18}{elapsed:>11.0f}{stats.count:>10}{books:>9}")
+
+
+if __name__ == "__main__":
+    main()
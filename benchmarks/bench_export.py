@@ -0,0 +1,69 @@
+"""
+Бенчмарк потоковой выгрузки: пиковая память и скорость при разном размере каталога.
+
+Запуск: python -m benchmarks.bench_export [--sizes 1000 100000 1000000] [--ceiling-mb 20]
+База создаётся во временном файле, рабочая books.db не затрагивается.
+Завершается с кодом 1, если пик памяти превысил потолок.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_export.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.db.db import create_tables  # noqa: E402
+from app import exporter  # noqa: E402
+
+
+def seed(books_count: int):
+    """Доведение количества книг в базе до books_count"""
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("INSERT OR IGNORE INTO categories (id, title) VALUES (1, 'Бенчмарк')")
+    existing = conn.execute("SELECT count(*) FROM books").fetchone()[0]
+    conn.executemany(
+        "INSERT INTO books (title, description, price, url, category_id) VALUES (?, ?, ?, ?, 1)",
+        (
+            (f"Книга {i}", "Описание книги " * 20, float(i % 1000) + 0.5, f"https://example.com/{i}")
+            for i in range(existing, books_count)
+        )
+    )
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100_000, 1_000_000])
+    parser.add_argument("--ceiling-mb", type=float, default=20.0)
+    args = parser.parse_args()
+
+    create_tables()
+    print(f"{'книг':>10}{'формат':>8}{'время, с':>10}{'МБ выгрузки':>13}{'пик памяти, МБ':>16}")
+    print("-" * 57)
+    exceeded = False
+    for size in sorted(args.sizes):
+        seed(size)
+        for format in ("ndjson", "csv"):
+            tracemalloc.start()
+            start = time.perf_counter()
+            total = sum(len(chunk) for chunk in exporter.export_books(format=format))
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+            exceeded |= peak > args.ceiling_mb
+            print(f"{size:>10}{format:>8}{elapsed:>10.2f}{total / 2 ** 20:>13.1f}{peak:>16.2f}")
+
+    if exceeded:
+        print(f"\nПик памяти превысил {args.ceiling_mb} МБ")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
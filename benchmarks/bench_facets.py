@@ -0,0 +1,135 @@
+"""
+Бенчмарк фасетов поиска (GET /books/search/faceted).
+
+Для набора запросов разной частоты замеряется время:
+    по категориям — прежняя боковая панель: подсчёт найденных книг
+                    отдельным запросом для каждой категории (только на
+                    первых --legacy-queries запросах, он медленный)
+    точно         — crud.search_facets без выборки (FACET_SAMPLE_SIZE=∞)
+    фасеты        — crud.search_facets с FACET_SAMPLE_SIZE по умолчанию
+Для приблизительных фасетов выводится наибольшая относительная ошибка
+среди групп, в которые попало не меньше 1% найденных книг. В конце —
+p50/p95/максимум времени фасетов и сравнение с бюджетом --budget-ms.
+
+Запуск: python -m benchmarks.bench_facets [--books 1000000] [--budget-ms 500]
+База создаётся во временном файле, рабочая books.db не затрагивается.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_facets.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["METRICS_ENABLED"] = "0"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import sqlalchemy as sa  # noqa: E402
+
+from app import dataset  # noqa: E402
+from app.api import filters  # noqa: E402
+from app.db import crud, models  # noqa: E402
+from app.db.db import SessionLocal, create_tables  # noqa: E402
+
+# Запросы от самых частых слов до редких сочетаний
+QUERIES = (
+    "а", "книга", "тихий", "время", "тихий берег", "большой мост", "северный путь свет",
+    "золотой закон любовь", "ночной сон живой город", "красный век мир дом",
+    "чистый алгоритм след", "новый голос", "последний рассвет", "зеркало",
+)
+
+
+def seed(books_count: int) -> None:
+    create_tables()
+    db = SessionLocal()
+    try:
+        size = dataset.scale_size(books_count / dataset.BOOKS_PER_SCALE)
+        dataset.load(db, dataset.Dataset(size["categories"], books_count))
+    finally:
+        db.close()
+
+
+def timed(fn):
+    """Результат fn и время в миллисекундах"""
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def per_category_counts(db, search_term: str, category_ids) -> dict:
+    """Прежний способ: число найденных книг каждой категории отдельным запросом"""
+    matches = crud._search_matches(db, search_term)
+    return {
+        category_id: db.execute(
+            sa.select(sa.func.count()).select_from(models.Book)
+            .where(models.Book.category_id == category_id, models.Book.id.in_(matches))
+        ).scalar()
+        for category_id in category_ids
+    }
+
+
+def max_error(exact: dict, estimate: dict) -> float:
+    """Наибольшая относительная ошибка среди групп не меньше 1% найденных"""
+    errors = [0.0]
+    for key, facets in (("category_id", "categories"), ("price_from", "price")):
+        estimated = {facet[key]: facet["count"] for facet in estimate[facets]}
+        for facet in exact[facets]:
+            if facet["count"] >= exact["total"] / 100:
+                errors.append(abs(estimated.get(facet[key], 0) - facet["count"]) / facet["count"])
+    return max(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--budget-ms", type=float, default=500.0)
+    parser.add_argument("--legacy-queries", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"Наполнение базы: {args.books} книг...")
+    seed(args.books)
+
+    edges = filters.price_edges(None)
+    sample_size = crud.FACET_SAMPLE_SIZE
+    db = SessionLocal()
+    try:
+        category_ids = sorted(crud.get_category_ids(db))
+        print(f"\nКатегорий: {len(category_ids)}, FACET_SAMPLE_SIZE={sample_size}")
+        print(f"\n{'запрос':<26}{'найдено':>9}{'по катег., мс':>15}{'точно, мс':>11}{'фасеты, мс':>12}{'ошибка':>9}")
+        print("-" * 82)
+
+        facet_times = []
+        for number, query in enumerate(QUERIES):
+            legacy = "—"
+            if number < args.legacy_queries:
+                _, legacy_ms = timed(lambda: per_category_counts(db, query, category_ids))
+                legacy = f"{legacy_ms:.0f}"
+
+            crud.FACET_SAMPLE_SIZE = 1 << 62
+            exact, exact_ms = timed(lambda: crud.search_facets(db, query, edges))
+            crud.FACET_SAMPLE_SIZE = sample_size
+            facets, facets_ms = timed(lambda: crud.search_facets(db, query, edges))
+            facet_times.append(facets_ms)
+
+            error = "точно" if facets["exact"] else f"{max_error(exact, facets):.1%}"
+            print(
+                f"{query:<26}{exact['total']:>9}{legacy:>15}{exact_ms:>11.0f}"
+                f"{facets_ms:>12.0f}{error:>9}"
+            )
+    finally:
+        db.close()
+
+    facet_times.sort()
+    p95 = facet_times[min(len(facet_times) - 1, int(len(facet_times) * 0.95))]
+    print(
+        f"\nФасеты: p50 {statistics.median(facet_times):.0f} мс, p95 {p95:.0f} мс, "
+        f"максимум {facet_times[-1]:.0f} мс (бюджет {args.budget_ms:.0f} мс: "
+        f"{'уложились' if facet_times[-1] <= args.budget_ms else 'превышен'})"
+    )
+
+
+if __name__ == "__main__":
+    main()
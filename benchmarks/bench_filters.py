@@ -0,0 +1,123 @@
+"""
+Бенчмарк фильтров по диапазонам цены и даты в GET /books/ с сортировкой.
+
+Для узких и широких диапазонов, с категорией и без, при каждой сортировке
+замеряются первая страница и страница по курсору тремя способами:
+    авто     — выбор индекса по оценке селективности (как в приложении)
+    диапазон — всегда индекс колонки диапазона (RANGE_SELECTIVITY_THRESHOLD=∞)
+    порядок  — всегда индекс сортировки (RANGE_SELECTIVITY_THRESHOLD=0)
+Выводится время в мс и во сколько раз «авто» медленнее лучшего из двух.
+
+Запуск: python -m benchmarks.bench_filters [--books 5000000] [--limit 100]
+База создаётся во временном файле, рабочая books.db не затрагивается.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_filters.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["METRICS_ENABLED"] = "0"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app import dataset  # noqa: E402
+from app.db import crud  # noqa: E402
+from app.db.db import SessionLocal, create_tables  # noqa: E402
+
+RANGES = {
+    "цена узкая": {"min_price": 649.0, "max_price": 650.0},
+    "цена широкая": {"min_price": 100.0, "max_price": 2000.0},
+    "дата узкая": {"created_after": datetime(2022, 3, 1), "created_before": datetime(2022, 3, 8)},
+    "дата широкая": {"created_after": datetime(2021, 1, 1)},
+    "цена+дата": {"min_price": 500.0, "max_price": 800.0, "created_after": datetime(2023, 1, 1)},
+}
+
+STRATEGIES = (
+    ("авто", crud.RANGE_SELECTIVITY_THRESHOLD),
+    ("диапазон", 1 << 62),
+    ("порядок", 0),
+)
+
+
+def seed(books_count: int) -> None:
+    create_tables()
+    db = SessionLocal()
+    try:
+        size = dataset.scale_size(books_count / dataset.BOOKS_PER_SCALE)
+        dataset.load(db, dataset.Dataset(size["categories"], books_count))
+    finally:
+        db.close()
+
+
+def measure(fn, repeat: int) -> float:
+    """Лучшее время выполнения fn в миллисекундах"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def page_times(db, threshold: int, params: dict, repeat: int):
+    """Время первой страницы и страницы по курсору (None — второй страницы нет)"""
+    crud.RANGE_SELECTIVITY_THRESHOLD = threshold
+    _, cursor = crud.get_book_rows_page(db, **params)
+    first = measure(lambda: crud.get_book_rows_page(db, **params), repeat)
+    if cursor is None:
+        return first, None
+    return first, measure(lambda: crud.get_book_rows_page(db, cursor=cursor, **params), repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=5_000_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"Наполнение базы: {args.books} книг...")
+    seed(args.books)
+
+    names = [name for name, _ in STRATEGIES]
+    header = "".join(f"{name:>10}" for name in names)
+    print(f"\n{'диапазон':<14}{'категория':>10}{'сортировка':>16}{'страница':>10}{header}{'авто/лучш.':>12}")
+    print("-" * (62 + 10 * len(names)))
+
+    worst = (0.0, "")
+    db = SessionLocal()
+    try:
+        for range_name, ranges in RANGES.items():
+            for category_id in (None, 1):
+                for sort_by in crud.BOOK_SORT_COLUMNS:
+                    for sort_order in ("asc", "desc"):
+                        params = {
+                            "limit": args.limit, "category_id": category_id, "sort_by": sort_by,
+                            "sort_order": sort_order, "fields": ("title", "price", "created_at"),
+                            **ranges,
+                        }
+                        times = [page_times(db, threshold, params, args.repeat) for _, threshold in STRATEGIES]
+                        for page, label in ((0, "первая"), (1, "курсор")):
+                            if times[0][page] is None:
+                                continue
+                            row = [strategy[page] for strategy in times]
+                            ratio = row[0] / min(row[1:])
+                            case = f"{range_name}, {category_id or '—'}, {sort_by} {sort_order}, {label}"
+                            worst = max(worst, (ratio, case))
+                            cells = "".join(f"{ms:>10.2f}" for ms in row)
+                            print(
+                                f"{range_name:<14}{category_id or '—':>10}{sort_by + ' ' + sort_order:>16}"
+                                f"{label:>10}{cells}{ratio:>12.2f}"
+                            )
+    finally:
+        db.close()
+
+    print(f"\nХудший случай «авто» относительно лучшего плана: {worst[0]:.2f}× ({worst[1]})")
+
+
+if __name__ == "__main__":
+    main()
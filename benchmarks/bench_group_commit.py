@@ -0,0 +1,149 @@
+"""
+Бенчмарк групповой фиксации записи книг (WRITE_COALESCE).
+
+--clients потоков-клиентов одновременно создают (60%), изменяют (30%) и
+удаляют (10%) книги, как роутеры: без коалесцера — crud.create_book,
+update_book_row и delete_book_row в сессии клиента (каждая запись — своя
+транзакция), с ним — coalescer.submit_*. Для каждого профиля SQLite запуск
+без коалесцера и с ним идёт в отдельном процессе со своей базой. Выводятся записей в секунду,
+p50/p99 задержки и средний размер пачки.
+
+Запуск: python -m benchmarks.bench_group_commit [--clients 100] [--profiles wal default]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_worker(args):
+    """Нагрузка внутри процесса с уже выбранными профилем и режимом"""
+    sys.path.append(ROOT)
+    from sqlalchemy.exc import OperationalError
+    from app.db import coalescer, crud
+    from app.db.db import SessionLocal, create_tables
+
+    create_tables()
+    db = SessionLocal()
+    try:
+        category_id = crud.create_category(db, "Бенчмарк").id
+        crud.bulk_create_books(db, [
+            {"title": f"Книга {i}", "price": float(i % 1000) + 0.5, "category_id": category_id}
+            for i in range(args.books)
+        ])
+    finally:
+        db.close()
+
+    if coalescer.WRITE_COALESCE:
+        def create_book(db, **fields):
+            return coalescer.submit_create_book(**fields).result()
+
+        def update_book(db, book_id, **fields):
+            return coalescer.submit_update_book(book_id, **fields).result()
+
+        def delete_book(db, book_id):
+            return coalescer.submit_delete_book(book_id).result()
+    else:
+        create_book, update_book, delete_book = crud.create_book, crud.update_book_row, crud.delete_book_row
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(args.clients)
+
+    def client():
+        db = SessionLocal()
+        start_barrier.wait()
+        stop_at = time.perf_counter() + args.duration
+        own = []
+        try:
+            while time.perf_counter() < stop_at:
+                action = random.random()
+                started = time.perf_counter()
+                try:
+                    if action < 0.6 or not own:
+                        book = create_book(db, title="Новая книга", price=100.0, category_id=category_id)
+                        own.append(book.id)
+                    elif action < 0.9:
+                        update_book(db, random.choice(own), price=random.uniform(1, 1000))
+                    else:
+                        delete_book(db, own.pop())
+                except (OperationalError, crud.VersionConflictError):
+                    db.rollback()
+                    with lock:
+                        errors[0] += 1
+                    continue
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=client) for _ in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    batch = 0.0
+    if coalescer.WRITE_COALESCE:
+        instance = coalescer.get_coalescer()
+        batch = instance.operations / max(instance.batches, 1)
+    print(json.dumps({
+        "writes": len(latencies) / args.duration,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000,
+        "errors": errors[0],
+        "batch": batch,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--profiles", nargs="+", default=["wal", "default"])
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--books", type=int, default=20_000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    print(f"{'профиль':<10}{'режим':<14}{'записей/с':>11}{'p50, мс':>10}{'p99, мс':>10}{'ошибок':>8}{'пачка':>8}")
+    print("-" * 71)
+    for profile in args.profiles:
+        for mode, coalesce in (("по одной", "0"), ("коалесцер", "1")):
+            db_path = os.path.join(tempfile.mkdtemp(), "bench_group_commit.db")
+            env = {
+                **os.environ,
+                "DATABASE_URL": f"sqlite:///{db_path}",
+                "SQLITE_PROFILE": profile,
+                "WRITE_COALESCE": coalesce,
+                "METRICS_ENABLED": "0",
+            }
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_group_commit", "--worker",
+                 "--clients", str(args.clients), "--books", str(args.books),
+                 "--duration", str(args.duration)],
+                cwd=ROOT, env=env, check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(
+                f"{profile:<10}{mode:<14}{result['writes']:>11.0f}{result['p50']:>10.1f}"
+                f"{result['p99']:>10.1f}{result['errors']:>8}{result['batch']:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
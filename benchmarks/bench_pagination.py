@@ -0,0 +1,86 @@
+"""
+Бенчмарк пагинации: OFFSET против курсора на первой и 10 000-й странице.
+
+Запуск: python -m benchmarks.bench_pagination [--books 1000000] [--limit 100]
+База создаётся во временном файле, рабочая books.db не затрагивается.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_pagination.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.db.db import SessionLocal, create_tables  # noqa: E402
+from app.db import crud, pagination  # noqa: E402
+
+
+def seed(books_count: int):
+    """Быстрое наполнение базы напрямую через sqlite3"""
+    create_tables()
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("INSERT INTO categories (id, title) VALUES (1, 'Бенчмарк')")
+    conn.executemany(
+        "INSERT INTO books (title, description, price, category_id) VALUES (?, ?, ?, 1)",
+        ((f"Книга {i}", "Описание", float(i % 1000) + 0.5) for i in range(books_count))
+    )
+    conn.commit()
+    conn.close()
+
+
+def measure(fn, repeat: int = 5) -> float:
+    """Лучшее время выполнения fn в миллисекундах"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def cursor_for_page(db, page: int, limit: int, sort_by: str):
+    """Курсор, указывающий на начало страницы page (1 — первая)"""
+    if page == 1:
+        return None
+    anchor = crud.get_books(db, skip=(page - 1) * limit - 1, limit=1, sort_by=sort_by)[0]
+    return pagination.encode_cursor(sort_by, "asc", getattr(anchor, sort_by), anchor.id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    pages = [1, 10_000]
+    if args.books < pages[-1] * args.limit:
+        parser.error(f"для страницы {pages[-1]} нужно не меньше {pages[-1] * args.limit} книг")
+
+    print(f"Наполнение базы: {args.books} книг...")
+    seed(args.books)
+
+    db = SessionLocal()
+    try:
+        print(f"\n{'сортировка':<12}{'страница':>10}{'OFFSET, мс':>14}{'курсор, мс':>14}")
+        print("-" * 50)
+        for sort_by in ("id", "price"):
+            for page in pages:
+                cursor = cursor_for_page(db, page, args.limit, sort_by)
+                offset_ms = measure(lambda: crud.get_books(
+                    db, skip=(page - 1) * args.limit, limit=args.limit, sort_by=sort_by
+                ))
+                cursor_ms = measure(lambda: crud.get_books(
+                    db, limit=args.limit, sort_by=sort_by, cursor=cursor
+                ))
+                print(f"{sort_by:<12}{page:>10}{offset_ms:>14.2f}{cursor_ms:>14.2f}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Бенчмарк сериализации списка книг: прежний путь (ORM + response_model)
+против быстрого (строки Core + TypeAdapter + orjson) в GET /books/.
+
+Прежний обработчик подключается к приложению отдельным маршрутом. Сначала
+проверяется, что оба пути отдают побайтно одинаковые тела и одинаковые
+заголовки ETag и X-Next-Cursor на всех страницах каталога (по курсору, по
+категориям, через skip, с ценами в экспоненциальной записи). Затем для
+обоих путей замеряется пропускная способность: запросы и книги в секунду.
+
+Запуск: python -m benchmarks.bench_serialization [--books 20000] [--limit 1000] [--duration 5]
+База создаётся во временном файле, рабочая books.db не затрагивается.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_serialization.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["METRICS_ENABLED"] = "0"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastapi import Depends, Query, Response  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app import dataset, schemas  # noqa: E402
+from app.api import etags  # noqa: E402
+from app.db import crud  # noqa: E402
+from app.db.db import SessionLocal, get_db  # noqa: E402
+from app.main_api import app  # noqa: E402
+
+LEGACY_PATH = "/bench/legacy-books/"
+FAST_PATH = "/books/"
+
+# Полный ответ, как у прежнего обработчика (описание в списке по умолчанию не отдаётся)
+FULL = {"include": "description"}
+
+# Цены, которые orjson и json.dumps записывают по-разному
+EXPONENT_PRICES = (1e16, 5e-05)
+
+
+@app.get(LEGACY_PATH, response_model=List[schemas.Book], include_in_schema=False)
+def legacy_read_books(
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    category_id: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Прежняя реализация GET /books/: объекты ORM и сериализация FastAPI"""
+    books, next_cursor = crud.get_books_page(
+        db=db, skip=skip, limit=limit, category_id=category_id, cursor=cursor,
+        include_description=True
+    )
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else {}
+    etag = etags.collection_etag(map(etags.book_etag, books), next_cursor)
+    response.headers.update({**headers, "ETag": etag})
+    return books
+
+
+def seed(books_count: int) -> None:
+    db = SessionLocal()
+    try:
+        size = dataset.scale_size(books_count / dataset.BOOKS_PER_SCALE)
+        dataset.load(db, dataset.Dataset(size["categories"], books_count))
+    finally:
+        db.close()
+
+
+def add_exponent_prices() -> None:
+    conn = sqlite3.connect(DB_PATH)
+    conn.executemany("UPDATE books SET price = ? WHERE id = ?", [
+        (price, book_id) for book_id, price in enumerate(EXPONENT_PRICES, start=1)
+    ])
+    conn.commit()
+    conn.close()
+
+
+def _get(client: TestClient, path: str, params: dict):
+    response = client.get(path, params=params)
+    assert response.status_code == 200, (path, params, response.status_code, response.text[:200])
+    return response
+
+
+def compare_pages(client: TestClient, params: dict) -> int:
+    """Обход всех страниц по курсору; число сравнённых страниц"""
+    pages = 0
+    while True:
+        legacy = _get(client, LEGACY_PATH, params)
+        fast = _get(client, FAST_PATH, params)
+        if legacy.content != fast.content:
+            raise AssertionError(f"тела ответов различаются: {params}")
+        for header in ("ETag", "X-Next-Cursor"):
+            if legacy.headers.get(header) != fast.headers.get(header):
+                raise AssertionError(f"заголовок {header} различается: {params}")
+        pages += 1
+        next_cursor = fast.headers.get("X-Next-Cursor")
+        if next_cursor is None:
+            return pages
+        params = {**params, "cursor": next_cursor}
+
+
+def check_identical(client: TestClient, limit: int, categories: int) -> int:
+    pages = compare_pages(client, {"limit": limit, **FULL})
+    for category_id in range(1, categories + 1):
+        pages += compare_pages(client, {"limit": limit, "category_id": category_id, **FULL})
+    for skip in (1, 999, 10_000):
+        pages += compare_pages(client, {"limit": 37, "skip": skip, **FULL})
+    return pages
+
+
+def throughput(client: TestClient, path: str, limit: int, duration: float) -> float:
+    """Запросов в секунду (последовательно, первая страница)"""
+    params = {"limit": limit, **FULL}
+    _get(client, path, params)
+    requests = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        _get(client, path, params)
+        requests += 1
+    return requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=20_000)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"Наполнение базы: {args.books} книг...")
+    seed(args.books)
+    categories = dataset.scale_size(args.books / dataset.BOOKS_PER_SCALE)["categories"]
+
+    client = TestClient(app)
+    pages = check_identical(client, args.limit, categories)
+    add_exponent_prices()
+    pages += compare_pages(client, {"limit": 10, **FULL})
+    print(f"Ответы совпадают побайтно: {pages} страниц")
+
+    print(f"\n{'путь':<10}{'запросов/с':>12}{'книг/с':>12}{'мс/запрос':>12}")
+    print("-" * 46)
+    results = {}
+    for name, path in (("прежний", LEGACY_PATH), ("быстрый", FAST_PATH)):
+        rps = results[name] = throughput(client, path, args.limit, args.duration)
+        print(f"{name:<10}{rps:>12.1f}{rps * args.limit:>12.0f}{1000 / rps:>12.2f}")
+    print(f"\nУскорение: {results['быстрый'] / results['прежний']:.2f}×")
+
+
+if __name__ == "__main__":
+    main()
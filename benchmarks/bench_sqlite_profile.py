@@ -0,0 +1,117 @@
+"""
+Пропускная способность смешанной нагрузки чтение/запись для профилей SQLite.
+
+Для каждого профиля (SQLITE_PROFILE) запускается отдельный процесс со своей
+базой: потоки-читатели выполняют crud.get_book и crud.get_books, потоки-
+писатели — crud.update_book и crud.create_book. Кэш сущностей отключён,
+чтобы чтения доходили до базы.
+
+Запуск: python -m benchmarks.bench_sqlite_profile [--profiles default wal] [--readers 8] [--writers 2]
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_worker(args):
+    """Нагрузка внутри процесса с уже выбранным профилем"""
+    sys.path.append(ROOT)
+    from sqlalchemy.exc import OperationalError
+    from app.db.db import SessionLocal, create_tables
+    from app.db import crud
+
+    create_tables()
+    conn = sqlite3.connect(os.environ["DATABASE_URL"][len("sqlite:///"):])
+    conn.execute("INSERT INTO categories (id, title) VALUES (1, 'Бенчмарк')")
+    conn.executemany(
+        "INSERT INTO books (title, description, price, category_id) VALUES (?, ?, ?, 1)",
+        ((f"Книга {i}", "Описание " * 20, float(i % 1000) + 0.5) for i in range(args.books))
+    )
+    conn.commit()
+    conn.close()
+
+    counters = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + args.duration
+
+    def loop(operation, counter):
+        while time.perf_counter() < stop_at:
+            db = SessionLocal()
+            try:
+                operation(db)
+                result = counter
+            except OperationalError:
+                db.rollback()
+                result = "errors"
+            finally:
+                db.close()
+            with lock:
+                counters[result] += 1
+
+    def read(db):
+        if random.random() < 0.7:
+            crud.get_book(db, random.randint(1, args.books))
+        else:
+            crud.get_books(db, limit=20, skip=random.randint(0, args.books - 20))
+
+    def write(db):
+        if random.random() < 0.7:
+            crud.update_book(db, random.randint(1, args.books), price=random.uniform(1, 1000))
+        else:
+            crud.create_book(db, title="Новая книга", price=100.0, category_id=1)
+
+    threads = [threading.Thread(target=loop, args=(read, "reads")) for _ in range(args.readers)]
+    threads += [threading.Thread(target=loop, args=(write, "writes")) for _ in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(json.dumps({key: value / args.duration for key, value in counters.items()}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--profiles", nargs="+", default=["default", "wal"])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--books", type=int, default=20_000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    print(f"{'профиль':<10}{'чтений/с':>12}{'записей/с':>12}{'ошибок/с':>12}")
+    print("-" * 46)
+    for profile in args.profiles:
+        db_path = os.path.join(tempfile.mkdtemp(), "bench_profile.db")
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{db_path}",
+            "SQLITE_PROFILE": profile,
+            "ENTITY_CACHE_SIZE": "0",
+        }
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_sqlite_profile", "--worker",
+             "--readers", str(args.readers), "--writers", str(args.writers),
+             "--books", str(args.books), "--duration", str(args.duration)],
+            cwd=ROOT, env=env, check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{profile:<10}{result['reads']:>12.0f}{result['writes']:>12.0f}{result['errors']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Бенчмарк синхронизации каталога поставщика по ссылке (url).
+
+В базе --books книг со ссылками. Выгрузка поставщика — те же ссылки, из
+них --changed процентов с новой ценой, плюс --new процентов новых книг.
+Выгрузка применяется двумя способами:
+    по одной — для каждой книги поиск по ссылке, затем создание или
+               обновление (так синхронизация работала через API:
+               поиск, POST или PUT — по транзакции на книгу)
+    upsert   — crud.upsert_books пачками по --batch-size: один
+               INSERT ... ON CONFLICT DO UPDATE на пачку, неизменившиеся
+               книги не перезаписываются
+Выводятся время, число SQL-запросов и счётчики добавленных, изменённых и
+неизменившихся книг.
+
+Запуск: python -m benchmarks.bench_upsert [--books 20000] [--changed 10] [--new 5]
+База создаётся во временном файле, рабочая books.db не затрагивается.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench_upsert.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["METRICS_ENABLED"] = "0"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.db import crud  # noqa: E402
+from app.db.db import QueryStats, SessionLocal, create_tables, query_stats  # noqa: E402
+
+
+def seed(books_count: int, prefix: str) -> list:
+    """Книги со ссылками prefix/N; возвращает их в виде выгрузки поставщика"""
+    db = SessionLocal()
+    try:
+        category_id = crud.create_category(db, f"Поставщик {prefix}").id
+        books = [
+            {
+                "title": f"Книга {i}", "description": None, "price": float(i % 1000) + 0.5,
+                "url": f"https://supplier.example/{prefix}/{i}", "category_id": category_id,
+            }
+            for i in range(books_count)
+        ]
+        crud.bulk_create_books(db, books)
+        return books
+    finally:
+        db.close()
+
+
+def feed(books: list, changed: float, new: float) -> list:
+    """Выгрузка поставщика: часть цен изменена, в конце — новые книги"""
+    rows = [
+        {**book, "price": book["price"] + 1} if random.random() < changed else dict(book)
+        for book in books
+    ]
+    prefix = books[0]["url"].rsplit("/", 1)[0]
+    rows += [
+        {**books[0], "title": f"Новая книга {i}", "url": f"{prefix}/new-{i}"}
+        for i in range(int(len(books) * new))
+    ]
+    random.shuffle(rows)
+    return rows
+
+
+def one_by_one(rows: list) -> tuple:
+    db = SessionLocal()
+    inserted = updated = unchanged = 0
+    try:
+        for row in rows:
+            existing = crud.get_book_row_by_url(db, row["url"])
+            if existing is None:
+                crud.create_book(db, **row)
+                inserted += 1
+            elif any(getattr(existing, name) != value for name, value in row.items()):
+                crud.update_book_row(db, existing.id, **row)
+                updated += 1
+            else:
+                unchanged += 1
+    finally:
+        db.close()
+    return inserted, updated, unchanged
+
+
+def upsert(rows: list, batch_size: int) -> tuple:
+    db = SessionLocal()
+    inserted = updated = unchanged = 0
+    try:
+        for start in range(0, len(rows), batch_size):
+            result = crud.upsert_books(db, rows[start:start + batch_size])
+            inserted += result.inserted
+            updated += result.updated
+            unchanged += result.unchanged
+    finally:
+        db.close()
+    return inserted, updated, unchanged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--books", type=int, default=20_000)
+    parser.add_argument("--changed", type=float, default=10.0, help="Процент книг с новой ценой")
+    parser.add_argument("--new", type=float, default=5.0, help="Процент новых книг")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    create_tables()
+    print(f"{'способ':<10}{'время, мс':>11}{'запросов':>10}{'добавлено':>11}{'изменено':>10}{'без изменений':>15}")
+    print("-" * 67)
+    for name, apply in (
+        ("по одной", one_by_one),
+        ("upsert", lambda rows: upsert(rows, args.batch_size)),
+    ):
+        rows = feed(seed(args.books, name.replace(" ", "-")), args.changed / 100, args.new / 100)
+        stats = QueryStats()
+        token = query_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            inserted, updated, unchanged = apply(rows)
+        finally:
+            query_stats.reset(token)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(
+            f"{name:<10}{elapsed:>11.0f}{stats.count:>10}"
+            f"{inserted:>11}{updated:>10}{unchanged:>15}"
+        )
+
+
+if __name__ == "__main__":
+    main()
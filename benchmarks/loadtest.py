@@ -0,0 +1,448 @@
+"""
+Нагрузочное тестирование API: смесь операций с книгами при заданной конкурентности.
+
+Приложение app.main_api:app запускается либо в том же процессе (ASGI, без
+сети), либо отдельным процессом uvicorn. Для каждого уровня конкурентности
+выводятся запросы в секунду, p50/p95/p99 и среднее число SQL-запросов на
+HTTP-запрос по каждой операции. Результаты сохраняются в JSON, два файла
+результатов сравниваются командой compare.
+
+Запуск:
+    python -m benchmarks.loadtest run [--transport asgi|uvicorn] [--db-mode sync|async]
+        [--mix read|write|mixed|"get=70,update=30"] [--concurrency 1 10 50]
+        [--duration 10] [--books 10000] [--output results.json]
+    python -m benchmarks.loadtest compare old.json new.json [--threshold 10]
+
+Нужен httpx. База создаётся во временном файле, рабочая books.db не затрагивается.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+OPERATIONS = ("list", "get", "search", "create", "update", "delete")
+
+# Доли операций в готовых смесях
+MIXES = {
+    "read": {"list": 30, "get": 60, "search": 10},
+    "write": {"create": 40, "update": 40, "delete": 20},
+    "mixed": {"list": 20, "get": 40, "search": 10, "create": 10, "update": 15, "delete": 5},
+}
+
+CATEGORIES_COUNT = 10
+SEARCH_WORDS = ("война", "мир", "история", "путешествие", "книга", "жизнь")
+
+# Заголовок, в котором обёртка приложения возвращает число SQL-запросов
+SQL_HEADER = "X-Bench-SQL-Statements"
+
+# Рост среднего числа SQL-запросов, который считается регрессией (меньший —
+# разброс из-за кэша и случайного выбора операций)
+SQL_TOLERANCE = 0.5
+
+_statements: contextvars.ContextVar = contextvars.ContextVar("bench_sql_statements", default=None)
+
+
+# ========== Приложение под нагрузкой ==========
+def create_app():
+    """
+    Приложение app.main_api:app с подсчётом SQL-запросов на каждый HTTP-запрос.
+
+    Счётчик хранится в contextvar запроса, число передаётся в заголовке
+    SQL_HEADER. Используется и в процессе (ASGI), и в uvicorn (--factory).
+    """
+    sys.path.append(ROOT)
+    from sqlalchemy import event
+    from app.main_api import app
+    from app.db import db as database
+
+    def count_statement(*args):
+        counter = _statements.get()
+        if counter is not None:
+            counter[0] += 1
+
+    engines = [database.engine]
+    if database.async_engine is not None:
+        engines.append(database.async_engine.sync_engine)
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", count_statement)
+
+    async def counting_app(scope, receive, send):
+        if scope["type"] != "http":
+            await app(scope, receive, send)
+            return
+        counter = [0]
+        _statements.set(counter)
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((SQL_HEADER.lower().encode(), str(counter[0]).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        await app(scope, receive, counting_send)
+
+    return counting_app
+
+
+def seed(db_path: str, books_count: int):
+    """Создание схемы через приложение и наполнение базы напрямую через sqlite3"""
+    subprocess.run(
+        [sys.executable, "-c", "from app.db.db import create_tables; create_tables()"],
+        cwd=ROOT, env={**os.environ, "DATABASE_URL": f"sqlite:///{db_path}"}, check=True
+    )
+    rng = random.Random(0)
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        "INSERT INTO categories (id, title) VALUES (?, ?)",
+        ((i, f"Категория {i}") for i in range(1, CATEGORIES_COUNT + 1))
+    )
+    conn.executemany(
+        "INSERT INTO books (title, description, price, category_id) VALUES (?, ?, ?, ?)",
+        (
+            (
+                f"Книга {i} {rng.choice(SEARCH_WORDS)}",
+                " ".join(rng.choice(SEARCH_WORDS) for _ in range(20)),
+                round(rng.uniform(100, 5000), 2),
+                rng.randint(1, CATEGORIES_COUNT)
+            )
+            for i in range(books_count)
+        )
+    )
+    conn.commit()
+    conn.close()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(env: dict, port: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.loadtest:create_app", "--factory",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/health", timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("Сервер не запустился")
+
+
+# ========== Нагрузка ==========
+def parse_mix(value: str) -> dict:
+    """Смесь по имени или в виде 'get=70,update=30'"""
+    if value in MIXES:
+        return MIXES[value]
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Неизвестная операция: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+class Workload:
+    """Генерация запросов операций и учёт созданных книг для удаления"""
+
+    def __init__(self, books_count: int, seed_value: int = 0):
+        self.books_count = books_count
+        self.created = []
+        self.rng = random.Random(seed_value)
+
+    def request(self, operation: str):
+        """(метод, URL, JSON-тело, допустимые коды ответа)"""
+        rng = self.rng
+        if operation == "list":
+            category = f"&category_id={rng.randint(1, CATEGORIES_COUNT)}" if rng.random() < 0.5 else ""
+            return "GET", f"/books/?limit=20{category}", None, (200,)
+        if operation == "get":
+            return "GET", f"/books/{rng.randint(1, self.books_count)}", None, (200, 404)
+        if operation == "search":
+            return "GET", f"/books/search?q={rng.choice(SEARCH_WORDS)}&limit=20", None, (200,)
+        if operation == "create":
+            body = {
+                "title": f"Нагрузка {rng.random():.6f}",
+                "description": " ".join(rng.choice(SEARCH_WORDS) for _ in range(10)),
+                "price": round(rng.uniform(100, 5000), 2),
+                "category_id": rng.randint(1, CATEGORIES_COUNT),
+            }
+            return "POST", "/books/", body, (201,)
+        if operation == "update":
+            body = {"price": round(rng.uniform(100, 5000), 2)}
+            # 409 — параллельное изменение той же книги
+            return "PUT", f"/books/{rng.randint(1, self.books_count)}", body, (200, 404, 409)
+        if operation == "delete":
+            if self.created:
+                book_id = self.created.pop(rng.randrange(len(self.created)))
+            else:
+                book_id = rng.randint(self.books_count + 1, self.books_count * 2)
+            return "DELETE", f"/books/{book_id}", None, (204, 404)
+        raise ValueError(operation)
+
+
+async def run_level(client: httpx.AsyncClient, workload: Workload, mix: dict,
+                    concurrency: int, duration: float) -> dict:
+    """Нагрузка с фиксированным числом клиентов; возвращает метрики по операциям"""
+    names, weights = list(mix), list(mix.values())
+    samples = {name: {"latencies": [], "sql": [], "errors": 0} for name in names}
+    stop_at = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < stop_at:
+            operation = workload.rng.choices(names, weights)[0]
+            method, url, body, expected = workload.request(operation)
+            sample = samples[operation]
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+            except httpx.HTTPError:
+                sample["errors"] += 1
+                continue
+            elapsed = time.perf_counter() - start
+            if response.status_code not in expected:
+                sample["errors"] += 1
+                continue
+            if operation == "create":
+                workload.created.append(response.json()["id"])
+            sample["latencies"].append(elapsed)
+            if SQL_HEADER in response.headers:
+                sample["sql"].append(int(response.headers[SQL_HEADER]))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    operations = {name: _summary(sample, elapsed) for name, sample in samples.items()}
+    total = _summary({
+        "latencies": [value for sample in samples.values() for value in sample["latencies"]],
+        "sql": [value for sample in samples.values() for value in sample["sql"]],
+        "errors": sum(sample["errors"] for sample in samples.values()),
+    }, elapsed)
+    return {"concurrency": concurrency, "total": total, "operations": operations}
+
+
+def _summary(sample: dict, elapsed: float) -> dict:
+    latencies, sql = sample["latencies"], sample["sql"]
+    if not latencies:
+        return {"requests": 0, "errors": sample["errors"], "rps": 0.0,
+                "p50_ms": None, "p95_ms": None, "p99_ms": None, "sql_per_request": None}
+    return {
+        "requests": len(latencies),
+        "errors": sample["errors"],
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "sql_per_request": round(sum(sql) / len(sql), 2) if sql else None,
+    }
+
+
+async def run_levels(client_factory, args, mix: dict) -> list:
+    workload = Workload(args.books, args.seed)
+    results = []
+    for concurrency in args.concurrency:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with client_factory(limits) as client:
+            if args.warmup:
+                await run_level(client, workload, mix, concurrency, args.warmup)
+            result = await run_level(client, workload, mix, concurrency, args.duration)
+        print_level(result)
+        results.append(result)
+    return results
+
+
+def print_level(result: dict):
+    print(f"\nконкурентность {result['concurrency']}")
+    print(f"{'операция':<10}{'запросов':>10}{'ошибок':>8}{'запр/с':>10}"
+          f"{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'SQL/запр':>10}")
+    rows = [*result["operations"].items(), ("всего", result["total"])]
+    for name, row in rows:
+        def fmt(value, spec):
+            return format(value, spec) if value is not None else "—"
+        print(f"{name:<10}{row['requests']:>10}{row['errors']:>8}{row['rps']:>10.0f}"
+              f"{fmt(row['p50_ms'], '>10.1f'):>10}{fmt(row['p95_ms'], '>10.1f'):>10}"
+              f"{fmt(row['p99_ms'], '>10.1f'):>10}{fmt(row['sql_per_request'], '>10.1f'):>10}")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(args):
+    mix = parse_mix(args.mix)
+    db_path = os.path.join(tempfile.mkdtemp(), "loadtest.db")
+    seed(db_path, args.books)
+    env = {
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{db_path}",
+        "DB_MODE": args.db_mode,
+    }
+    print(f"транспорт: {args.transport}, режим БД: {args.db_mode}, смесь: {mix}")
+
+    if args.transport == "asgi":
+        os.environ.update(env)
+        app = create_app()
+
+        def client_factory(limits):
+            return httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60
+            )
+
+        results = asyncio.run(run_levels(client_factory, args, mix))
+    else:
+        port = free_port()
+        server = start_server({**os.environ, **env}, port)
+        try:
+            def client_factory(limits):
+                return httpx.AsyncClient(
+                    base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60
+                )
+
+            results = asyncio.run(run_levels(client_factory, args, mix))
+        finally:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "transport": args.transport,
+            "db_mode": args.db_mode,
+            "mix": mix,
+            "books": args.books,
+            "duration": args.duration,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты сохранены в {args.output}")
+
+
+# ========== Сравнение ==========
+def compare(args) -> int:
+    """
+    Сравнение двух файлов результатов.
+
+    Регрессия — падение запросов в секунду или рост p95 больше чем на
+    threshold процентов, либо рост числа SQL-запросов на HTTP-запрос на
+    SQL_TOLERANCE и больше.
+    Возвращает код выхода: 1, если есть регрессии.
+    """
+    with open(args.old, encoding="utf-8") as file:
+        old = json.load(file)
+    with open(args.new, encoding="utf-8") as file:
+        new = json.load(file)
+
+    old_levels = {level["concurrency"]: level for level in old["results"]}
+    regressions = 0
+    print(f"{old['meta'].get('commit') or args.old} → {new['meta'].get('commit') or args.new}")
+    print(f"{'конк.':<6}{'операция':<10}{'запр/с':>20}{'p95, мс':>20}{'SQL/запр':>14}")
+    for level in new["results"]:
+        previous = old_levels.get(level["concurrency"])
+        if previous is None:
+            continue
+        rows = [*level["operations"].items(), ("всего", level["total"])]
+        for name, row in rows:
+            before = previous["total"] if name == "всего" else previous["operations"].get(name)
+            if not before or not before["requests"] or not row["requests"]:
+                continue
+            rps_change = _change(before["rps"], row["rps"])
+            p95_change = _change(before["p95_ms"], row["p95_ms"])
+            sql_grew = (
+                before["sql_per_request"] is not None and row["sql_per_request"] is not None
+                and row["sql_per_request"] - before["sql_per_request"] >= SQL_TOLERANCE
+            )
+            regressed = rps_change < -args.threshold or p95_change > args.threshold or sql_grew
+            regressions += regressed
+            print(
+                f"{level['concurrency']:<6}{name:<10}"
+                f"{before['rps']:>8.0f} → {row['rps']:<6.0f}{rps_change:>+4.0f}%"
+                f"{before['p95_ms']:>8.1f} → {row['p95_ms']:<6.1f}{p95_change:>+4.0f}%"
+                f"{_fmt_sql(before):>6} → {_fmt_sql(row):<5}"
+                f"{'  ✗' if regressed else ''}"
+            )
+    if regressions:
+        print(f"\n✗ Регрессий: {regressions} (порог {args.threshold:.0f}%)")
+        return 1
+    print(f"\n✓ Регрессий нет (порог {args.threshold:.0f}%)")
+    return 0
+
+
+def _change(before: float, after: float) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+
+def _fmt_sql(row: dict) -> str:
+    return "—" if row["sql_per_request"] is None else f"{row['sql_per_request']:.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Нагрузочный прогон")
+    run_parser.add_argument("--transport", choices=("asgi", "uvicorn"), default="asgi")
+    run_parser.add_argument("--db-mode", choices=("sync", "async"), default="sync")
+    run_parser.add_argument("--mix", default="mixed", help=f"{', '.join(MIXES)} или 'get=70,update=30'")
+    run_parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    run_parser.add_argument("--duration", type=float, default=10.0)
+    run_parser.add_argument("--warmup", type=float, default=1.0)
+    run_parser.add_argument("--books", type=int, default=10_000)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", help="Файл JSON для результатов")
+
+    compare_parser = commands.add_parser("compare", help="Сравнение двух прогонов")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="Допустимое ухудшение, %%")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()
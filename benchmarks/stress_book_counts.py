@@ -0,0 +1,134 @@
+"""
+Проверка счётчиков книг категорий (categories.book_count) под параллельной записью.
+
+Потоки-писатели в отдельных сессиях создают книги (по одной и пакетами),
+удаляют их, переносят в другие категории и откатывают часть транзакций.
+Конфликты версий, занятость базы и книги, удалённые другим потоком,
+считаются и пропускаются. После остановки book_count и category_stats
+сверяются с таблицей книг (crud.check_category_stats), а book_count,
+который отдаёт crud.get_category через кэш сущностей, — с числом книг.
+При расхождении — код выхода 1.
+
+Запуск: python -m benchmarks.stress_book_counts [--writers 8] [--duration 10]
+База создаётся во временном файле, рабочая books.db не затрагивается.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "stress_book_counts.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["METRICS_ENABLED"] = "0"
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy.exc import InvalidRequestError, OperationalError  # noqa: E402
+
+from app.db import crud, models  # noqa: E402
+from app.db.db import SessionLocal, create_tables  # noqa: E402
+
+
+def seed(categories: int, books: int) -> list:
+    create_tables()
+    db = SessionLocal()
+    try:
+        category_ids = [crud.create_category(db, f"Категория {i}").id for i in range(categories)]
+        crud.bulk_create_books(db, [
+            {"title": f"Книга {i}", "price": float(i % 1000) + 0.5, "category_id": random.choice(category_ids)}
+            for i in range(books)
+        ])
+        return category_ids
+    finally:
+        db.close()
+
+
+def random_book_id(db):
+    return db.query(models.Book.id).order_by(models.Book.id.desc()).offset(random.randint(0, 50)).limit(1).scalar()
+
+
+def write(db, category_ids: list) -> str:
+    """Одна случайная операция записи; возвращает её название"""
+    action = random.choice(("create", "bulk", "delete", "move", "rollback"))
+    if action == "create":
+        crud.create_book(db, title="Новая книга", price=random.uniform(1, 1000), category_id=random.choice(category_ids))
+    elif action == "bulk":
+        crud.bulk_create_books(db, [
+            {"title": "Пакет", "price": random.uniform(1, 1000), "category_id": random.choice(category_ids)}
+            for _ in range(random.randint(1, 20))
+        ])
+    elif action == "delete":
+        book_id = random_book_id(db)
+        if book_id is not None:
+            crud.delete_book(db, book_id)
+    elif action == "move":
+        book_id = random_book_id(db)
+        if book_id is not None:
+            crud.update_book(db, book_id, category_id=random.choice(category_ids))
+    else:
+        # Изменения, которые не дошли до фиксации, не должны попасть в счётчики
+        db.add(models.Book(title="Откат", price=1.0, category_id=random.choice(category_ids)))
+        db.flush()
+        db.rollback()
+    return action
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--categories", type=int, default=10)
+    parser.add_argument("--books", type=int, default=5_000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    category_ids = seed(args.categories, args.books)
+    counters = {}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + args.duration
+
+    def loop():
+        while time.perf_counter() < stop_at:
+            db = SessionLocal()
+            try:
+                result = write(db, category_ids)
+            # InvalidRequestError — книгу удалил другой поток до refresh после фиксации
+            except (OperationalError, InvalidRequestError, crud.VersionConflictError):
+                db.rollback()
+                result = "conflicts"
+            finally:
+                db.close()
+            with lock:
+                counters[result] = counters.get(result, 0) + 1
+
+    threads = [threading.Thread(target=loop) for _ in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print("Операций: " + ", ".join(f"{name} {count}" for name, count in sorted(counters.items())))
+
+    db = SessionLocal()
+    try:
+        mismatches = crud.check_category_stats(db)
+        actual = crud.get_books_count_by_category(db)
+        stale = [
+            category_id for category_id in category_ids
+            if crud.get_category(db, category_id).book_count != actual.get(category_id, 0)
+        ]
+    finally:
+        db.close()
+
+    for mismatch in mismatches:
+        print(f"✗ Категория {mismatch.category_id}: book_count {mismatch.book_count}, книг {mismatch.actual_book_count}")
+    if stale:
+        print(f"✗ Устаревший book_count в кэше сущностей: категории {stale}")
+    if mismatches or stale:
+        sys.exit(1)
+    print(f"✓ book_count и category_stats совпадают с таблицей книг ({sum(actual.values())} книг)")
+
+
+if __name__ == "__main__":
+    main()
@@ -28,7 +28,11 @@ def run_api():
     
     elif choice == "2":
         print("\nИнициализация базы данных...")
-        subprocess.run([sys.executable, "-m", "app.init_db"])
+        print("Существующие данные будут удалены. Продолжить? (y/n)")
+        if input().strip().lower() == "y":
+            subprocess.run([sys.executable, "-m", "app.init_db", "--force"])
+        else:
+            print("Инициализация отменена")
     
     elif choice == "3":
         print("\nЗапуск CLI версии...")
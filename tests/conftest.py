@@ -0,0 +1,66 @@
+"""
+Общие фикстуры тестов.
+
+Тесты работают с базой во временном файле: DATABASE_URL задаётся до
+импорта app, рабочая books.db не затрагивается. Аудит SQL-запросов
+включён в строгом режиме. Режим работы с БД и коалесцер берутся из
+окружения, например: DB_MODE=async python -m pytest
+"""
+
+import os
+import tempfile
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "test_books.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ["METRICS_ENABLED"] = "0"
+os.environ["QUERY_AUDIT"] = "strict"
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.db import crud  # noqa: E402
+from app.db.db import SessionLocal, create_tables  # noqa: E402
+from app.main_api import app  # noqa: E402
+
+
+CATEGORIES = 5
+BOOKS_PER_CATEGORY = 2000
+
+
+@pytest.fixture(scope="session")
+def catalog():
+    """ID категорий тестового каталога (CATEGORIES × BOOKS_PER_CATEGORY книг)"""
+    create_tables()
+    db = SessionLocal()
+    try:
+        category_ids = []
+        for number in range(CATEGORIES):
+            category_id = crud.create_category(db, f"Категория {number}").id
+            crud.bulk_create_books(db, [
+                {
+                    "title": f"Книга {number}-{i}", "description": f"Описание книги {i}",
+                    "price": float(i % 1000) + 0.5, "url": f"https://example.com/books/{number}/{i}",
+                    "category_id": category_id,
+                }
+                for i in range(BOOKS_PER_CATEGORY)
+            ])
+            category_ids.append(category_id)
+        return category_ids
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def db(catalog):
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def client(catalog):
+    """Клиент API поверх тестового каталога"""
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,80 @@
+"""Счётчики книг категорий (book_count, category_stats) под параллельной записью"""
+
+import random
+import threading
+
+import sqlalchemy as sa
+from sqlalchemy.exc import OperationalError
+
+from app.db import crud, models
+from app.db.db import SessionLocal
+
+
+WRITERS = 8
+OPERATIONS_PER_WRITER = 50
+CATEGORIES = 4
+
+
+def _write(db, category_ids: list, book_ids: list, rng: random.Random) -> None:
+    """Одна случайная операция записи книг тестовых категорий"""
+    action = rng.choice(("create", "bulk", "move", "delete", "rollback"))
+    if action == "create":
+        book = crud.create_book(db, title="Новая книга", price=rng.uniform(1, 1000), category_id=rng.choice(category_ids))
+        book_ids.append(book.id)
+    elif action == "bulk":
+        crud.bulk_create_books(db, [
+            {"title": "Пакет", "price": rng.uniform(1, 1000), "category_id": rng.choice(category_ids)}
+            for _ in range(rng.randint(1, 20))
+        ])
+    elif action == "move":
+        crud.update_book_row(db, rng.choice(book_ids), category_id=rng.choice(category_ids))
+    elif action == "delete":
+        # Книгу мог уже удалить другой поток: тогда удаление ничего не меняет
+        crud.delete_book_row(db, rng.choice(book_ids))
+    else:
+        # Изменения, которые не дошли до фиксации, не должны попасть в счётчики
+        db.add(models.Book(title="Откат", price=1.0, category_id=rng.choice(category_ids)))
+        db.flush()
+        db.rollback()
+
+
+def test_concurrent_writes_keep_book_counts(db):
+    category_ids = [crud.create_category(db, f"Параллельная запись {i}").id for i in range(CATEGORIES)]
+    book_ids = [
+        crud.create_book(db, title=f"Книга {i}", price=10.0, category_id=category_ids[i % CATEGORIES]).id
+        for i in range(100)
+    ]
+    errors = []
+
+    def writer(seed: int):
+        rng = random.Random(seed)
+        for _ in range(OPERATIONS_PER_WRITER):
+            session = SessionLocal()
+            try:
+                _write(session, category_ids, book_ids, rng)
+            except OperationalError:
+                # База занята другим писателем дольше busy_timeout
+                session.rollback()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                session.close()
+
+    threads = [threading.Thread(target=writer, args=(seed,)) for seed in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    actual = dict(db.execute(sa.text("SELECT category_id, count(*) FROM books GROUP BY category_id")).all())
+    book_counts = dict(db.execute(sa.text("SELECT id, book_count FROM categories")).all())
+    stats_counts = dict(db.execute(sa.text("SELECT category_id, book_count FROM category_stats")).all())
+    for category_id, book_count in book_counts.items():
+        assert book_count == actual.get(category_id, 0), f"book_count категории {category_id}"
+        assert stats_counts.get(category_id, 0) == actual.get(category_id, 0), f"category_stats категории {category_id}"
+    # Суммы, минимумы и максимумы цен тоже совпадают
+    assert not crud.check_category_stats(db)
+    # book_count через кэш сущностей не устарел
+    for category_id in category_ids:
+        assert crud.get_category(db, category_id).book_count == actual.get(category_id, 0)
@@ -0,0 +1,52 @@
+"""Ошибки PUT/DELETE книги: 400 (нет категории), 404 (нет книги), 412 (If-Match)"""
+
+import pytest
+
+
+MISSING_ID = 10 ** 9
+
+
+@pytest.fixture
+def book(client, catalog):
+    response = client.post("/books/", json={"title": "Книга для записи", "price": 10.5, "category_id": catalog[0]})
+    assert response.status_code == 201, response.text
+    return response.json()
+
+
+def test_update_with_unknown_category_is_rejected(client, book):
+    response = client.put(f"/books/{book['id']}", json={"category_id": MISSING_ID})
+    assert response.status_code == 400
+    assert client.get(f"/books/{book['id']}").json()["category_id"] == book["category_id"]
+
+
+@pytest.mark.parametrize("method", ["put", "delete"])
+def test_write_missing_book_is_not_found(client, method):
+    kwargs = {"json": {"price": 1.5}} if method == "put" else {}
+    response = getattr(client, method)(f"/books/{MISSING_ID}", **kwargs)
+    assert response.status_code == 404
+    # If-Match для несуществующей книги — тоже 404, а не 412
+    response = getattr(client, method)(
+        f"/books/{MISSING_ID}", headers={"If-Match": f'"book-{MISSING_ID}-1-1"'}, **kwargs
+    )
+    assert response.status_code == 404
+
+
+def test_update_with_stale_etag_fails(client, book):
+    etag = client.get(f"/books/{book['id']}").headers["ETag"]
+    response = client.put(f"/books/{book['id']}", json={"price": 20.5}, headers={"If-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    response = client.put(f"/books/{book['id']}", json={"price": 30.5}, headers={"If-Match": etag})
+    assert response.status_code == 412
+    assert client.get(f"/books/{book['id']}").json()["price"] == 20.5
+
+
+def test_delete_with_stale_etag_fails(client, book):
+    etag = client.get(f"/books/{book['id']}").headers["ETag"]
+    assert client.put(f"/books/{book['id']}", json={"price": 20.5}).status_code == 200
+
+    assert client.delete(f"/books/{book['id']}", headers={"If-Match": etag}).status_code == 412
+    current = client.get(f"/books/{book['id']}").headers["ETag"]
+    assert client.delete(f"/books/{book['id']}", headers={"If-Match": current}).status_code == 204
+    assert client.get(f"/books/{book['id']}").status_code == 404
@@ -0,0 +1,34 @@
+"""Кэш сущностей (cache.py): счётчики под параллельными запросами"""
+
+import sys
+import threading
+
+from app.db import models
+from app.db.cache import EntityCache, LocalCacheBackend
+
+
+THREADS = 8
+LOADS_PER_THREAD = 5000
+
+
+def test_counters_are_not_lost_under_threads():
+    cache = EntityCache(LocalCacheBackend())
+    # Частое переключение потоков, чтобы гонка инкрементов проявлялась
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        def load():
+            for entity_id in range(LOADS_PER_THREAD):
+                cache.load(None, models.Category, entity_id)
+
+        threads = [threading.Thread(target=load) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    assert cache.stats()["tables"]["categories"] == {"hits": 0, "misses": THREADS * LOADS_PER_THREAD}
+    cache.reset_stats()
+    assert cache.stats()["tables"] == {}
@@ -0,0 +1,92 @@
+"""Журнал изменений: порядок записей, сжатие (410) и сброс после загрузки каталога"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.db import crud
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _position(client) -> int:
+    return client.get("/changes").json()["next_since"]
+
+
+def test_changes_follow_writes_in_seq_order(client, catalog):
+    since = _position(client)
+    book = client.post("/books/", json={"title": "Журнал", "price": 1.5, "category_id": catalog[2]}).json()
+    assert client.put(f"/books/{book['id']}", json={"price": 2.5}).status_code == 200
+    # Запись без изменения значений версию не меняет и в журнал не попадает
+    assert client.put(f"/books/{book['id']}", json={"price": 2.5}).status_code == 200
+    assert client.delete(f"/books/{book['id']}").status_code == 204
+
+    feed = client.get(f"/changes?since={since}").json()
+    changes = [change for change in feed["changes"] if change["entity"] == "book" and change["entity_id"] == book["id"]]
+    assert [(change["op"], change["version"]) for change in changes] == [("insert", 1), ("update", 2), ("delete", 2)]
+    seqs = [change["seq"] for change in feed["changes"]]
+    assert seqs == sorted(seqs) and seqs[0] > since
+    assert feed["next_since"] == seqs[-1] and not feed["has_more"]
+
+
+@pytest.fixture
+def compacted(db):
+    """Снятие усечения журнала после теста: остальным тестам нужен since=0"""
+    yield db
+    db.rollback()
+    db.execute(sa.text("DELETE FROM change_log_state"))
+    db.commit()
+
+
+def test_since_before_compaction_is_gone(client, compacted, catalog):
+    db = compacted
+    since = _position(client)
+    book = client.post("/books/", json={"title": "Сжатие", "price": 1.5, "category_id": catalog[2]}).json()
+    client.put(f"/books/{book['id']}", json={"price": 2.5})
+
+    last_seq = client.get(f"/changes?since={since}").json()["next_since"]
+    # Записи по last_seq включительно — старше срока хранения: журнал усекается до last_seq
+    db.execute(
+        sa.text("UPDATE changes SET changed_at = datetime('now', '-30 days') WHERE seq <= :seq"), {"seq": last_seq}
+    )
+    result = crud.compact_changes(db, retention_days=7)
+    assert result.truncated_seq == last_seq
+
+    response = client.get(f"/changes?since={since}")
+    assert response.status_code == 410
+    response = client.get(f"/changes?since={result.truncated_seq}")
+    assert response.status_code == 200 and response.json()["changes"] == []
+
+
+def test_dataset_load_resets_changes(tmp_path):
+    # Загрузка заменяет всю базу: отдельный процесс со своим файлом базы
+    url = f"sqlite:///{tmp_path / 'dataset.db'}"
+    env = dict(os.environ, DATABASE_URL=url)
+
+    def init_db(*args):
+        subprocess.run([sys.executable, "-m", "app.init_db", *args], cwd=ROOT, env=env, check=True, capture_output=True)
+
+    engine = create_engine(url)
+    try:
+        init_db()
+        with Session(engine) as db:
+            _, last_seq = crud.get_changes(db)
+            assert last_seq > 0
+
+        init_db("--categories", "3", "--books", "500", "--force")
+        # Загрузка шла в обход триггеров: журнал усечён до последней записи,
+        # и клиенты с любой прежней позицией получают 410
+        with Session(engine) as db:
+            with pytest.raises(crud.ChangeLogTruncatedError) as error:
+                crud.get_changes(db, since=last_seq)
+            truncated_seq = error.value.truncated_seq
+            assert truncated_seq > last_seq
+            assert crud.get_changes(db, since=truncated_seq) == ([], truncated_seq)
+    finally:
+        engine.dispose()
@@ -0,0 +1,80 @@
+"""Групповая фиксация записи книг (coalescer): изоляция ошибок операций пачки"""
+
+import itertools
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.db import coalescer, crud
+from app.db.db import SessionLocal, engine
+
+
+BATCH = 4
+_numbers = itertools.count()
+
+
+@pytest.fixture
+def writer(monkeypatch, catalog):
+    """Коалесцер, который собирает BATCH операций в одну пачку"""
+    instance = coalescer.WriteCoalescer(
+        sessionmaker(bind=engine, autocommit=False, autoflush=False, expire_on_commit=False),
+        window=5.0, max_batch=BATCH
+    )
+    monkeypatch.setattr(coalescer, "_coalescer", instance)
+    return instance
+
+
+def _submit_batch(category_id: int, book_id: int, url: str) -> list:
+    return [
+        coalescer.submit_create_book(title="Пачка", price=1.5, url=f"{url}/new", category_id=category_id),
+        coalescer.submit_create_book(title="Та же ссылка", price=1.5, url=url, category_id=category_id),
+        coalescer.submit_create_book(title="Нет категории", price=1.5, category_id=10 ** 9),
+        coalescer.submit_update_book(book_id, price=99.5),
+    ]
+
+
+@pytest.fixture
+def existing(db, catalog):
+    book = crud.create_book(db, title="Есть", price=1.5, url=f"https://example.com/coalescer/{next(_numbers)}", category_id=catalog[1])
+    return book.id, book.url
+
+
+def test_failed_operation_does_not_fail_batch(writer, catalog, existing):
+    book_id, url = existing
+    created, duplicate, invalid, updated = _submit_batch(catalog[1], book_id, url)
+
+    with pytest.raises(crud.DuplicateKeyError):
+        duplicate.result(timeout=30)
+    with pytest.raises(crud.InvalidReferenceError):
+        invalid.result(timeout=30)
+    book = created.result(timeout=30)
+    assert book.category.id == catalog[1]
+    assert updated.result(timeout=30).price == 99.5
+    assert writer.batches == 1 and writer.operations == BATCH
+
+    db = SessionLocal()
+    try:
+        assert crud.get_book_row(db, book.id).url == f"{url}/new"
+        assert crud.get_book_row(db, book_id).price == 99.5
+    finally:
+        db.close()
+
+
+def test_error_after_commit_does_not_fail_operations(writer, monkeypatch, catalog, existing):
+    def broken(db, books):
+        raise RuntimeError("сбой после фиксации")
+
+    monkeypatch.setattr(crud, "attach_categories", broken)
+    book_id, url = existing
+    created, duplicate, invalid, updated = _submit_batch(catalog[1], book_id, url)
+
+    book = created.result(timeout=30)
+    assert updated.result(timeout=30).price == 99.5
+    with pytest.raises(crud.DuplicateKeyError):
+        duplicate.result(timeout=30)
+
+    db = SessionLocal()
+    try:
+        assert crud.get_book_row(db, book.id) is not None
+    finally:
+        db.close()
@@ -0,0 +1,15 @@
+"""Настройки подключений SQLite (db.py)"""
+
+import pytest
+
+from app.db.db import engine, get_sqlite_pragmas
+
+
+def test_foreign_keys_cannot_be_overridden():
+    with pytest.raises(ValueError):
+        get_sqlite_pragmas("wal", "cache_size=-1000, foreign_keys=OFF")
+
+
+def test_connections_enforce_foreign_keys():
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA foreign_keys").scalar() == 1
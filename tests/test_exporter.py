@@ -0,0 +1,44 @@
+"""Потоковая выгрузка: пиковая память не зависит от размера каталога"""
+
+import tracemalloc
+
+import pytest
+
+from app import exporter
+from app.db import crud
+from app.db.db import SessionLocal
+
+
+EXPORT_BOOKS = 200_000
+# Потолок пиковой памяти выгрузки (как в benchmarks/bench_export.py):
+# чтение всех строк сразу (.all()) занимает около 100 МБ
+PEAK_MEMORY_CEILING = 20 * 2 ** 20
+
+
+@pytest.fixture(scope="module")
+def large_category(catalog):
+    """ID категории с EXPORT_BOOKS книгами"""
+    db = SessionLocal()
+    try:
+        category_id = crud.create_category(db, "Выгрузка").id
+        for start in range(0, EXPORT_BOOKS, 50_000):
+            crud.bulk_create_books(db, [
+                {"title": f"Книга {i}", "price": float(i % 1000) + 0.5, "category_id": category_id}
+                for i in range(start, min(start + 50_000, EXPORT_BOOKS))
+            ])
+        return category_id
+    finally:
+        db.close()
+
+
+def test_export_peak_memory(large_category):
+    # NDJSON и CSV читают строки одним и тем же запросом порциями
+    tracemalloc.start()
+    try:
+        lines = sum(chunk.count("\n") for chunk in exporter.export_books(category_id=large_category))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert lines == EXPORT_BOOKS
+    assert peak < PEAK_MEMORY_CEILING, f"пик памяти выгрузки {peak / 2 ** 20:.1f} МБ"
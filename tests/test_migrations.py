@@ -0,0 +1,57 @@
+"""Миграция 7 (уникальный индекс books.url) на базе с повторяющимися ссылками"""
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import maintenance
+from app.db import migrations
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    """База на версии 6 с книгами 1, 3 и 2, 4 под одинаковыми ссылками"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    migrations.migrate(engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("DROP INDEX ux_books_url")
+        connection.exec_driver_sql("DELETE FROM schema_migrations WHERE version >= 7")
+        connection.exec_driver_sql("INSERT INTO categories (id, title) VALUES (1, 'Категория')")
+        for book_id, url in ((1, "https://example.com/a"), (2, "https://example.com/b"),
+                             (3, "https://example.com/a"), (4, "https://example.com/b"),
+                             (5, "https://example.com/c")):
+            connection.exec_driver_sql(
+                "INSERT INTO books (id, title, price, url, category_id) VALUES (?, 'Книга', 1, ?, 1)",
+                (book_id, url)
+            )
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
+def _urls(engine) -> dict:
+    with engine.connect() as connection:
+        return dict(connection.exec_driver_sql("SELECT id, url FROM books").all())
+
+
+def test_duplicate_urls_abort_migration_without_changing_rows(legacy_engine):
+    urls = _urls(legacy_engine)
+    with pytest.raises(migrations.MigrationError) as error:
+        migrations.migrate(legacy_engine)
+    assert "https://example.com/a: книги 1, 3" in str(error.value)
+    assert "https://example.com/b: книги 2, 4" in str(error.value)
+    assert _urls(legacy_engine) == urls
+    with legacy_engine.connect() as connection:
+        assert migrations.current_version(connection) == 6
+
+
+def test_migration_applies_after_dedupe(legacy_engine):
+    with Session(legacy_engine) as db:
+        assert maintenance.clear_duplicate_book_urls(db) == [
+            (3, "https://example.com/a"), (4, "https://example.com/b")
+        ]
+    assert migrations.migrate(legacy_engine) == [7, 8]
+    assert _urls(legacy_engine) == {
+        1: "https://example.com/a", 2: "https://example.com/b", 3: None, 4: None, 5: "https://example.com/c"
+    }
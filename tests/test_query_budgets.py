@@ -0,0 +1,57 @@
+"""
+Бюджеты SQL-запросов маршрутов списков и карточек (QUERY_AUDIT=strict).
+
+В строгом режиме аудит бросает QueryAuditError, если маршрут превысил свой
+бюджет из QUERY_BUDGETS или выполнил повторяющийся запрос (N+1): TestClient
+пробрасывает исключение в тест.
+"""
+
+import pytest
+
+from app import query_audit
+from app.db.cache import entity_cache
+
+
+# Шаблон маршрута → запросы к нему
+ROUTES = {
+    "/books/": [
+        "/books/",
+        "/books/?limit=50&include=description",
+        "/books/?category_id=2&sort_by=price&sort_order=desc",
+        "/books/?min_price=100&max_price=300&sort_by=title&fields=id,title,price",
+    ],
+    "/books/{book_id}": ["/books/{book_id}", "/books/{book_id}?fields=id,title,price"],
+    "/books/search": ["/books/search?q=Книга", "/books/search?q=Книга&fields=id,title"],
+    "/books/search/faceted": ["/books/search/faceted?q=Книга&price_buckets=100,500"],
+    "/books/batch": ["/books/batch?ids={book_ids}", "/books/batch?ids={book_ids}&include_category=false"],
+    "/categories/": ["/categories/", "/categories/?limit=2"],
+    "/categories/{category_id}": ["/categories/{category_id}"],
+    "/categories/batch": ["/categories/batch?ids={category_ids}"],
+    "/stats": ["/stats"],
+    "/changes": ["/changes", "/changes?since=0&limit=100"],
+}
+
+
+def test_audit_is_strict():
+    assert query_audit.QUERY_AUDIT == "strict"
+
+
+def test_all_read_routes_are_covered():
+    budgeted = {path for method, path in query_audit.QUERY_BUDGETS if method == "GET"}
+    assert budgeted <= set(ROUTES)
+
+
+@pytest.mark.parametrize("url", [url for urls in ROUTES.values() for url in urls])
+def test_read_route_within_budget(client, catalog, url):
+    first_book = client.get(f"/books/?category_id={catalog[0]}&limit=3").json()
+    url = url.format(
+        book_id=first_book[0]["id"],
+        book_ids=",".join(str(book["id"]) for book in first_book),
+        category_id=catalog[0],
+        category_ids=",".join(map(str, catalog)),
+    )
+    # Дважды: с пустым кэшем сущностей и с заполненным первым запросом
+    entity_cache.clear()
+    for _ in range(2):
+        response = client.get(url)
+        assert response.status_code == 200, response.text
@@ -0,0 +1,32 @@
+"""Планы запросов crud: чтение по индексам, без полного просмотра таблиц"""
+
+from app.db import models, query_plans
+
+
+BOOKS = models.Book.__tablename__
+
+
+def test_query_plans_use_indexes(db):
+    checked, problems = query_plans.check(db)
+
+    assert checked > 0
+    assert not problems, "\n".join(
+        f"{problem.case}: {problem.detail}\n    {' '.join(problem.statement.split())}"
+        for problem in problems
+    )
+
+
+def test_hot_queries_do_not_scan_books(db):
+    # Сценарии, где полный просмотр книг не разрешён явно (агрегаты по всем книгам)
+    hot = {case.name for case in query_plans.build_cases(db) if BOOKS not in case.allow_scan}
+    scans = [
+        f"{name}: {detail}"
+        for name, statements in query_plans.plans(db).items() if name in hot
+        for plan in statements
+        for detail in plan
+        # Полный просмотр — SCAN без индекса; SCAN ... USING INDEX читает по порядку индекса
+        if detail.split()[:2] == ["SCAN", BOOKS] and "USING" not in detail
+    ]
+
+    assert hot
+    assert not scans, "\n".join(scans)
@@ -0,0 +1,76 @@
+"""Upsert книг по ссылке (PUT /books/by-key/bulk): повтор без изменений ничего не пишет"""
+
+import itertools
+import json
+
+import pytest
+
+from app.db import crud
+from app.db.db import engine
+
+
+BOOKS = 50
+CHANGED = 10
+_categories = itertools.count()
+
+
+@pytest.fixture
+def payload(db):
+    """Книги новой категории в виде строк NDJSON"""
+    number = next(_categories)
+    category_id = crud.create_category(db, f"Upsert {number}").id
+    return [
+        {
+            "title": f"Upsert {number}-{i}", "price": float(i) + 0.5,
+            "url": f"https://example.com/upsert/{number}/{i}", "category_id": category_id,
+        }
+        for i in range(BOOKS)
+    ]
+
+
+def _upsert(client, books) -> dict:
+    body = "\n".join(json.dumps(book) for book in books)
+    response = client.put("/books/by-key/bulk", content=body.encode())
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _versions(category_id: int) -> dict:
+    """Версии книг категории по ссылке (в API версии нет, только в ETag)"""
+    with engine.connect() as connection:
+        return dict(connection.exec_driver_sql(
+            "SELECT url, version FROM books WHERE category_id = ?", (category_id,)
+        ).all())
+
+
+def _position(client) -> int:
+    return client.get("/changes").json()["next_since"]
+
+
+def test_repeated_upsert_is_unchanged(client, payload):
+    report = _upsert(client, payload)
+    assert (report["inserted"], report["updated"], report["unchanged"], report["failed"]) == (BOOKS, 0, 0, 0)
+    versions = _versions(payload[0]["category_id"])
+    assert len(versions) == BOOKS
+    position = _position(client)
+
+    report = _upsert(client, payload)
+    assert (report["inserted"], report["updated"], report["unchanged"]) == (0, 0, BOOKS)
+    assert _versions(payload[0]["category_id"]) == versions
+    assert client.get(f"/changes?since={position}").json()["changes"] == []
+
+
+def test_partially_changed_upsert_counts_updated(client, payload):
+    _upsert(client, payload)
+    versions = _versions(payload[0]["category_id"])
+    position = _position(client)
+
+    changed = [dict(book, price=book["price"] + 100) for book in payload[:CHANGED]]
+    report = _upsert(client, changed + payload[CHANGED:])
+    assert (report["inserted"], report["updated"], report["unchanged"]) == (0, CHANGED, BOOKS - CHANGED)
+
+    new_versions = _versions(payload[0]["category_id"])
+    bumped = {url for url in versions if new_versions[url] != versions[url]}
+    assert bumped == {book["url"] for book in changed}
+    changes = client.get(f"/changes?since={position}").json()["changes"]
+    assert len(changes) == CHANGED and {change["op"] for change in changes} == {"update"}